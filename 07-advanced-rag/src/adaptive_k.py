@@ -0,0 +1,105 @@
+"""
+Адаптивное количество кандидатов по распределению scores
+
+Вместо фиксированных SEMANTIC_RETRIEVER_K / BM25_RETRIEVER_K / RERANKER_TOP_K
+число документов выбирается по кривой отсортированных scores:
+- elbow: точка перегиба (максимальное отклонение кривой вниз от хорды
+  между первым и последним score) - после нее идет "плато" нерелевантных
+- relative drop: отсекаются scores ниже top_score * (1 - max_drop)
+- порог reranker: после cross-encoder остаются документы со score >= threshold
+
+На простых запросах с явным лидером в reranker и в контекст LLM уходит
+несколько документов, на сложных (пологая кривая) сохраняется полный recall.
+"""
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Минимальное отклонение (в долях диапазона scores), чтобы считать точку перегибом
+MIN_ELBOW_DISTANCE = 0.1
+
+
+def elbow_cutoff(scores) -> int:
+    """
+    Количество документов до перегиба кривой убывающих scores
+
+    Returns:
+        int: позиция перегиба или len(scores), если выраженного перегиба нет
+    """
+    values = np.asarray(scores, dtype=np.float32)
+    n = len(values)
+    if n < 3:
+        return n
+    span = float(values[0] - values[-1])
+    if span <= 0:
+        return n
+    # Кривая и хорда в координатах [0, 1] x [0, 1]
+    curve = (values - values[-1]) / span
+    chord = 1.0 - np.arange(n, dtype=np.float32) / (n - 1)
+    distance = chord - curve
+    knee = int(np.argmax(distance))
+    if distance[knee] < MIN_ELBOW_DISTANCE:
+        return n
+    return knee
+
+
+def relative_cutoff(scores, max_drop: float) -> int:
+    """Количество документов со score не ниже top_score * (1 - max_drop)"""
+    values = np.asarray(scores, dtype=np.float32)
+    if len(values) == 0 or values[0] <= 0:
+        return len(values)
+    return int(np.count_nonzero(values >= values[0] * (1.0 - max_drop)))
+
+
+def candidate_cutoff(scores, min_k: int, max_drop: float) -> int:
+    """
+    Сколько кандидатов первого этапа передавать дальше (scores по убыванию)
+
+    Берется меньшее из elbow и relative drop, но не меньше min_k.
+    """
+    n = len(scores)
+    k = min(elbow_cutoff(scores), relative_cutoff(scores, max_drop))
+    return min(n, max(k, min_k))
+
+
+def rerank_cutoff(scores, min_k: int, threshold: float) -> int:
+    """
+    Сколько документов оставить после reranking (scores по убыванию)
+
+    Документы ниже порога cross-encoder и после перегиба отбрасываются,
+    но не меньше min_k.
+    """
+    values = np.asarray(scores, dtype=np.float32)
+    n = len(values)
+    k = min(elbow_cutoff(values), int(np.count_nonzero(values >= threshold)))
+    return min(n, max(k, min_k))
+
+
+class AdaptiveKStats:
+    """Сколько кандидатов и документов ушло дальше по сравнению с фиксированным k"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {"candidates": 0, "candidates_fixed": 0, "kept": 0, "kept_fixed": 0}
+        self.queries = 0
+
+    def record(self, stage: str, adaptive: int, fixed: int):
+        with self._lock:
+            self._data[stage] += adaptive
+            self._data[f"{stage}_fixed"] += fixed
+            if stage == "candidates":
+                self.queries += 1
+
+    def stats(self) -> dict:
+        """Средние размеры и доля сэкономленных кандидатов/документов"""
+        with self._lock:
+            data = dict(self._data)
+            queries = self.queries
+        return {
+            "queries": queries,
+            "avg_candidates": data["candidates"] / queries if queries else 0.0,
+            "candidates_saved_rate": 1 - data["candidates"] / data["candidates_fixed"] if data["candidates_fixed"] else 0.0,
+            "kept_saved_rate": 1 - data["kept"] / data["kept_fixed"] if data["kept_fixed"] else 0.0,
+        }
@@ -0,0 +1,276 @@
+"""
+Бенчмарки RAG pipeline
+
+--reranker: сравнение backend'ов cross-encoder (fp32 sentence-transformers,
+int8 ONNX, int8 ONNX pruned) по NDCG@3 и latency на кандидатах hybrid retrieval
+для вопросов из локального датасета.
+
+--batch: пропускная способность retrieve_documents_batch против поочередных
+вызовов retrieve_documents на вопросах локального датасета.
+
+--chain: накладные расходы LCEL RAG-цепочки на запрос (сборка цепочки на каждый
+запрос vs однократная) с заглушками LLM и retrieval - без сети и индекса.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from pathlib import Path
+import numpy as np
+from config import config
+import indexer
+import rag
+import reranker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET_PATH = "datasets/06-rag-qa-dataset.json"
+
+
+def load_dataset(dataset_path: str) -> list:
+    """Загрузка локального датасета (формат dataset_synthesizer.py)"""
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def is_relevant(document, contexts: list, min_overlap: float = 0.5) -> bool:
+    """Чанк релевантен если большая часть его слов входит в один из эталонных контекстов"""
+    doc_words = _words(document.page_content)
+    if not doc_words:
+        return False
+    return any(
+        len(doc_words & _words(context)) / len(doc_words) >= min_overlap
+        for context in contexts
+    )
+
+
+def ndcg_at_k(relevances: list, k: int) -> float:
+    """Бинарный nDCG@k для списка релевантностей в порядке ранжирования"""
+    gains = np.asarray(relevances[:k], dtype=np.float32)
+    discounts = 1.0 / np.log2(np.arange(2, len(gains) + 2))
+    dcg = float((gains * discounts).sum())
+    ideal = np.sort(np.asarray(relevances, dtype=np.float32))[::-1][:k]
+    idcg = float((ideal * discounts[:len(ideal)]).sum())
+    return dcg / idcg if idcg > 0 else 0.0
+
+
+async def _build_index():
+    """Индексация документов и hybrid retriever для генерации кандидатов"""
+    vector_store, chunks = await indexer.reindex_all()
+    if vector_store is None:
+        raise ValueError("No documents indexed")
+    rag.vector_store, rag.chunks = vector_store, chunks
+    return rag.create_hybrid_retriever()
+
+
+def benchmark_reranker(dataset_path: str, pruned_layers: list, runs: int = 3):
+    """
+    Сравнение backend'ов cross-encoder на одинаковых кандидатах
+
+    Args:
+        dataset_path: путь к JSON датасету с question и contexts
+        pruned_layers: список вариантов числа слоев для pruned ONNX модели
+        runs: количество прогонов для замера latency
+    """
+    dataset = load_dataset(dataset_path)
+    hybrid = asyncio.run(_build_index())
+
+    # Кандидаты одинаковые для всех backend'ов
+    samples = []
+    for item in dataset:
+        candidates = hybrid.invoke(item["question"])
+        relevances = [int(is_relevant(doc, item["contexts"])) for doc in candidates]
+        if candidates and any(relevances):
+            samples.append((item["question"], candidates, relevances))
+    logger.info(f"Benchmark samples with relevant candidates: {len(samples)}/{len(dataset)}")
+    if not samples:
+        raise ValueError("No samples with relevant candidates - check dataset and index")
+
+    variants = [("sentence_transformers fp32", lambda: reranker.create_cross_encoder("sentence_transformers"))]
+    variants.append(("onnx int8", lambda: reranker.load_onnx_cross_encoder(config.CROSS_ENCODER_MODEL)))
+    for num_layers in pruned_layers:
+        variants.append((
+            f"onnx int8 L{num_layers}",
+            lambda n=num_layers: reranker.load_onnx_cross_encoder(config.CROSS_ENCODER_MODEL, n)
+        ))
+
+    results = []
+    for name, factory in variants:
+        encoder = factory()
+        # Прогрев (аллокации, ленивые инициализации)
+        question, candidates, _ = samples[0]
+        encoder.predict([(question, doc.page_content) for doc in candidates], batch_size=config.RERANKER_BATCH_SIZE)
+
+        latencies = []
+        ndcgs = []
+        for question, candidates, relevances in samples:
+            pairs = [(question, doc.page_content) for doc in candidates]
+            for _ in range(runs):
+                start = time.perf_counter()
+                scores = encoder.predict(pairs, batch_size=config.RERANKER_BATCH_SIZE)
+                latencies.append((time.perf_counter() - start) * 1000)
+            order = np.argsort(-np.asarray(scores))
+            ndcgs.append(ndcg_at_k([relevances[i] for i in order], k=3))
+
+        results.append({
+            "backend": name,
+            "ndcg@3": float(np.mean(ndcgs)),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+        })
+        logger.info(f"✓ {name}: done")
+
+    # Базовый порядок ensemble без reranking - нижняя граница качества
+    baseline = float(np.mean([ndcg_at_k(relevances, k=3) for _, _, relevances in samples]))
+
+    print(f"\nCandidates per query: semantic_k={config.SEMANTIC_RETRIEVER_K}, bm25_k={config.BM25_RETRIEVER_K}, "
+          f"max_length={config.RERANKER_MAX_LENGTH}, batch_size={config.RERANKER_BATCH_SIZE}")
+    print(f"{'backend':<30} {'NDCG@3':>8} {'p50 ms':>10} {'p95 ms':>10}")
+    print(f"{'ensemble (no rerank)':<30} {baseline:>8.3f} {'-':>10} {'-':>10}")
+    for row in results:
+        print(f"{row['backend']:<30} {row['ndcg@3']:>8.3f} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f}")
+    return results
+
+
+def benchmark_chain(runs: int = 200):
+    """
+    Накладные расходы RAG-цепочки: сборка на каждый запрос vs кешированная цепочка
+
+    LLM заменены FakeListChatModel, retrieval возвращает фиксированные документы,
+    поэтому замеряется только работа LCEL (сборка графа, вызовы шагов).
+
+    Args:
+        runs: количество запросов для каждого варианта
+    """
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import HumanMessage
+
+    documents = [
+        Document(page_content=f"Условия вклада, пункт {i}", metadata={"source": "usl_r_vkladov.pdf", "page": i})
+        for i in range(config.RERANKER_TOP_K)
+    ]
+
+    async def fake_aretrieve(query, filters=None):
+        return documents
+
+    rag._llm = FakeListChatModel(responses=["Ответ по условиям вклада"])
+    rag._llm_query_transform = FakeListChatModel(responses=["условия вклада"])
+    rag.retrieve_documents = lambda query, filters=None: documents
+    rag.aretrieve_documents = fake_aretrieve
+    rag.retriever = object()  # get_rag_chain проверяет только инициализацию
+
+    inputs = {"messages": [HumanMessage("Какие условия вклада?")], "filters": None}
+
+    async def run(get_chain):
+        await get_chain().ainvoke(inputs)  # прогрев
+        build_ms, total_ms = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            chain = get_chain()
+            built = time.perf_counter()
+            await chain.ainvoke(inputs)
+            end = time.perf_counter()
+            build_ms.append((built - start) * 1000)
+            total_ms.append((end - start) * 1000)
+        return build_ms, total_ms
+
+    results = []
+    for name, get_chain in [("rebuild per request", rag._build_rag_chain), ("cached", rag.get_rag_chain)]:
+        build_ms, total_ms = asyncio.run(run(get_chain))
+        results.append({
+            "variant": name,
+            "build_ms": float(np.mean(build_ms)),
+            "p50_ms": float(np.percentile(total_ms, 50)),
+            "p95_ms": float(np.percentile(total_ms, 95)),
+        })
+
+    print(f"\nRAG chain overhead per request ({runs} runs, fake LLM and retrieval)")
+    print(f"{'variant':<22} {'build ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for row in results:
+        print(f"{row['variant']:<22} {row['build_ms']:>10.3f} {row['p50_ms']:>10.3f} {row['p95_ms']:>10.3f}")
+    return results
+
+
+def benchmark_batch(dataset_path: str, batch_sizes: list, runs: int = 3):
+    """
+    Пропускная способность пакетного retrieval против поочередного
+
+    Режим retrieval из конфига, кеш результатов выключен. Эмбеддинги вопросов
+    прогреваются заранее (кеш запросов), поэтому сравнивается сам поиск:
+    умножение матриц, BM25 и батч cross-encoder против поштучных вызовов.
+
+    Args:
+        dataset_path: путь к JSON датасету с question
+        batch_sizes: размеры пачек запросов
+        runs: количество прогонов каждого варианта
+    """
+    questions = [item["question"] for item in load_dataset(dataset_path)]
+    config.RETRIEVAL_CACHE_ENABLED = False
+    vector_store, chunks = asyncio.run(indexer.reindex_all())
+    if vector_store is None:
+        raise ValueError("No documents indexed")
+    rag.vector_store, rag.chunks = vector_store, chunks
+    rag.initialize_retriever()
+    rag.retrieve_documents_batch(questions)  # прогрев (эмбеддинги, cross-encoder)
+
+    def throughput(run_batch, batch_size):
+        elapsed = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            for offset in range(0, len(questions), batch_size):
+                run_batch(questions[offset:offset + batch_size])
+            elapsed.append(time.perf_counter() - start)
+        return len(questions) / float(np.median(elapsed))
+
+    sequential = throughput(lambda batch: [rag.retrieve_documents(question) for question in batch], 1)
+    print(f"\nBatch retrieval: {len(questions)} questions, mode={config.RETRIEVAL_MODE}")
+    print(f"{'variant':<22} {'queries/s':>10} {'speedup':>8}")
+    print(f"{'sequential':<22} {sequential:>10.1f} {1.0:>8.1f}")
+    results = [{"variant": "sequential", "qps": sequential}]
+    for batch_size in batch_sizes:
+        qps = throughput(rag.retrieve_documents_batch, batch_size)
+        results.append({"variant": f"batch {batch_size}", "qps": qps})
+        print(f"{f'batch {batch_size}':<22} {qps:>10.1f} {qps / sequential:>8.1f}")
+    return results
+
+
+def main():
+    """Main CLI function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RAG pipeline benchmarks")
+    parser.add_argument("--reranker", action="store_true", help="Compare cross-encoder backends (NDCG@3 + latency)")
+    parser.add_argument("--chain", action="store_true", help="Measure per-request RAG chain overhead (no network)")
+    parser.add_argument("--batch", action="store_true", help="Compare batch vs sequential retrieval throughput")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[8, 32], help="Query batch sizes for --batch")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_PATH, help="Path to local JSON dataset")
+    parser.add_argument("--pruned-layers", type=int, nargs="*", default=[6], help="Layer counts for pruned ONNX variants")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per query")
+    args = parser.parse_args()
+
+    if args.chain:
+        benchmark_chain()
+        return
+
+    if not Path(args.dataset).exists():
+        logger.error(f"Dataset not found: {args.dataset}. Create it with: make dataset")
+        return
+
+    if args.reranker:
+        benchmark_reranker(args.dataset, args.pruned_layers, runs=args.runs)
+    elif args.batch:
+        benchmark_batch(args.dataset, args.batch_sizes, runs=args.runs)
+    else:
+        parser.print_help()
+        logger.error("\nError: Specify a benchmark: --reranker, --batch or --chain")
+
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,7 @@ async def main():
         rag.vector_store, rag.chunks = result
         # Инициализируем retriever
         rag.initialize_retriever()
+        rag.start_cache_warmup()
         stats = rag.get_vector_store_stats()
         logger.info(f"✅ Indexing completed: {stats['count']} documents indexed")
     else:
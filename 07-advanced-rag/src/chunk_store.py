@@ -0,0 +1,298 @@
+"""
+Компактное колоночное хранилище чанков индекса
+
+Без него каждый чанк живет в нескольких местах: rag.chunks (Document с dict
+метаданных), InMemoryVectorStore.store (текст, метаданные и вектор списком
+Python float) и BM25Retriever.docs. Здесь все чанки лежат в нескольких
+numpy массивах, на которые semantic и BM25 retrievers ссылаются по chunk_id:
+
+- тексты - один UTF-8 буфер и смещения
+- source и category - интернированные значения и int32 коды
+- page, start_index, token_count - int32 колонки (-1 = нет значения)
+- остальные метаданные - интернированные JSON строки (буфер и смещения)
+- нормализованные эмбеддинги - float32 матрица (строка = chunk_id)
+
+Массивы можно сохранить в директорию и открыть через memory map. Document
+создается только при обращении по chunk_id (финальные top-k и кандидаты
+reranking), а не хранится для всего корпуса.
+
+Каждое поколение индекса сохраняется в новую поддиректорию (save_generation):
+перезапись .npy файлов, которые старое поколение держит в memory map, обрывает
+запросы, начатые до переиндексации, с SIGBUS.
+"""
+import json
+import logging
+import shutil
+import tempfile
+import weakref
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+import numpy as np
+from pydantic import ConfigDict, Field
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+MISSING = -1  # нет значения в int32 колонке / коде интернированной колонки
+_INT_COLUMNS = ("page", "start_index", "token_count")
+_STRING_COLUMNS = ("source", "category")
+_ARRAYS = (
+    "text_buffer", "text_offsets", "extra_buffer", "extra_offsets", "extra_ids",
+    "source_ids", "category_ids", "page", "start_index", "token_count", "vectors",
+)
+_GENERATION_PREFIX = "gen-"
+_live_generations = set()  # директории поколений, открытые этим процессом
+
+
+def _pack(strings: list):
+    """UTF-8 буфер строк и смещения (строка i = buffer[offsets[i]:offsets[i + 1]])"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _intern(values: list):
+    """int32 коды и список уникальных значений (None -> MISSING)"""
+    positions = {}
+    codes = np.array(
+        [MISSING if value is None else positions.setdefault(value, len(positions)) for value in values],
+        dtype=np.int32
+    )
+    return codes, list(positions)
+
+
+def _split_metadata(metadata: dict):
+    """Метаданные чанка -> значения колонок и остальные поля (для JSON)"""
+    columns = {}
+    extra = {}
+    for key, value in metadata.items():
+        if key == "chunk_id":
+            continue
+        if key in _INT_COLUMNS and type(value) is int and 0 <= value < 2**31:
+            columns[key] = value
+        elif key in _STRING_COLUMNS and isinstance(value, str):
+            columns[key] = value
+        else:
+            extra[key] = value
+    return columns, extra
+
+
+class ChunkStore:
+    """
+    Колоночное хранилище: позиция = chunk_id
+
+    Args:
+        arrays: numpy массивы колонок (обычные или memory map)
+        sources: интернированные значения source
+        categories: интернированные значения category
+    """
+
+    def __init__(self, arrays: dict, sources: list, categories: list):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.sources = sources
+        self.categories = categories
+
+    @classmethod
+    def from_documents(cls, documents: Sequence, vectors: np.ndarray) -> "ChunkStore":
+        """
+        Хранилище из списка Document и их эмбеддингов
+
+        Args:
+            documents: чанки, позиция в списке = chunk_id
+            vectors: эмбеддинги чанков [n x dim] (нормализуются)
+        """
+        split = [_split_metadata(doc.metadata) for doc in documents]
+        text_buffer, text_offsets = _pack([doc.page_content for doc in documents])
+        extra_ids, extra_values = _intern([json.dumps(extra, ensure_ascii=False, sort_keys=True, default=str) for _, extra in split])
+        extra_buffer, extra_offsets = _pack(extra_values)
+        source_ids, sources = _intern([columns.get("source") for columns, _ in split])
+        category_ids, categories = _intern([columns.get("category") for columns, _ in split])
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(split), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        arrays = {
+            "text_buffer": text_buffer, "text_offsets": text_offsets,
+            "extra_buffer": extra_buffer, "extra_offsets": extra_offsets, "extra_ids": extra_ids,
+            "source_ids": source_ids, "category_ids": category_ids,
+            "vectors": vectors / norms,
+        }
+        for name in _INT_COLUMNS:
+            arrays[name] = np.array([columns.get(name, MISSING) for columns, _ in split], dtype=np.int32)
+
+        store = cls(arrays, sources, categories)
+        logger.info(
+            f"Chunk store built: {len(store)} chunks, {len(extra_values)} distinct metadata records, "
+            f"{store.nbytes() / 1024:.0f} KB"
+        )
+        return store
+
+    def save(self, directory: str):
+        """Сохранение массивов (.npy) и интернированных значений в директорию"""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        with open(path / "columns.json", "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources, "categories": self.categories}, f, ensure_ascii=False)
+        logger.info(f"Chunk store saved to {directory}")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ChunkStore":
+        """Загрузка хранилища; при mmap=True массивы открываются через memory map (только чтение)"""
+        path = Path(directory)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in _ARRAYS}
+        with open(path / "columns.json", encoding="utf-8") as f:
+            columns = json.load(f)
+        store = cls(arrays, columns["sources"], columns["categories"])
+        logger.info(f"Chunk store loaded from {directory}: {len(store)} chunks (mmap={mmap})")
+        return store
+
+    def __len__(self):
+        return len(self.text_offsets) - 1
+
+    @staticmethod
+    def _string(buffer: np.ndarray, offsets: np.ndarray, i: int) -> str:
+        return bytes(buffer[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def text(self, chunk_id: int) -> str:
+        return self._string(self.text_buffer, self.text_offsets, chunk_id)
+
+    def texts(self) -> list:
+        """Тексты всех чанков (построение BM25)"""
+        return [self.text(chunk_id) for chunk_id in range(len(self))]
+
+    def metadata(self, chunk_id: int) -> dict:
+        """Новый dict метаданных чанка (как в исходном Document, плюс chunk_id)"""
+        metadata = json.loads(self._string(self.extra_buffer, self.extra_offsets, self.extra_ids[chunk_id]))
+        source_id = self.source_ids[chunk_id]
+        if source_id != MISSING:
+            metadata["source"] = self.sources[source_id]
+        category_id = self.category_ids[chunk_id]
+        if category_id != MISSING:
+            metadata["category"] = self.categories[category_id]
+        for name in _INT_COLUMNS:
+            value = int(getattr(self, name)[chunk_id])
+            if value != MISSING:
+                metadata[name] = value
+        metadata["chunk_id"] = chunk_id
+        return metadata
+
+    def document(self, chunk_id: int) -> Document:
+        """Document чанка (создается при каждом обращении)"""
+        return Document(page_content=self.text(chunk_id), metadata=self.metadata(chunk_id))
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def describe(self) -> dict:
+        """Размер хранилища (для статистики)"""
+        size = len(self)
+        return {
+            "chunks": size,
+            "bytes": self.nbytes(),
+            "bytes_per_chunk": self.nbytes() / size if size else 0.0,
+            "memory_mapped": isinstance(self.text_buffer, np.memmap),
+        }
+
+
+def _remove_generation(directory: str):
+    """Удаление директории поколения, хранилище которого больше никто не читает"""
+    _live_generations.discard(directory)
+    shutil.rmtree(directory, ignore_errors=True)
+    logger.info(f"Chunk store generation removed: {directory}")
+
+
+def save_generation(store: ChunkStore, root: str) -> ChunkStore:
+    """
+    Сохранение поколения индекса в новую поддиректорию root и открытие через memory map
+
+    Файлы прошлых поколений не перезаписываются. Директория удаляется, когда
+    открытое хранилище собрано сборщиком мусора, т.е. после завершения
+    последнего запроса к нему. Поколения, оставшиеся от прошлых запусков,
+    удаляются при сохранении нового.
+
+    Args:
+        store: хранилище в памяти (ChunkStore.from_documents)
+        root: CHUNK_STORE_DIR
+    """
+    path = Path(root)
+    path.mkdir(parents=True, exist_ok=True)
+    for stale in path.glob(f"{_GENERATION_PREFIX}*"):
+        if stale.is_dir() and str(stale) not in _live_generations:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    directory = tempfile.mkdtemp(prefix=_GENERATION_PREFIX, dir=path)
+    try:
+        store.save(directory)
+        loaded = ChunkStore.load(directory)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    _live_generations.add(directory)
+    weakref.finalize(loaded, _remove_generation, directory)
+    return loaded
+
+
+class ChunkSequence(Sequence):
+    """
+    Последовательность Document поверх ChunkStore (замена списка rag.chunks)
+
+    chunks[chunk_id] создает Document по требованию; сами Document не хранятся.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store.document(i) for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk_id out of range")
+        return self.store.document(index)
+
+
+class ChunkStoreRetriever(BaseRetriever):
+    """
+    Semantic retriever по матрице эмбеддингов хранилища (замена vector_store.as_retriever)
+
+    Cosine similarity запроса со всеми чанками - одно умножение на float32
+    матрицу; Document создаются только для top-k.
+    """
+
+    chunks: Any = None
+    """ChunkSequence с хранилищем"""
+    embedding: Any = None
+    """LangChain embeddings для запросов"""
+    search_kwargs: dict = Field(default_factory=dict)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def similarity_search_with_score(self, query: str, k: int) -> list:
+        """top-k чанков с cosine similarity"""
+        query_vector = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        scores = self.chunks.store.vectors @ query_vector
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        # При равных scores - по возрастанию chunk_id (детерминированный порядок)
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(self.chunks[int(i)], float(scores[i])) for i in top]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        k = self.search_kwargs.get("k", 4)
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
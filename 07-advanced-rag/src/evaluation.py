@@ -18,6 +18,7 @@ from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.run_config import RunConfig
 from config import config
+import embedding_cache
 import rag
 
 logger = logging.getLogger(__name__)
@@ -33,16 +34,24 @@ def create_ragas_embeddings():
     """
     provider = config.RAGAS_EMBEDDING_PROVIDER.lower()
     
+    # embed_query через общий кеш процесса: повторные прогоны evaluation
+    # не эмбеддят одни и те же вопросы/ответы заново
     if provider == "openai":
         logger.info(f"Creating RAGAS OpenAI embeddings: {config.RAGAS_EMBEDDING_MODEL}")
-        return OpenAIEmbeddings(model=config.RAGAS_EMBEDDING_MODEL)
+        return embedding_cache.with_query_cache(
+            OpenAIEmbeddings(model=config.RAGAS_EMBEDDING_MODEL),
+            model_id=f"openai:{config.RAGAS_EMBEDDING_MODEL}"
+        )
     
     elif provider == "huggingface":
         logger.info(f"Creating RAGAS HuggingFace embeddings: {config.RAGAS_HUGGINGFACE_EMBEDDING_MODEL} on {config.RAGAS_HUGGINGFACE_DEVICE}")
-        return HuggingFaceEmbeddings(
-            model_name=config.RAGAS_HUGGINGFACE_EMBEDDING_MODEL,
-            model_kwargs={'device': config.RAGAS_HUGGINGFACE_DEVICE},
-            encode_kwargs={'normalize_embeddings': True}
+        return embedding_cache.with_query_cache(
+            HuggingFaceEmbeddings(
+                model_name=config.RAGAS_HUGGINGFACE_EMBEDDING_MODEL,
+                model_kwargs={'device': config.RAGAS_HUGGINGFACE_DEVICE},
+                encode_kwargs={'normalize_embeddings': True}
+            ),
+            model_id=f"huggingface:{config.RAGAS_HUGGINGFACE_EMBEDDING_MODEL}"
         )
     
     else:
@@ -196,6 +205,9 @@ def evaluate_dataset(dataset_name: Optional[str] = None) -> Dict[str, Any]:
             "approach": "RAGAS batch evaluation + LangSmith feedback",
             "model": config.MODEL,
             "embedding_model": config.EMBEDDING_MODEL,
+            "context_compression": config.CONTEXT_COMPRESSION,
+            "context_compression_scorer": config.CONTEXT_COMPRESSION_SCORER,
+            "context_compression_top_sentences": config.CONTEXT_COMPRESSION_TOP_SENTENCES,
         },
         blocking=False,
     ):
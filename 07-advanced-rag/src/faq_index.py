@@ -0,0 +1,71 @@
+"""
+Индекс вопросов FAQ из JSON корпуса для прямого ответа без RAG pipeline
+
+Вопросы Q&A пар (metadata["question"]) индексируются двумя способами:
+- хеш нормализованного текста - точное совпадение без эмбеддинга
+- матрица нормализованных эмбеддингов вопросов - перефразированные вопросы
+
+Если вопрос пользователя совпадает с известным выше порога similarity,
+возвращается сохраненный ответ: без query transformation, retrieval,
+reranking и генерации.
+"""
+import logging
+import numpy as np
+from retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class FaqIndex:
+    """
+    Индекс вопросов FAQ по chunk_id Q&A чанков
+
+    Args:
+        chunks: список Document, позиция в списке = chunk_id
+        embeddings: LangChain embeddings (embed_documents для вопросов)
+    """
+
+    def __init__(self, chunks: list, embeddings):
+        entries = [
+            (chunk_id, chunk.metadata["question"])
+            for chunk_id, chunk in enumerate(chunks)
+            if chunk.metadata.get("question") and chunk.metadata.get("answer")
+        ]
+        self.chunk_ids = np.array([chunk_id for chunk_id, _ in entries], dtype=np.int32)
+        self._exact = {normalize_query(question): chunk_id for chunk_id, question in entries}
+
+        self._matrix = None
+        if entries:
+            vectors = np.asarray(embeddings.embed_documents([question for _, question in entries]), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._matrix = vectors / norms
+
+        logger.info(f"FAQ index built: {len(entries)} questions")
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def match_exact(self, query: str):
+        """chunk_id вопроса с тем же нормализованным текстом или None"""
+        return self._exact.get(normalize_query(query))
+
+    def match(self, query_embedding, threshold: float):
+        """
+        Ближайший вопрос по cosine similarity
+
+        Returns:
+            tuple: (chunk_id, similarity) или None, если ниже порога
+        """
+        if self._matrix is None:
+            return None
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        similarities = self._matrix @ (vector / norm)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < threshold:
+            return None
+        return int(self.chunk_ids[best]), similarity
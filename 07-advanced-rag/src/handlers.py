@@ -1,10 +1,15 @@
+import asyncio
+import contextlib
 import logging
+import time
 from aiogram import Router
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.types import Message
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from config import config
 import indexer
+import query_rewrite
 import rag
 import evaluation
 
@@ -14,6 +19,9 @@ router = Router()
 # Глобальный словарь для хранения историй диалогов в формате LangChain Messages
 chat_conversations: dict[int, list] = {}
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+STREAM_CURSOR = " ▌"
+
 @router.message(Command("start"))
 async def cmd_start(message: Message):
     logger.info(f"User {message.chat.id} started the bot")
@@ -22,6 +30,7 @@ async def cmd_start(message: Message):
     chat_conversations[message.chat.id] = [
         SystemMessage(content=config.SYSTEM_PROMPT)
     ]
+    rag.forget_chat(message.chat.id)
     
     await message.answer(
         "Привет! Я RAG-ассистент Сбербанка.\n\n"
@@ -75,6 +84,7 @@ async def cmd_index(message: Message):
         if result and result[0] is not None:
             rag.vector_store, rag.chunks = result
             rag.initialize_retriever()
+            rag.start_cache_warmup()
             stats = rag.get_vector_store_stats()
             await message.answer(
                 f"✅ Переиндексация завершена!\n"
@@ -121,6 +131,63 @@ async def cmd_index_status(message: Message):
             f"• Reranker top k: {stats.get('reranker_top_k', 'N/A')}\n"
             f"• Cross-encoder: {stats.get('cross_encoder_model', 'N/A').split('/')[-1]}\n"
         )
+        if 'cascade' in stats:
+            status_text += f"• Cascade: reranking пропущен в {stats['cascade']['skip_rate']:.0%} запросов\n"
+    
+    if 'adaptive_k' in stats and stats['adaptive_k']['queries']:
+        adaptive = stats['adaptive_k']
+        status_text += (
+            f"• Adaptive k: в среднем {adaptive['avg_candidates']:.1f} кандидатов "
+            f"(-{adaptive['candidates_saved_rate']:.0%}), документов -{adaptive['kept_saved_rate']:.0%}\n"
+        )
+    
+    if 'chunk_store' in stats:
+        store = stats['chunk_store']
+        status_text += (
+            f"• Хранилище чанков: {store['bytes'] / 1024 / 1024:.1f} МБ, "
+            f"{store['bytes_per_chunk'] / 1024:.1f} КБ на чанк{' (mmap)' if store['memory_mapped'] else ''}\n"
+        )
+    if 'hierarchy' in stats:
+        status_text += f"• Иерархический поиск: {stats['hierarchy']['sections']} секций\n"
+    if 'retrieval_cache' in stats:
+        cache = stats['retrieval_cache']
+        status_text += f"• Кеш retrieval: {cache['size']}/{cache['max_size']}, hit rate {cache['hit_rate']:.0%}\n"
+    if 'warmup' in stats:
+        warmup = stats['warmup']
+        state = "идет" if warmup['running'] else f"{warmup['last_ms'] / 1000:.1f} с"
+        status_text += f"• Прогрев кешей: {warmup['warmed']}/{warmup['queries']} частых запросов ({state})\n"
+    if 'coalescing' in stats:
+        coalescing = stats['coalescing']
+        status_text += (
+            f"• Объединено одинаковых запросов: {coalescing['answers']['coalesced']} ответов, "
+            f"{coalescing['retrieval']['coalesced']} retrieval\n"
+        )
+    if 'answer_cache' in stats:
+        cache = stats['answer_cache']
+        status_text += f"• Кеш ответов: {cache['size']}/{cache['max_size']}, hit rate {cache['hit_rate']:.0%}\n"
+    
+    latency = stats['answer_latency']
+    if latency['answers']:
+        status_text += (
+            f"• Первый токен ответа (TTFT): p50 {latency['ttft_p50_ms'] / 1000:.1f} с, "
+            f"p95 {latency['ttft_p95_ms'] / 1000:.1f} с\n"
+        )
+    
+    rewrite = stats['query_rewrite']
+    if rewrite['turns']:
+        status_text += (
+            f"• Query transform пропущен в {rewrite['skip_rate']:.0%} запросов "
+            f"(сэкономлено ~{rewrite['latency_saved_ms'] / 1000:.1f} с)\n"
+        )
+    if 'speculative_retrieval' in stats:
+        speculative = stats['speculative_retrieval']
+        status_text += f"• Speculative retrieval: использован в {speculative['reuse_rate']:.0%} переписанных запросов\n"
+    if 'working_set' in stats:
+        working = stats['working_set']
+        status_text += f"• Рабочий набор чата: {working['hit_rate']:.0%} уточняющих вопросов без повторного поиска\n"
+    if 'query_transform_cache' in stats:
+        cache = stats['query_transform_cache']
+        status_text += f"• Кеш query transform: {cache['size']}/{cache['max_size']}, hit rate {cache['hit_rate']:.0%}\n"
     
     # Информация об embeddings
     status_text += f"\n🧬 *Embeddings: {stats['embedding_provider']}*\n"
@@ -131,6 +198,12 @@ async def cmd_index_status(message: Message):
             f"• Модель: {stats.get('embedding_model', 'N/A').split('/')[-1]}\n"
             f"• Устройство: {stats.get('device', 'N/A')}\n"
         )
+    if 'faq' in stats:
+        faq = stats['faq']
+        status_text += f"• FAQ: {faq['questions']} вопросов, прямой ответ на {faq['hit_rate']:.0%} запросов\n"
+    if 'query_embedding_cache' in stats:
+        cache = stats['query_embedding_cache']
+        status_text += f"• Кеш запросов: {cache['size']}/{cache['max_size']}, hit rate {cache['hit_rate']:.0%}\n"
     
     await message.answer(status_text, parse_mode="Markdown")
 
@@ -222,6 +295,100 @@ async def cmd_evaluate_dataset(message: Message):
             f"Проверьте логи для подробностей."
         )
 
+def _with_sources(answer: str, documents: list) -> str:
+    """Итоговый ответ с источниками, если включено"""
+    if config.SHOW_SOURCES and documents:
+        sources = rag.format_sources(documents)
+        if sources:
+            return f"{answer}\n\n{sources}"
+    return answer
+
+def _split_message(text: str) -> list:
+    """Части текста не длиннее лимита Telegram (разрыв по последнему переводу строки)"""
+    parts = []
+    while len(text) > TELEGRAM_MESSAGE_LIMIT:
+        cut = text.rfind("\n", 0, TELEGRAM_MESSAGE_LIMIT)
+        if cut <= 0:
+            cut = TELEGRAM_MESSAGE_LIMIT
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+async def _edit_text(placeholder: Message, text: str) -> bool:
+    """
+    Редактирование сообщения; False если Telegram попросил подождать
+    
+    Текст должен укладываться в TELEGRAM_MESSAGE_LIMIT. Остальные ошибки
+    Telegram (пустой текст, удаленное сообщение) пробрасываются.
+    """
+    try:
+        await placeholder.edit_text(text)
+        return True
+    except TelegramRetryAfter as e:
+        logger.warning(f"Telegram edit rate limit, retry after {e.retry_after}s")
+        await asyncio.sleep(e.retry_after)
+        return False
+    except TelegramBadRequest as e:
+        # Текст не изменился с прошлого редактирования - редактировать нечего
+        if "message is not modified" not in str(e):
+            raise
+        logger.debug(f"Edit skipped: {e}")
+        return True
+
+async def _answer_streaming(message: Message, history: list):
+    """
+    Стриминг ответа: заглушка редактируется по мере генерации не чаще
+    STREAM_EDIT_INTERVAL, источники добавляются в финальное редактирование
+    
+    Пока ответ генерируется, показывается его начало в пределах лимита
+    Telegram; длинный итоговый ответ продолжается отдельными сообщениями.
+    """
+    start = time.perf_counter()
+    placeholder = await message.answer("⏳ Ищу ответ в документах...")
+    answer = ""
+    documents = []
+    first_visible_ms = None
+    last_edit = 0.0
+    
+    try:
+        async for event in rag.rag_answer_stream(history, chat_id=message.chat.id):
+            if "documents" in event:
+                documents = event["documents"]
+                continue
+            answer += event["token"]
+            
+            if time.monotonic() - last_edit < config.STREAM_EDIT_INTERVAL or not answer.strip():
+                continue
+            preview = answer[:TELEGRAM_MESSAGE_LIMIT - len(STREAM_CURSOR)] + STREAM_CURSOR
+            if await _edit_text(placeholder, preview) and first_visible_ms is None:
+                first_visible_ms = (time.perf_counter() - start) * 1000
+            last_edit = time.monotonic()
+    except Exception:
+        # Сообщение могло быть уже удалено - исходная ошибка важнее
+        with contextlib.suppress(TelegramBadRequest):
+            await placeholder.delete()
+        raise
+    
+    parts = _split_message(_with_sources(answer, documents))
+    try:
+        while not await _edit_text(placeholder, parts[0]):
+            pass
+    except Exception:
+        # Заглушка "Ищу ответ" не должна остаться вместо ответа
+        # Сообщение могло быть уже удалено - исходная ошибка важнее
+        with contextlib.suppress(TelegramBadRequest):
+            await placeholder.delete()
+        raise
+    # Продолжение длинного ответа - новыми сообщениями, а не обрезка
+    for part in parts[1:]:
+        await message.answer(part)
+    # В историю - только ответ, который пользователь увидел
+    chat_conversations[message.chat.id].append(AIMessage(content=answer))
+    
+    total_ms = (time.perf_counter() - start) * 1000
+    rag.record_answer_latency(first_visible_ms or total_ms, total_ms)
+
 @router.message()
 async def handle_message(message: Message):
     # Игнорируем сообщения без текста (стикеры, фото и т.д.)
@@ -254,9 +421,25 @@ async def handle_message(message: Message):
             chat_conversations[message.chat.id].pop()
             return
         
+        # Известный вопрос FAQ (только самостоятельные вопросы) - ответ без RAG pipeline
+        history = chat_conversations[message.chat.id][1:]
+        if config.FAQ_FAST_PATH and query_rewrite.skip_reason(history) is not None:
+            start = time.perf_counter()
+            result = await rag.faq_answer(message.text)
+            if result is not None:
+                chat_conversations[message.chat.id].append(AIMessage(content=result["answer"]))
+                await message.answer(_with_sources(result["answer"], result["documents"]))
+                total_ms = (time.perf_counter() - start) * 1000
+                rag.record_answer_latency(total_ms, total_ms)
+                return
+        
         # Получаем ответ через RAG (передаем историю без system message)
+        if config.STREAM_ANSWERS:
+            await _answer_streaming(message, chat_conversations[message.chat.id][1:])
+            return
+        
         # Теперь возвращает dict с answer и documents
-        result = await rag.rag_answer(chat_conversations[message.chat.id][1:])
+        result = await rag.rag_answer(chat_conversations[message.chat.id][1:], chat_id=message.chat.id)
         answer = result["answer"]
         documents = result["documents"]
         
@@ -265,14 +448,7 @@ async def handle_message(message: Message):
             AIMessage(content=answer)
         )
         
-        # Формируем итоговый ответ с источниками если включено
-        final_response = answer
-        if config.SHOW_SOURCES and documents:
-            sources = rag.format_sources(documents)
-            if sources:
-                final_response = f"{answer}\n\n{sources}"
-        
-        await message.answer(final_response)
+        await message.answer(_with_sources(answer, documents))
         
     except ValueError as e:
         logger.error(f"ValueError in handle_message for chat {message.chat.id}: {e}")
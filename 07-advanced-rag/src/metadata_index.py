@@ -0,0 +1,123 @@
+"""
+Индекс метаданных чанков для фильтрованного retrieval
+
+Для каждого значения source (имя файла) и category (JSON Q&A) заранее
+строится bitmap (bool массив по chunk_id), страницы хранятся в int массиве.
+Фильтр превращается в массив разрешенных chunk_id без обхода документов,
+и vector search / BM25 считают scores только для этого подмножества.
+
+Формат фильтра (все ключи опциональны, условия объединяются через AND):
+    {
+        "source": "usl_r_vkladov.pdf" или список имен файлов,
+        "category": "Вопросы о дебетовых картах" или список категорий,
+        "page_from": 3,  # включительно, только чанки со страницей
+        "page_to": 10,   # включительно
+    }
+"""
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NO_PAGE = -1
+
+
+def source_name(source: str) -> str:
+    """Имя файла из пути источника"""
+    return source.split('/')[-1] if '/' in source else source
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class MetadataIndex:
+    """
+    Bitmap индексы source/category и массив страниц по chunk_id
+
+    Args:
+        chunks: список Document, позиция в списке = chunk_id
+    """
+
+    def __init__(self, chunks: list):
+        self.size = len(chunks)
+        sources = [source_name(chunk.metadata.get('source', 'Unknown')) for chunk in chunks]
+        categories = [chunk.metadata.get('category', '') for chunk in chunks]
+
+        self.source_masks = {name: np.array([s == name for s in sources], dtype=bool) for name in set(sources)}
+        self.category_masks = {
+            name: np.array([c == name for c in categories], dtype=bool)
+            for name in set(categories) if name
+        }
+        self.pages = np.array(
+            [chunk.metadata.get('page', NO_PAGE) for chunk in chunks],
+            dtype=np.int32
+        )
+
+        logger.info(
+            f"Metadata index built: {self.size} chunks, "
+            f"{len(self.source_masks)} sources, {len(self.category_masks)} categories"
+        )
+
+    def _union(self, masks: dict, values: list, field: str) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            if value not in masks:
+                logger.warning(f"Unknown {field} in filter: {value}")
+                continue
+            mask |= masks[value]
+        return mask
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """Bitmap чанков, удовлетворяющих фильтру"""
+        mask = np.ones(self.size, dtype=bool)
+
+        sources = _as_list(filters.get("source"))
+        if sources:
+            mask &= self._union(self.source_masks, [source_name(s) for s in sources], "source")
+
+        categories = _as_list(filters.get("category"))
+        if categories:
+            mask &= self._union(self.category_masks, categories, "category")
+
+        page_from = filters.get("page_from")
+        page_to = filters.get("page_to")
+        if page_from is not None or page_to is not None:
+            mask &= self.pages != NO_PAGE
+            if page_from is not None:
+                mask &= self.pages >= page_from
+            if page_to is not None:
+                mask &= self.pages <= page_to
+
+        return mask
+
+    def unknown_values(self, filters: dict) -> dict:
+        """
+        Значения source/category из фильтра, которых нет в индексе
+
+        Returns:
+            dict: поле -> отсортированный список допустимых значений (только для полей с ошибкой)
+        """
+        unknown = {}
+        sources = [source_name(s) for s in _as_list(filters.get("source"))]
+        if any(s not in self.source_masks for s in sources):
+            unknown["source"] = sorted(self.source_masks)
+        categories = _as_list(filters.get("category"))
+        if any(c not in self.category_masks for c in categories):
+            unknown["category"] = sorted(self.category_masks)
+        return unknown
+
+    def allowed_ids(self, filters: dict) -> np.ndarray:
+        """Отсортированный массив chunk_id, удовлетворяющих фильтру"""
+        return np.flatnonzero(self.mask(filters))
+
+    def describe(self) -> dict:
+        """Количество чанков по источникам и категориям (для статистики)"""
+        return {
+            "sources": {name: int(mask.sum()) for name, mask in self.source_masks.items()},
+            "categories": {name: int(mask.sum()) for name, mask in self.category_masks.items()},
+        }
@@ -0,0 +1,49 @@
+"""
+Maximal Marginal Relevance (MMR) по эмбеддингам чанков из индекса
+
+Кандидаты выбираются жадно по score = lambda * sim(запрос, чанк) -
+(1 - lambda) * max sim(чанк, уже выбранные). Почти одинаковые чанки
+(одна таблица тарифов в перекрывающихся окнах, один Q&A в JSON и PDF)
+не занимают несколько мест в контексте.
+
+Эмбеддинги берутся из матрицы индекса (строка = chunk_id), повторного
+вызова embeddings нет; матрица попарных similarity кандидатов считается
+одним умножением.
+"""
+import numpy as np
+
+
+def mmr_select(query_vector: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float) -> list:
+    """
+    Индексы k кандидатов по MMR
+
+    Args:
+        query_vector: нормализованный эмбеддинг запроса
+        vectors: нормализованные эмбеддинги кандидатов [n x dim]
+        k: сколько кандидатов выбрать
+        lambda_mult: 1.0 - только релевантность, 0.0 - только разнообразие
+
+    Returns:
+        list[int]: выбранные индексы в исходном порядке кандидатов
+    """
+    n = len(vectors)
+    if n <= k:
+        return list(range(n))
+
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    # Порядок ранжирования (RRF / reranker) сохраняется
+    return sorted(selected)
@@ -0,0 +1,186 @@
+"""
+Политика переписывания запроса (query transformation) перед retrieval
+
+LLM переписывание нужно только для настоящих уточняющих вопросов, которые
+без истории диалога непонятны ("а для пенсионеров?", "какая по нему ставка?").
+Первый вопрос диалога и самостоятельные вопросы идут в retrieval как есть.
+
+Легкий локальный классификатор ищет в последнем сообщении пользователя
+признаки анафоры (местоимения, указательные слова) и эллипсиса (короткая
+реплика, начало с союза "а"/"и", "еще", "тоже" и т.п.).
+
+Результаты LLM переписывания кешируются по хвосту диалога (TransformCache).
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Местоимения и указательные слова, ссылающиеся на предыдущие реплики
+_ANAPHORA = re.compile(
+    r"\b(он|она|оно|они|его|ее|её|их|него|нее|неё|них|ему|ей|им|нему|ней|ним|нем|нём|"
+    r"этот|эта|это|эти|этого|этой|этому|этим|этих|этом|"
+    r"тот|та|те|того|той|тому|тем|тех|том|"
+    r"такой|такая|такое|такие|таких|там|туда|оттуда|тогда|"
+    r"выше|вышеуказанн\w*|данн(ый|ая|ое|ые|ого|ой|ому|ым|ых))\b",
+    re.IGNORECASE
+)
+
+# Маркеры эллипсиса и продолжения темы
+_ELLIPSIS = re.compile(
+    r"^\s*(а|и|но|или|ну)\b|"
+    r"\b(еще|ещё|тоже|также|подробнее|поподробнее|иначе|остальн\w*|другие|другой|"
+    r"в этом случае|а если|а как|а что|а сколько|а где|а когда)\b",
+    re.IGNORECASE
+)
+
+# Реплики короче этого числа слов считаются эллиптическими ("а для ИП?")
+MIN_STANDALONE_WORDS = 4
+
+
+def _human_messages(messages: list) -> list:
+    return [message for message in messages if getattr(message, "type", None) == "human"]
+
+
+def last_human_text(messages: list) -> str:
+    """Текст последнего сообщения пользователя"""
+    human = _human_messages(messages)
+    return human[-1].content if human else ""
+
+
+def is_first_turn(messages: list) -> bool:
+    """Первый вопрос диалога: в истории нет других сообщений"""
+    return len(messages) == 1 and len(_human_messages(messages)) == 1
+
+
+def follow_up_text(messages: list) -> str:
+    """Уточняющий вопрос вместе с предыдущим вопросом пользователя (без LLM)"""
+    human = _human_messages(messages)
+    return " ".join(message.content for message in human[-2:])
+
+
+def is_follow_up(text: str) -> bool:
+    """Классификатор: есть ли в реплике анафора или эллипсис"""
+    if len(re.findall(r"\w+", text)) < MIN_STANDALONE_WORDS:
+        return True
+    return bool(_ANAPHORA.search(text) or _ELLIPSIS.search(text))
+
+
+def skip_reason(messages: list):
+    """
+    Причина пропустить LLM переписывание или None, если оно нужно
+
+    Returns:
+        str | None: "first_turn", "standalone" или None
+    """
+    human = _human_messages(messages)
+    if len(human) <= 1:
+        return "first_turn"
+    if not is_follow_up(human[-1].content):
+        return "standalone"
+    return None
+
+
+class RewriteStats:
+    """Метрики политики: доля пропусков и сэкономленное время LLM вызовов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.llm_calls = 0
+        self.llm_total_ms = 0.0
+        self.skipped = {"first_turn": 0, "standalone": 0, "cache": 0}
+
+    def record_skip(self, reason: str):
+        with self._lock:
+            self.turns += 1
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+            saved_ms = self.llm_total_ms / self.llm_calls if self.llm_calls else 0.0
+        logger.info(f"Query transform skipped ({reason}), saved ~{saved_ms:.0f} ms")
+
+    def record_llm(self, latency_ms: float):
+        with self._lock:
+            self.turns += 1
+            self.llm_calls += 1
+            self.llm_total_ms += latency_ms
+        logger.info(f"Query transform LLM call: {latency_ms:.0f} ms")
+
+    def stats(self) -> dict:
+        """Доля пропусков и оценка сэкономленного времени (средняя latency LLM x пропуски)"""
+        with self._lock:
+            skipped = sum(self.skipped.values())
+            avg_llm_ms = self.llm_total_ms / self.llm_calls if self.llm_calls else 0.0
+            return {
+                "turns": self.turns,
+                "llm_calls": self.llm_calls,
+                "skipped": dict(self.skipped),
+                "skip_rate": skipped / self.turns if self.turns else 0.0,
+                "avg_llm_ms": avg_llm_ms,
+                "latency_saved_ms": skipped * avg_llm_ms,
+            }
+
+
+class TransformCache:
+    """
+    Ограниченный LRU кеш: хвост диалога + промпт + модель -> переписанный запрос
+
+    Ключ - sha1 от последних max_messages нормализованных сообщений, версии
+    промпта, модели и temperature. Повтор вопроса или одинаковый первый
+    вопрос разных пользователей не вызывает LLM повторно.
+
+    Args:
+        max_size: максимальное количество записей
+        max_messages: сколько последних сообщений входит в ключ
+    """
+
+    def __init__(self, max_size: int, max_messages: int):
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, messages: list, prompt_version: str, model: str, temperature: float) -> str:
+        tail = [
+            [getattr(message, "type", ""), normalize_query(str(message.content))]
+            for message in messages[-self.max_messages:]
+        ]
+        payload = json.dumps([prompt_version, model, temperature, tail], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            query = self._data.get(key)
+            if query is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return query
+
+    def put(self, key: str, query: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = query
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Метрики кеша: hits, misses, hit rate, размер"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
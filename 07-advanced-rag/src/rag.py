@@ -1,30 +1,149 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
 import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough, RunnablePick
 from langchain_openai import ChatOpenAI
 from langchain_community.retrievers import BM25Retriever
 from langchain_classic.retrievers import EnsembleRetriever
 from config import config
+import context_compressor
+import adaptive_k
+import bm25_index
+import chunk_store
+import context_packer
+import embedding_cache
+import faq_index
+import indexer
+import metadata_index
+import mmr
+import query_log
+import query_rewrite
+import reranker
+import retrieval_cache
+import section_index
+import single_flight
+import working_set
 
 logger = logging.getLogger(__name__)
 
 # Глобальные переменные
 vector_store = None
 retriever = None
-chunks = None  # Для BM25 retriever
+chunks = None  # Для BM25 retriever (список Document или ChunkSequence при CHUNK_STORE)
 cross_encoder = None  # Для reranking (lazy loading)
+index_generation = 0  # Номер текущего индекса, увеличивается при каждой инициализации retriever
+chunk_metadata_index = None  # Bitmap индексы source/category/page по chunk_id
+_embedding_matrix = None  # Нормализованные эмбеддинги чанков (строка = chunk_id)
+_bm25_postings = None  # Posting lists BM25 для пакетного поиска (hybrid режимы)
+_chunk_prev = None  # chunk_id предыдущего чанка той же страницы (-1 = нет)
+_chunk_next = None  # chunk_id следующего чанка той же страницы (-1 = нет)
+faq = None  # Индекс вопросов FAQ для прямых ответов (FAQ_FAST_PATH)
+sections = None  # Центроиды секций для иерархического retrieval (HIERARCHICAL_RETRIEVAL)
+_faq_stats = {"lookups": 0, "exact": 0, "semantic": 0}
+_faq_stats_lock = threading.Lock()
+_llm_faq_paraphrase = None
+_faq_paraphrase_prompt = None
+
+# Метрики политики переписывания запроса (пропуски LLM query transformation)
+_rewrite_stats = query_rewrite.RewriteStats()
+
+# Кеш результатов LLM переписывания запроса (хвост диалога -> поисковый запрос)
+_transform_cache = query_rewrite.TransformCache(
+    max_size=config.QUERY_TRANSFORM_CACHE_SIZE,
+    max_messages=config.QUERY_TRANSFORM_CACHE_MESSAGES
+)
+_query_transform_prompt_version = None  # sha1 текста промпта query transformation
+
+# Рабочие наборы чанков чатов для уточняющих вопросов
+_working_sets = working_set.ChatWorkingSets(
+    max_chats=config.WORKING_SET_MAX_CHATS,
+    max_turns=config.WORKING_SET_TURNS
+)
+
+# Семантический кеш ответов для первых вопросов диалога: запрос -> ответ и id чанков источников
+_answer_cache = retrieval_cache.SemanticCache(
+    max_size=config.ANSWER_CACHE_SIZE,
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    name="answer"
+)
+_answer_prompt_version = None  # sha1 системного промпта ответа и модели
+
+# Время до первого видимого токена ответа (TTFT) и полное время ответа, мс
+_answer_latency = {"ttft_ms": deque(maxlen=500), "total_ms": deque(maxlen=500)}
+_answer_latency_lock = threading.Lock()
+
+# Объединение одинаковых одновременных запросов (REQUEST_COALESCING): retrieval ...
+_retrieval_flight = single_flight.SingleFlight("retrieval")
+# ... и одинаковых первых вопросов диалога целиком (transform, retrieval, генерация)
+_answer_flight = single_flight.SingleFlight("answer")
+
+# Журнал запросов пользователей (QUERY_LOG_ENABLED) и фоновый прогрев кешей по нему
+_query_log = None
+_warmup_task = None
+_warmup_stats = {"runs": 0, "queries": 0, "warmed": 0, "last_ms": 0.0, "running": False}
+
+# Семантический кеш результатов retrieval: эмбеддинг запроса -> id чанков
+_retrieval_cache = retrieval_cache.SemanticCache(
+    max_size=config.RETRIEVAL_CACHE_SIZE,
+    threshold=config.RETRIEVAL_CACHE_THRESHOLD,
+    name="retrieval"
+)
+
+# Статистика cascade reranking (skip rate и аудит качества)
+_cascade_stats = {
+    "queries": 0,
+    "skipped": 0,
+    "reranked_pairs": 0,
+    "full_pairs": 0,
+    "audited": 0,
+    "audit_top1_agree": 0,
+    "audit_topk_overlap": 0.0,
+}
+_cascade_stats_lock = threading.Lock()
+
+# Адаптивный top-k: сколько кандидатов/документов ушло дальше
+_adaptive_k_stats = adaptive_k.AdaptiveKStats()
+
+# Статистика speculative retrieval (параллельно с query transformation)
+_speculative_stats = {"queries": 0, "reused": 0, "merged": 0, "failed": 0}
+_speculative_stats_lock = threading.Lock()
+
+# Отдельный ограниченный пул для CPU-тяжелых этапов retrieval (BM25, cross-encoder),
+# чтобы они не блокировали event loop aiogram и не занимали общий default executor
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=config.RETRIEVAL_EXECUTOR_WORKERS,
+    thread_name_prefix="retrieval"
+)
 
 # Кеши для промптов и LLM клиентов
 _conversational_answering_prompt = None
 _retrieval_query_transform_prompt = None
 _llm_query_transform = None
 _llm = None
+_rag_chain = None  # Собранная LCEL цепочка (пересобирается при смене режима или индекса)
+_rag_chain_key = None
 
 def create_semantic_retriever():
-    """Создание semantic retriever из vector store"""
+    """Создание semantic retriever из vector store (или из матрицы хранилища чанков)"""
     if vector_store is None:
         raise ValueError("Vector store not initialized")
+    if _compact_store() is not None:
+        return chunk_store.ChunkStoreRetriever(
+            chunks=chunks,
+            embedding=vector_store.embedding,
+            search_kwargs={'k': config.SEMANTIC_RETRIEVER_K}
+        )
     return vector_store.as_retriever(
         search_kwargs={'k': config.SEMANTIC_RETRIEVER_K}
     )
@@ -33,7 +152,12 @@ def create_bm25_retriever():
     """Создание BM25 retriever из chunks"""
     if chunks is None or len(chunks) == 0:
         raise ValueError("Chunks not initialized for BM25")
-    bm25 = BM25Retriever.from_documents(chunks)
+    if _compact_store() is not None:
+        # Индекс BM25 по текстам хранилища, документы - ленивая последовательность по chunk_id
+        bm25 = BM25Retriever.from_texts(chunks.store.texts())
+        bm25.docs = chunks
+    else:
+        bm25 = BM25Retriever.from_documents(chunks)
     bm25.k = config.BM25_RETRIEVER_K
     return bm25
 
@@ -55,16 +179,14 @@ def get_cross_encoder():
     global cross_encoder
     if cross_encoder is None:
         try:
-            from sentence_transformers import CrossEncoder
-            logger.info(f"Loading cross-encoder model: {config.CROSS_ENCODER_MODEL}")
-            cross_encoder = CrossEncoder(config.CROSS_ENCODER_MODEL)
-            logger.info("✓ Cross-encoder loaded successfully")
+            cross_encoder = reranker.create_cross_encoder()
+            logger.info(f"✓ Cross-encoder loaded successfully (backend: {config.RERANKER_BACKEND})")
         except Exception as e:
             logger.error(f"Failed to load cross-encoder: {e}", exc_info=True)
             raise
     return cross_encoder
 
-def rerank_documents(query: str, documents: list, top_k: int = None):
+def rerank_documents(query: str, documents: list, top_k: int = None, adaptive: bool = None):
     """
     Переранжирование документов с помощью cross-encoder
     
@@ -72,6 +194,8 @@ def rerank_documents(query: str, documents: list, top_k: int = None):
         query: Запрос пользователя
         documents: Список Document объектов
         top_k: Количество документов для возврата (default: config.RERANKER_TOP_K)
+        adaptive: отсечь документы по кривой scores (default: config.ADAPTIVE_K),
+            top_k остается верхней границей
     
     Returns:
         List[tuple]: Список (document, score) отсортированный по релевантности
@@ -82,22 +206,270 @@ def rerank_documents(query: str, documents: list, top_k: int = None):
     if not documents:
         return []
     
+    if config.MMR_STAGE == "rerank":
+        documents = diversify_documents(query, documents, config.MMR_TOP_K)
+    
     encoder = get_cross_encoder()
     
     # Создаем пары (query, document_text) для cross-encoder
     pairs = [(query, doc.page_content) for doc in documents]
     
-    # Cross-encoder оценивает релевантность каждой пары
-    scores = encoder.predict(pairs)
+    # Cross-encoder оценивает релевантность каждой пары (батчи отсортированы по длине)
+    scores = encoder.predict(pairs, batch_size=config.RERANKER_BATCH_SIZE)
     
+    return _select_reranked(documents, scores, top_k, adaptive)
+
+def _select_reranked(documents: list, scores, top_k: int, adaptive: bool = None):
+    """Сортировка по scores cross-encoder и отбор top_k (или адаптивного k)"""
     # Сортируем по убыванию score
     ranked = sorted(zip(documents, scores), key=lambda x: x[1], reverse=True)
     
+    if config.ADAPTIVE_K if adaptive is None else adaptive:
+        fixed_k = min(top_k, len(ranked))
+        top_k = min(fixed_k, adaptive_k.rerank_cutoff(
+            [score for _, score in ranked],
+            config.ADAPTIVE_K_MIN_DOCUMENTS,
+            config.ADAPTIVE_K_RERANK_THRESHOLD
+        ))
+        _adaptive_k_stats.record("kept", top_k, fixed_k)
+    
     logger.info(f"Reranked {len(documents)} documents, returning top {top_k}")
     
     # Возвращаем top_k наиболее релевантных
     return ranked[:top_k]
 
+def rerank_documents_batch(queries: list, documents_lists: list, top_k: int = None):
+    """
+    Переранжирование кандидатов нескольких запросов одним батчем cross-encoder
+    
+    Returns:
+        list[list[tuple]]: для каждого запроса (document, score) как в rerank_documents
+    """
+    if top_k is None:
+        top_k = config.RERANKER_TOP_K
+    
+    if config.MMR_STAGE == "rerank":
+        documents_lists = [
+            diversify_documents(query, documents, config.MMR_TOP_K)
+            for query, documents in zip(queries, documents_lists)
+        ]
+    pairs = [(query, doc.page_content) for query, documents in zip(queries, documents_lists) for doc in documents]
+    if not pairs:
+        return [[] for _ in queries]
+    scores = get_cross_encoder().predict(pairs, batch_size=config.RERANKER_BATCH_SIZE)
+    
+    results = []
+    offset = 0
+    for documents in documents_lists:
+        results.append(_select_reranked(documents, scores[offset:offset + len(documents)], top_k) if documents else [])
+        offset += len(documents)
+    return results
+
+def _semantic_leg(semantic_retriever, query: str):
+    """Semantic кандидаты вместе с cosine similarity"""
+    k = semantic_retriever.search_kwargs.get('k', config.SEMANTIC_RETRIEVER_K)
+    if isinstance(semantic_retriever, chunk_store.ChunkStoreRetriever):
+        return semantic_retriever.similarity_search_with_score(query, k)
+    return semantic_retriever.vectorstore.similarity_search_with_score(query, k=k)
+
+def _bm25_leg(bm25_retriever, query: str):
+    """BM25 кандидаты вместе с BM25 scores (тот же top-k, что и BM25Retriever.invoke)"""
+    scores = bm25_retriever.vectorizer.get_scores(bm25_retriever.preprocess_func(query))
+    top = np.argsort(-scores)[:bm25_retriever.k]
+    return [(bm25_retriever.docs[i], float(scores[i])) for i in top]
+
+def _semantic_leg_subset(query: str, candidate_ids: np.ndarray, k: int):
+    """Semantic поиск только по chunk_id из candidate_ids (матрица эмбеддингов чанков)"""
+    query_vector = np.asarray(vector_store.embedding.embed_query(query), dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) or 1.0
+    similarities = _embedding_matrix[candidate_ids] @ query_vector
+    top = np.argsort(-similarities)[:k]
+    return [(chunks[candidate_ids[i]], float(similarities[i])) for i in top]
+
+def _bm25_leg_subset(bm25_retriever, query: str, candidate_ids: np.ndarray):
+    """BM25 scores только для chunk_id из candidate_ids (IDF по всему корпусу)"""
+    scores = np.asarray(bm25_retriever.vectorizer.get_batch_scores(
+        bm25_retriever.preprocess_func(query),
+        candidate_ids.tolist()
+    ))
+    top = np.argsort(-scores)[:bm25_retriever.k]
+    return [(bm25_retriever.docs[candidate_ids[i]], float(scores[i])) for i in top]
+
+def _cut_leg(hits: list) -> list:
+    """Адаптивное отсечение кандидатов одной ноги по кривой scores (ADAPTIVE_K)"""
+    if not config.ADAPTIVE_K or not hits:
+        return hits
+    k = adaptive_k.candidate_cutoff(
+        [score for _, score in hits],
+        config.ADAPTIVE_K_MIN_CANDIDATES,
+        config.ADAPTIVE_K_MAX_DROP
+    )
+    return hits[:k]
+
+def _adaptive_candidates(*legs) -> tuple:
+    """Отсечение кандидатов всех ног с записью статистики"""
+    cut = tuple(_cut_leg(hits) for hits in legs)
+    if config.ADAPTIVE_K:
+        adaptive, fixed = sum(len(hits) for hits in cut), sum(len(hits) for hits in legs)
+        _adaptive_k_stats.record("candidates", adaptive, fixed)
+        logger.info(f"Adaptive k: {adaptive}/{fixed} candidates ({', '.join(str(len(hits)) for hits in cut)})")
+    return cut
+
+def _hybrid_legs(query: str, candidate_ids: np.ndarray = None):
+    """
+    Semantic и BM25 кандидаты со scores: по всему корпусу или по подмножеству chunk_id
+    
+    При ADAPTIVE_K каждая нога обрезается по своей кривой scores.
+    """
+    semantic_retriever, bm25_retriever = retriever.retrievers
+    if candidate_ids is None:
+        legs = _semantic_leg(semantic_retriever, query), _bm25_leg(bm25_retriever, query)
+    else:
+        legs = (
+            _semantic_leg_subset(query, candidate_ids, semantic_retriever.search_kwargs.get('k', config.SEMANTIC_RETRIEVER_K)),
+            _bm25_leg_subset(bm25_retriever, query, candidate_ids)
+        )
+    return _adaptive_candidates(*legs)
+
+def _fuse_legs(semantic_hits: list, bm25_hits: list):
+    """RRF fusion двух ног hybrid retrieval с весами ensemble retriever"""
+    return _fuse_rrf(
+        [[doc for doc, _ in semantic_hits], [doc for doc, _ in bm25_hits]],
+        retriever.weights,
+        retriever.c
+    )
+
+def _fuse_rrf(ranked_lists: list, weights: list, c: int = 60):
+    """
+    Weighted Reciprocal Rank Fusion как в EnsembleRetriever (дедупликация по page_content)
+    
+    Returns:
+        List[tuple]: Список (document, rrf_score) по убыванию score
+    """
+    scores = {}
+    docs = {}
+    for doc_list, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(doc_list, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rank + c)
+            docs.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [(docs[key], scores[key]) for key in ordered]
+
+def _query_overlap(query: str, document) -> float:
+    """Доля слов запроса (длиннее 2 символов), встречающихся в документе"""
+    query_words = {w for w in re.findall(r"\w+", query.lower()) if len(w) > 2}
+    if not query_words:
+        return 0.0
+    doc_words = set(re.findall(r"\w+", document.page_content.lower()))
+    return len(query_words & doc_words) / len(query_words)
+
+def _first_stage_confidence(query: str, semantic_hits: list, bm25_hits: list, fused: list) -> dict:
+    """
+    Дешевые сигналы уверенности первого этапа (без cross-encoder)
+    
+    - semantic_gap: разница cosine similarity между rank 1 и rank 2
+    - legs_agree: semantic и BM25 ставят на первое место один и тот же чанк
+    - overlap: доля слов запроса в top-1 документе после fusion
+    """
+    semantic_gap = 0.0
+    if len(semantic_hits) >= 2:
+        semantic_gap = float(semantic_hits[0][1] - semantic_hits[1][1])
+    legs_agree = bool(
+        semantic_hits and bm25_hits
+        and semantic_hits[0][0].page_content == bm25_hits[0][0].page_content
+    )
+    overlap = _query_overlap(query, fused[0][0]) if fused else 0.0
+    return {"semantic_gap": semantic_gap, "legs_agree": legs_agree, "overlap": overlap}
+
+def _update_cascade_stats(**increments):
+    with _cascade_stats_lock:
+        for key, value in increments.items():
+            _cascade_stats[key] += value
+
+def _audit_skipped_rerank(query: str, fused: list, skipped_docs: list):
+    """Сравнение пропущенного reranking с полным: оценка влияния cascade на качество"""
+    full = [doc for doc, score in rerank_documents(query, [doc for doc, _ in fused], config.RERANKER_TOP_K, adaptive=False)]
+    top1_agree = int(bool(full) and full[0].page_content == skipped_docs[0].page_content)
+    full_keys = {doc.page_content for doc in full}
+    topk_overlap = len(full_keys & {doc.page_content for doc in skipped_docs}) / max(len(full_keys), 1)
+    _update_cascade_stats(audited=1, audit_top1_agree=top1_agree, audit_topk_overlap=topk_overlap)
+    logger.info(f"Cascade audit: top1_agree={bool(top1_agree)}, top{config.RERANKER_TOP_K}_overlap={topk_overlap:.2f}")
+
+def _cascade_confident(signals: dict) -> bool:
+    """Первый этап уверен: ноги согласны на top-1 и есть отрыв или совпадение слов"""
+    return signals["legs_agree"] and (
+        signals["semantic_gap"] >= config.RERANK_CASCADE_MIN_GAP
+        or signals["overlap"] >= config.RERANK_CASCADE_MIN_OVERLAP
+    )
+
+def cascade_rerank(query: str, candidate_ids: np.ndarray = None):
+    """
+    Cascade reranking для hybrid_reranker режима
+    
+    Если первый этап уже уверен (semantic и BM25 согласны на top-1 и есть
+    большой отрыв по similarity или почти полное совпадение слов запроса),
+    cross-encoder пропускается. Иначе переранжируются только top-N
+    кандидатов после fusion вместо всех semantic_k + bm25_k.
+    
+    Args:
+        query: Поисковый запрос
+        candidate_ids: ограничение поиска подмножеством chunk_id (фильтры)
+    
+    Returns:
+        list[Document]: top RERANKER_TOP_K документов
+    """
+    semantic_hits, bm25_hits = _hybrid_legs(query, candidate_ids)
+    fused = _fuse_legs(semantic_hits, bm25_hits)
+    if not fused:
+        return []
+    
+    signals = _first_stage_confidence(query, semantic_hits, bm25_hits, fused)
+    
+    if _cascade_confident(signals):
+        documents = [doc for doc, _ in fused[:config.RERANKER_TOP_K]]
+        _update_cascade_stats(queries=1, skipped=1, full_pairs=len(fused))
+        if random.random() < config.RERANK_CASCADE_AUDIT_RATE:
+            _audit_skipped_rerank(query, fused, documents)
+        decision = "skip"
+    else:
+        candidates = [doc for doc, _ in fused[:config.RERANK_CASCADE_TOP_N]]
+        documents = [doc for doc, score in rerank_documents(query, candidates, config.RERANKER_TOP_K)]
+        _update_cascade_stats(queries=1, reranked_pairs=len(candidates), full_pairs=len(fused))
+        decision = f"rerank top-{len(candidates)}/{len(fused)}"
+    
+    stats = get_cascade_stats()
+    logger.info(
+        f"Cascade: {decision} (gap={signals['semantic_gap']:.3f}, agree={signals['legs_agree']}, "
+        f"overlap={signals['overlap']:.2f}); skip rate {stats['skip_rate']:.0%} over {stats['queries']} queries"
+    )
+    return documents
+
+def get_adaptive_k_stats() -> dict:
+    """Средний размер набора кандидатов и доля сэкономленных пар reranking / документов"""
+    return _adaptive_k_stats.stats()
+
+def get_warmup_stats() -> dict:
+    """Статистика последнего прогрева кешей"""
+    return dict(_warmup_stats)
+
+def get_coalescing_stats() -> dict:
+    """Выполненные и объединенные одновременные запросы (ответы и retrieval)"""
+    return {"answers": _answer_flight.stats(), "retrieval": _retrieval_flight.stats()}
+
+def get_cascade_stats() -> dict:
+    """Skip rate cascade reranking и результаты аудита качества"""
+    with _cascade_stats_lock:
+        stats = dict(_cascade_stats)
+    queries = stats["queries"]
+    audited = stats["audited"]
+    stats["skip_rate"] = stats["skipped"] / queries if queries else 0.0
+    # Доля пар (query, document), которые не пришлось прогонять через cross-encoder
+    stats["pairs_saved_rate"] = 1 - stats["reranked_pairs"] / stats["full_pairs"] if stats["full_pairs"] else 0.0
+    stats["audit_top1_agree"] = stats["audit_top1_agree"] / audited if audited else None
+    stats["audit_topk_overlap"] = stats["audit_topk_overlap"] / audited if audited else None
+    return stats
+
 def create_retriever():
     """Фабрика для создания retriever по режиму"""
     mode = config.RETRIEVAL_MODE.lower()
@@ -121,19 +493,668 @@ def create_retriever():
 
 def initialize_retriever():
     """Инициализация retriever по режиму из конфига"""
-    global retriever
+    global retriever, index_generation
     if vector_store is None:
         logger.error("Cannot initialize retriever: vector_store is None")
         return False
     
     try:
+        if config.CHUNK_STORE and _compact_store() is None:
+            _compact_chunks()
         retriever = create_retriever()
-        logger.info(f"✓ Retriever initialized in '{config.RETRIEVAL_MODE}' mode")
+        _build_index_structures()
+        # Новый индекс: результаты, закешированные для старого, больше не валидны
+        index_generation += 1
+        _retrieval_cache.clear()
+        _answer_cache.clear()
+        logger.info(f"✓ Retriever initialized in '{config.RETRIEVAL_MODE}' mode (index generation {index_generation})")
         return True
     except Exception as e:
         logger.error(f"Failed to initialize retriever: {e}", exc_info=True)
         return False
 
+def _compact_store():
+    """Колоночное хранилище текущих чанков или None (CHUNK_STORE выключен)"""
+    return chunks.store if isinstance(chunks, chunk_store.ChunkSequence) else None
+
+def _compact_chunks():
+    """
+    Перенос чанков и их эмбеддингов в колоночное хранилище (CHUNK_STORE)
+    
+    После переноса тексты, метаданные и векторы есть только в хранилище:
+    rag.chunks становится ленивой последовательностью, из vector_store
+    используются только embeddings. При CHUNK_STORE_DIR массивы сохраняются
+    в новую поддиректорию поколения и открываются через memory map.
+    """
+    global chunks
+    vectors = np.array(
+        [vector_store.store[str(chunk_id)]["vector"] for chunk_id in range(len(chunks))],
+        dtype=np.float32
+    )
+    store = chunk_store.ChunkStore.from_documents(chunks, vectors)
+    if config.CHUNK_STORE_DIR:
+        store = chunk_store.save_generation(store, config.CHUNK_STORE_DIR)
+    vector_store.store.clear()
+    chunks = chunk_store.ChunkSequence(store)
+
+def _build_index_structures():
+    """Производные структуры индекса по chunk_id: bitmap метаданных и матрица эмбеддингов"""
+    global chunk_metadata_index, _embedding_matrix, _chunk_prev, _chunk_next, faq, _bm25_postings, sections
+    chunk_metadata_index = metadata_index.MetadataIndex(chunks)
+    _chunk_prev, _chunk_next = indexer.build_chunk_adjacency(chunks)
+    if config.FAQ_FAST_PATH:
+        faq = faq_index.FaqIndex(chunks, vector_store.embedding)
+    
+    store = _compact_store()
+    if store is not None:
+        _embedding_matrix = store.vectors
+    else:
+        vectors = np.array(
+            [vector_store.store[str(chunk_id)]["vector"] for chunk_id in range(len(chunks))],
+            dtype=np.float32
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        _embedding_matrix = vectors / norms
+    sections = section_index.SectionIndex(chunks, _embedding_matrix) if config.HIERARCHICAL_RETRIEVAL else None
+    
+    _bm25_postings = None
+    if isinstance(retriever, EnsembleRetriever):
+        _bm25_postings = bm25_index.Bm25Postings(retriever.retrievers[1].vectorizer)
+
+def _documents_by_ids(chunk_ids: list):
+    """Документы индекса по их chunk_id (позиция в chunks)"""
+    return [chunks[chunk_id] for chunk_id in chunk_ids]
+
+def _neighbour_ids(chunk_id: int, window: int) -> list:
+    """chunk_id до window соседей с каждой стороны (в порядке текста)"""
+    before = []
+    current = chunk_id
+    for _ in range(window):
+        current = int(_chunk_prev[current])
+        if current < 0:
+            break
+        before.append(current)
+    after = []
+    current = chunk_id
+    for _ in range(window):
+        current = int(_chunk_next[current])
+        if current < 0:
+            break
+        after.append(current)
+    return before[::-1] + [chunk_id] + after
+
+def _section_ids(chunk_id: int) -> list:
+    """Все chunk_id родительской секции (страницы источника) в порядке текста"""
+    return _neighbour_ids(chunk_id, len(chunks))
+
+def expand_documents(documents: list):
+    """
+    Расширение результатов соседними чанками или родительскими секциями
+    по индексу смежности (без повторного поиска)
+    
+    CHUNK_EXPANSION=neighbors: +-CHUNK_EXPANSION_WINDOW чанков той же страницы
+    CHUNK_EXPANSION=parent: вся страница, на которой найден чанк
+    """
+    mode = config.CHUNK_EXPANSION
+    if mode == "none" or not documents or _chunk_prev is None:
+        return documents
+    
+    expanded = []
+    seen = set()
+    for doc in documents:
+        chunk_id = doc.metadata.get("chunk_id")
+        if chunk_id is None:
+            expanded.append(doc)
+            continue
+        ids = _section_ids(chunk_id) if mode == "parent" else _neighbour_ids(chunk_id, config.CHUNK_EXPANSION_WINDOW)
+        for expanded_id in ids:
+            if expanded_id not in seen:
+                seen.add(expanded_id)
+                expanded.append(chunks[expanded_id])
+    
+    logger.info(f"Expanded {len(documents)} documents to {len(expanded)} ({mode})")
+    return expanded
+
+def diversify_documents(query: str, documents: list, k: int):
+    """
+    MMR отбор k документов по эмбеддингам чанков из матрицы индекса (MMR_LAMBDA)
+    
+    Документы без chunk_id (не из индекса) возвращаются без изменений.
+    """
+    if len(documents) <= k or _embedding_matrix is None:
+        return documents
+    chunk_ids = [doc.metadata.get("chunk_id") for doc in documents]
+    if any(chunk_id is None for chunk_id in chunk_ids):
+        return documents
+    
+    query_vector = np.asarray(vector_store.embedding.embed_query(query), dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) or 1.0
+    selected = mmr.mmr_select(query_vector, _embedding_matrix[chunk_ids], k, config.MMR_LAMBDA)
+    logger.info(f"MMR: {len(documents)} -> {len(selected)} documents (lambda={config.MMR_LAMBDA})")
+    return [documents[i] for i in selected]
+
+def retrieve_documents(query: str, filters: dict = None):
+    """
+    Базовая функция поиска документов по запросу
+    
+    При RETRIEVAL_CACHE_ENABLED сначала проверяется семантический кеш:
+    для перефразированного ранее запроса результат возвращается без
+    BM25, vector search и reranking. Одновременные одинаковые запросы
+    (REQUEST_COALESCING) выполняются один раз. При MMR_STAGE=context из результатов
+    убираются почти одинаковые чанки (diversify_documents), затем они
+    расширяются соседями (CHUNK_EXPANSION, см. expand_documents).
+    
+    Args:
+        query: Поисковый запрос
+        filters: Ограничение поиска по метаданным (source, category,
+            page_from, page_to - см. metadata_index). Scores считаются
+            только для подходящих чанков; кеш результатов не используется.
+    
+    Returns:
+        list[Document]: Список найденных документов
+    """
+    if retriever is None:
+        raise ValueError("Retriever not initialized")
+    
+    if not config.REQUEST_COALESCING:
+        return _retrieve_expanded(query, filters)
+    documents = _retrieval_flight.run(_flight_key(query, filters), lambda: _retrieve_expanded(query, filters))
+    return list(documents)
+
+def _flight_key(query: str, filters: dict) -> tuple:
+    """Ключ объединения одновременных запросов: запрос, фильтры, индекс и режим"""
+    return (
+        retrieval_cache.normalize_query(query),
+        repr(sorted((filters or {}).items())),
+        index_generation,
+        config.RETRIEVAL_MODE,
+    )
+
+def _retrieve_expanded(query: str, filters: dict = None):
+    """Поиск, MMR и расширение чанков (без объединения запросов)"""
+    documents = _retrieve_documents(query, filters)
+    if config.MMR_STAGE == "context":
+        documents = diversify_documents(query, documents, config.MMR_TOP_K)
+    return expand_documents(documents)
+
+def _retrieve_documents(query: str, filters: dict = None):
+    """Поиск документов с учетом фильтров и кеша результатов (без расширения)"""
+    if filters:
+        return _retrieve_filtered(query, filters)
+    
+    if not config.RETRIEVAL_CACHE_ENABLED:
+        return _retrieve(query)
+    
+    cached_ids = _retrieval_cache.get_exact(query)
+    if cached_ids is not None:
+        logger.info("Retrieval cache hit (exact)")
+        return _documents_by_ids(cached_ids)
+    
+    generation = index_generation
+    query_embedding = vector_store.embedding.embed_query(query)
+    hit = _retrieval_cache.lookup(query_embedding)
+    if hit is not None:
+        cached_ids, similarity = hit
+        logger.info(f"Retrieval cache hit (similarity={similarity:.3f})")
+        return _documents_by_ids(cached_ids)
+    
+    documents = _retrieve(query)
+    # Не кешируем результат, если за время поиска индекс был заменен
+    if generation == index_generation:
+        _retrieval_cache.put(query, query_embedding, [doc.metadata["chunk_id"] for doc in documents])
+    return documents
+
+def _retrieve(query: str):
+    """Поиск документов по режиму из конфига (без кеша)"""
+    mode = config.RETRIEVAL_MODE.lower()
+    
+    if sections is not None:
+        return _retrieve_subset(query, _hierarchical_candidates(query))
+    
+    if config.ADAPTIVE_K:
+        return _retrieve_adaptive(query, mode)
+    
+    # Для hybrid_reranker применяем reranking
+    if mode == "hybrid_reranker":
+        if config.RERANK_CASCADE:
+            return cascade_rerank(query)
+        ensemble_docs = retriever.invoke(query)
+        if not ensemble_docs:
+            return []
+        # Применяем reranking и возвращаем только документы
+        reranked = rerank_documents(query, ensemble_docs, config.RERANKER_TOP_K)
+        return [doc for doc, score in reranked]
+    else:
+        # Для semantic и hybrid - прямой вызов retriever
+        return retriever.invoke(query)
+
+def _retrieve_adaptive(query: str, mode: str):
+    """
+    Поиск с адаптивным числом кандидатов (ADAPTIVE_K)
+    
+    Ноги retrieval вызываются напрямую со scores (как ensemble retriever),
+    чтобы обрезать кандидатов до fusion и reranking.
+    """
+    if mode == "semantic":
+        (hits,) = _adaptive_candidates(_semantic_leg(retriever, query))
+        return [doc for doc, _ in hits]
+    
+    if mode == "hybrid_reranker" and config.RERANK_CASCADE:
+        return cascade_rerank(query)
+    
+    fused = [doc for doc, _ in _fuse_legs(*_hybrid_legs(query))]
+    if mode == "hybrid" or not fused:
+        return fused
+    
+    reranked = rerank_documents(query, fused, config.RERANKER_TOP_K)
+    return [doc for doc, score in reranked]
+
+def _hierarchical_candidates(query: str) -> np.ndarray:
+    """chunk_id лучших по близости к запросу секций (грубый уровень иерархии)"""
+    query_vector = np.asarray(vector_store.embedding.embed_query(query), dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) or 1.0
+    candidate_ids = sections.candidate_ids(
+        query_vector,
+        config.HIERARCHICAL_TOP_SECTIONS,
+        config.HIERARCHICAL_MIN_CHUNKS
+    )
+    logger.info(f"Hierarchical retrieval: {len(candidate_ids)}/{len(chunks)} chunks in top sections")
+    return candidate_ids
+
+def _retrieve_filtered(query: str, filters: dict):
+    """Поиск по подмножеству чанков, разрешенному фильтром метаданных"""
+    candidate_ids = chunk_metadata_index.allowed_ids(filters)
+    logger.info(f"Filtered retrieval: {len(candidate_ids)}/{chunk_metadata_index.size} chunks match {filters}")
+    return _retrieve_subset(query, candidate_ids)
+
+def _retrieve_subset(query: str, candidate_ids: np.ndarray):
+    """Поиск по режиму из конфига только среди chunk_id из candidate_ids"""
+    if len(candidate_ids) == 0:
+        return []
+    
+    mode = config.RETRIEVAL_MODE.lower()
+    
+    if mode == "semantic":
+        (hits,) = _adaptive_candidates(_semantic_leg_subset(query, candidate_ids, config.SEMANTIC_RETRIEVER_K))
+        return [doc for doc, _ in hits]
+    
+    if mode == "hybrid_reranker" and config.RERANK_CASCADE:
+        return cascade_rerank(query, candidate_ids)
+    
+    semantic_hits, bm25_hits = _hybrid_legs(query, candidate_ids)
+    fused = [doc for doc, _ in _fuse_legs(semantic_hits, bm25_hits)]
+    if mode == "hybrid":
+        return fused
+    
+    reranked = rerank_documents(query, fused, config.RERANKER_TOP_K)
+    return [doc for doc, score in reranked]
+
+async def run_in_retrieval_executor(func, *args):
+    """
+    Запуск блокирующей функции retrieval в отдельном пуле потоков
+    
+    Контекст (в т.ч. LangSmith tracing) копируется в поток пула.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _retrieval_executor,
+        functools.partial(ctx.run, func, *args)
+    )
+
+def _get_query_log():
+    """Ленивое создание журнала запросов (None, если журнал выключен)"""
+    global _query_log
+    if not config.QUERY_LOG_ENABLED:
+        return None
+    if _query_log is None:
+        _query_log = query_log.QueryLog(config.QUERY_LOG_PATH, config.QUERY_LOG_MAX_BYTES, config.QUERY_LOG_BACKUPS)
+    return _query_log
+
+def record_query(query: str):
+    """
+    Запись запроса пользователя в журнал для прогрева кешей
+    
+    Пишется исходный текст, а не normalize_query: кеш эмбеддингов запросов
+    хранит ключ по исходному тексту, и прогрев должен попасть в тот же ключ.
+    """
+    log = _get_query_log()
+    if log is not None:
+        try:
+            log.record(query)
+        except OSError as e:
+            logger.warning(f"Failed to write query log: {e}")
+
+async def warm_up_caches() -> int:
+    """
+    Прогон самых частых запросов из журнала через retrieval
+    
+    Заполняет кеш эмбеддингов запросов и кеш retrieval текущего поколения
+    индекса, загружает BM25 и cross-encoder. Запросы идут по одному с паузой
+    CACHE_WARMUP_DELAY, чтобы пул retrieval оставался свободным для
+    пользователей. Прогрев прекращается, если индекс заменили.
+    
+    Retrieval выполняется async путем из event loop: если такой же запрос
+    пользователя уже выполняется, прогрев ждет его single-flight, не занимая
+    поток пула (sync ожидание в пуле блокирует его при RETRIEVAL_EXECUTOR_WORKERS=1).
+    
+    Returns:
+        int: количество прогретых запросов
+    """
+    generation = index_generation
+    queries = await asyncio.to_thread(
+        _get_query_log().top_queries, config.CACHE_WARMUP_QUERIES, retrieval_cache.normalize_query
+    )
+    if not queries:
+        return 0
+    
+    start = time.perf_counter()
+    warmed = 0
+    _warmup_stats.update(runs=_warmup_stats["runs"] + 1, queries=len(queries), warmed=0, running=True)
+    logger.info(f"Cache warm-up started: {len(queries)} queries")
+    try:
+        for query in queries:
+            if generation != index_generation:
+                logger.info("Cache warm-up stopped: index was replaced")
+                break
+            try:
+                # Без record_query: прогрев не попадает в журнал запросов
+                await _aretrieve_documents(query)
+                warmed += 1
+                _warmup_stats["warmed"] = warmed
+            except Exception as e:
+                logger.warning(f"Cache warm-up failed for query '{query[:50]}': {e}")
+            await asyncio.sleep(config.CACHE_WARMUP_DELAY)
+    finally:
+        _warmup_stats.update(running=False, last_ms=(time.perf_counter() - start) * 1000)
+    
+    logger.info(f"Cache warm-up completed: {warmed}/{len(queries)} queries in {_warmup_stats['last_ms']:.0f}ms")
+    return warmed
+
+def start_cache_warmup():
+    """
+    Запуск прогрева кешей в фоне (после старта и после переиндексации)
+    
+    Вызывается из event loop. Незавершенный прогрев предыдущего поколения
+    индекса отменяется.
+    
+    Returns:
+        asyncio.Task | None: задача прогрева или None, если прогрев выключен
+    """
+    global _warmup_task
+    if not config.QUERY_LOG_ENABLED or config.CACHE_WARMUP_QUERIES <= 0 or retriever is None:
+        return None
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    _warmup_task = asyncio.get_running_loop().create_task(warm_up_caches())
+    return _warmup_task
+
+async def aretrieve_documents(query: str, filters: dict = None):
+    """
+    Асинхронный вариант retrieve_documents
+    
+    Embeddings, BM25 и cross-encoder выполняются в пуле retrieval,
+    event loop остается свободным для других чатов. Запросы без фильтров
+    записываются в журнал запросов (QUERY_LOG_ENABLED).
+    
+    Args:
+        query: Поисковый запрос
+        filters: Ограничение поиска по метаданным (см. retrieve_documents)
+    
+    Returns:
+        list[Document]: Список найденных документов
+    """
+    if retriever is None:
+        raise ValueError("Retriever not initialized")
+    
+    if not filters:
+        record_query(query)
+    return await _aretrieve_documents(query, filters)
+
+async def _aretrieve_documents(query: str, filters: dict = None):
+    """aretrieve_documents без записи в журнал запросов (прогрев кешей)"""
+    if not config.REQUEST_COALESCING:
+        return await run_in_retrieval_executor(_retrieve_expanded, query, filters)
+    # Общий с retrieve_documents single-flight: sync и async вызовы объединяются
+    documents, _ = await _retrieval_flight.arun(
+        _flight_key(query, filters),
+        lambda: run_in_retrieval_executor(_retrieve_expanded, query, filters)
+    )
+    return list(documents)
+
+def _embed_queries(queries: list) -> np.ndarray:
+    """Нормализованные эмбеддинги запросов одним вызовом провайдера"""
+    embedding = vector_store.embedding
+    if hasattr(embedding, "embed_queries"):
+        vectors = embedding.embed_queries(queries)
+    else:
+        vectors = embedding.embed_documents(queries)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_hits(scores: np.ndarray, k: int) -> list:
+    """top-k (document, score) для каждой строки матрицы scores [запросы x чанки]"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    hits = []
+    for row, ids in enumerate(top):
+        ids = ids[np.argsort(-scores[row, ids], kind="stable")]
+        hits.append([(chunks[chunk_id], float(scores[row, chunk_id])) for chunk_id in ids])
+    return hits
+
+def _rerank_candidates_batch(queries: list, legs: list, fused: list) -> list:
+    """
+    Reranking кандидатов всех запросов одним батчем cross-encoder
+    
+    При RERANK_CASCADE уверенные запросы пропускают reranking, остальные
+    переранжируют top-N кандидатов - как в cascade_rerank.
+    """
+    results = [[] for _ in queries]
+    pending = []
+    for i, (query, (semantic_hits, bm25_hits), candidates) in enumerate(zip(queries, legs, fused)):
+        if not candidates:
+            continue
+        if config.RERANK_CASCADE:
+            if _cascade_confident(_first_stage_confidence(query, semantic_hits, bm25_hits, candidates)):
+                results[i] = [doc for doc, _ in candidates[:config.RERANKER_TOP_K]]
+                _update_cascade_stats(queries=1, skipped=1, full_pairs=len(candidates))
+                continue
+            _update_cascade_stats(
+                queries=1,
+                reranked_pairs=min(len(candidates), config.RERANK_CASCADE_TOP_N),
+                full_pairs=len(candidates)
+            )
+            candidates = candidates[:config.RERANK_CASCADE_TOP_N]
+        pending.append((i, [doc for doc, _ in candidates]))
+    
+    reranked = rerank_documents_batch(
+        [queries[i] for i, _ in pending],
+        [documents for _, documents in pending],
+        config.RERANKER_TOP_K
+    )
+    for (i, _), ranked in zip(pending, reranked):
+        results[i] = [doc for doc, score in ranked]
+    return results
+
+def retrieve_documents_batch(queries: list):
+    """
+    Поиск документов для нескольких запросов за один проход
+    
+    - эмбеддинги всех запросов одним вызовом провайдера (с кешем запросов)
+    - semantic scores одним умножением матриц [запросы x чанки]
+    - BM25 scores всех запросов по posting lists
+    - reranking всех пар (запрос, документ) одним батчем cross-encoder
+    
+    Результаты соответствуют retrieve_documents без фильтров (fusion, adaptive
+    top-k, cascade, MMR, расширение чанков); кеш результатов не используется.
+    
+    Args:
+        queries: Список поисковых запросов
+    
+    Returns:
+        list[list[Document]]: документы для каждого запроса в том же порядке
+    """
+    if retriever is None:
+        raise ValueError("Retriever not initialized")
+    if not queries:
+        return []
+    
+    start = time.perf_counter()
+    mode = config.RETRIEVAL_MODE.lower()
+    semantic_legs = _top_hits(_embed_queries(queries) @ _embedding_matrix.T, config.SEMANTIC_RETRIEVER_K)
+    
+    if mode == "semantic":
+        results = [[doc for doc, _ in _adaptive_candidates(hits)[0]] for hits in semantic_legs]
+    else:
+        bm25_retriever = retriever.retrievers[1]
+        bm25_scores = _bm25_postings.scores([bm25_retriever.preprocess_func(query) for query in queries])
+        bm25_legs = _top_hits(bm25_scores, bm25_retriever.k)
+        legs = [_adaptive_candidates(semantic_hits, bm25_hits) for semantic_hits, bm25_hits in zip(semantic_legs, bm25_legs)]
+        fused = [_fuse_legs(semantic_hits, bm25_hits) for semantic_hits, bm25_hits in legs]
+        if mode == "hybrid":
+            results = [[doc for doc, _ in candidates] for candidates in fused]
+        else:
+            results = _rerank_candidates_batch(queries, legs, fused)
+    
+    if config.MMR_STAGE == "context":
+        results = [diversify_documents(query, documents, config.MMR_TOP_K) for query, documents in zip(queries, results)]
+    
+    logger.info(f"Batch retrieval: {len(queries)} queries in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return [expand_documents(documents) for documents in results]
+
+async def aretrieve_documents_batch(queries: list):
+    """Асинхронный вариант retrieve_documents_batch (в пуле retrieval)"""
+    return await run_in_retrieval_executor(retrieve_documents_batch, queries)
+
+def faq_lookup(query: str):
+    """
+    Поиск вопроса пользователя среди вопросов FAQ (точное совпадение, затем эмбеддинг)
+    
+    Эмбеддинг запроса попадает в кеш эмбеддингов, поэтому при промахе
+    retrieval не вычисляет его повторно.
+    
+    Returns:
+        dict | None: {"answer", "question", "document", "similarity", "match"}
+    """
+    if faq is None or not len(faq):
+        return None
+    
+    match = "exact"
+    similarity = 1.0
+    chunk_id = faq.match_exact(query)
+    if chunk_id is None:
+        hit = faq.match(vector_store.embedding.embed_query(query), config.FAQ_SIMILARITY_THRESHOLD)
+        match = "semantic" if hit is not None else None
+        if hit is not None:
+            chunk_id, similarity = hit
+    
+    with _faq_stats_lock:
+        _faq_stats["lookups"] += 1
+        if match is not None:
+            _faq_stats[match] += 1
+    if match is None:
+        return None
+    
+    document = chunks[chunk_id]
+    logger.info(f"FAQ hit ({match}, similarity={similarity:.3f}): {document.metadata['question'][:100]}")
+    return {
+        "answer": document.metadata["answer"],
+        "question": document.metadata["question"],
+        "document": document,
+        "similarity": similarity,
+        "match": match,
+    }
+
+def _get_faq_paraphrase_chain():
+    """Ленивая инициализация дешевой модели для перефразирования ответа FAQ"""
+    global _llm_faq_paraphrase, _faq_paraphrase_prompt
+    if _llm_faq_paraphrase is None:
+        _faq_paraphrase_prompt = ChatPromptTemplate.from_messages([
+            ("system", config.load_prompt(config.FAQ_PARAPHRASE_PROMPT_FILE)),
+            ("user", "Вопрос пользователя: {query}\n\nВопрос FAQ: {question}\n\nОтвет FAQ: {answer}"),
+        ])
+        _llm_faq_paraphrase = ChatOpenAI(model=config.FAQ_PARAPHRASE_MODEL, temperature=0.3)
+        logger.info(f"FAQ paraphrase LLM initialized: {config.FAQ_PARAPHRASE_MODEL}")
+    return _faq_paraphrase_prompt | _llm_faq_paraphrase | StrOutputParser()
+
+async def faq_answer(query: str):
+    """
+    Прямой ответ из FAQ (при FAQ_FAST_PATH) или None, если вопрос не из FAQ
+    
+    При заданном FAQ_PARAPHRASE_MODEL сохраненный ответ слегка перефразируется
+    под вопрос пользователя; при ошибке возвращается исходный ответ.
+    
+    Returns:
+        dict | None: {"answer": str, "documents": [Document], "faq": dict}
+    """
+    if faq is None:
+        return None
+    hit = await run_in_retrieval_executor(faq_lookup, query)
+    if hit is None:
+        return None
+    
+    answer = hit["answer"]
+    if config.FAQ_PARAPHRASE_MODEL:
+        try:
+            answer = await _get_faq_paraphrase_chain().ainvoke({
+                "query": query,
+                "question": hit["question"],
+                "answer": hit["answer"]
+            })
+        except Exception as e:
+            logger.warning(f"FAQ paraphrase failed, using stored answer: {e}")
+    return {"answer": answer, "documents": [hit["document"]], "faq": hit}
+
+def get_faq_stats() -> dict:
+    """Доля запросов с прямым ответом из FAQ"""
+    with _faq_stats_lock:
+        stats = dict(_faq_stats)
+    stats["questions"] = len(faq) if faq is not None else 0
+    hits = stats["exact"] + stats["semantic"]
+    stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+    return stats
+
+def _score_sentences(query: str, sentences: list):
+    """Релевантность предложений запросу одним батчем: cross-encoder или cosine эмбеддингов"""
+    if config.CONTEXT_COMPRESSION_SCORER == "cross_encoder":
+        pairs = [(query, sentence) for sentence in sentences]
+        return get_cross_encoder().predict(pairs, batch_size=config.RERANKER_BATCH_SIZE)
+    
+    vectors = np.asarray(vector_store.embedding.embed_documents(sentences), dtype=np.float32)
+    query_vector = np.asarray(vector_store.embedding.embed_query(query), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+    norms[norms == 0] = 1.0
+    return vectors @ query_vector / norms
+
+def compress_context(query: str, documents: list):
+    """
+    Экстрактивное сжатие найденных документов (при CONTEXT_COMPRESSION)
+    
+    Args:
+        query: Поисковый запрос
+        documents: Список Document после retrieval
+    
+    Returns:
+        list[Document]: документы только с самыми релевантными предложениями
+    """
+    if not config.CONTEXT_COMPRESSION or not documents:
+        return documents
+    return context_compressor.compress_documents(
+        query,
+        documents,
+        _score_sentences,
+        config.CONTEXT_COMPRESSION_TOP_SENTENCES
+    )
+
+async def acompress_context(query: str, documents: list):
+    """Async вариант compress_context (скоринг в пуле retrieval)"""
+    if not config.CONTEXT_COMPRESSION or not documents:
+        return documents
+    return await run_in_retrieval_executor(compress_context, query, documents)
+
 def format_chunks(chunks):
     """
     Форматирование чанков с метаданными для лучшей прозрачности
@@ -141,6 +1162,9 @@ def format_chunks(chunks):
     if not chunks:
         return "Нет доступной информации"
     
+    if config.CONTEXT_PACKING:
+        chunks = context_packer.pack_documents(chunks)
+    
     formatted_parts = []
     for i, chunk in enumerate(chunks, 1):
         # Получаем метаданные
@@ -190,14 +1214,16 @@ def format_sources(documents):
 
 def _load_prompts():
     """Ленивая загрузка промптов с обработкой ошибок"""
-    global _conversational_answering_prompt, _retrieval_query_transform_prompt
+    global _conversational_answering_prompt, _retrieval_query_transform_prompt, _query_transform_prompt_version, _answer_prompt_version
     
     if _conversational_answering_prompt is not None:
         return _conversational_answering_prompt, _retrieval_query_transform_prompt
     
     try:
         conversation_system_text = config.load_prompt(config.CONVERSATION_SYSTEM_PROMPT_FILE)
+        _answer_prompt_version = hashlib.sha1(f"{config.MODEL}\n{conversation_system_text}".encode("utf-8")).hexdigest()[:12]
         query_transform_text = config.load_prompt(config.QUERY_TRANSFORM_PROMPT_FILE)
+        _query_transform_prompt_version = hashlib.sha1(query_transform_text.encode("utf-8")).hexdigest()[:12]
         
         _conversational_answering_prompt = ChatPromptTemplate(
             [
@@ -229,7 +1255,7 @@ def _get_llm_query_transform():
     if _llm_query_transform is None:
         _llm_query_transform = ChatOpenAI(
             model=config.MODEL_QUERY_TRANSFORM,
-            temperature=0.4
+            temperature=config.MODEL_QUERY_TRANSFORM_TEMPERATURE
         )
         logger.info(f"Query transform LLM initialized: {config.MODEL_QUERY_TRANSFORM}")
     return _llm_query_transform
@@ -254,64 +1280,353 @@ def get_retrieval_query_transformation_chain():
         | StrOutputParser()
     )
 
-def get_rag_chain():
-    """Финальная RAG-цепочка возвращающая answer и documents в LCEL стиле"""
-    if retriever is None:
-        raise ValueError("Retriever not initialized")
+def _skip_rewrite_reason(messages):
+    """Причина не вызывать LLM query transformation (QUERY_REWRITE_POLICY=heuristic)"""
+    if config.QUERY_REWRITE_POLICY != "heuristic":
+        return None
+    return query_rewrite.skip_reason(messages)
+
+def _transform_cache_key(messages):
+    """Ключ кеша переписывания или None, если кеш выключен"""
+    if config.QUERY_TRANSFORM_CACHE_SIZE <= 0:
+        return None
+    _load_prompts()
+    return _transform_cache.key(
+        messages,
+        _query_transform_prompt_version,
+        config.MODEL_QUERY_TRANSFORM,
+        config.MODEL_QUERY_TRANSFORM_TEMPERATURE
+    )
+
+def _rewrite_without_llm(x: dict):
+    """
+    Поисковый запрос без вызова LLM: последнее сообщение (политика пропуска)
+    или результат из кеша переписывания
     
-    conversational_answering_prompt, _ = _load_prompts()
-    mode = config.RETRIEVAL_MODE.lower()
+    Returns:
+        tuple: (query или None, ключ кеша)
+    """
+    reason = _skip_rewrite_reason(x["messages"])
+    if reason is not None:
+        _rewrite_stats.record_skip(reason)
+        return query_rewrite.last_human_text(x["messages"]), None
     
-    # Для hybrid_reranker режима добавляем промежуточный шаг reranking
-    if mode == "hybrid_reranker":
-        # LCEL цепочка с reranking: ensemble_docs → rerank → documents → answer
-        return (
-            RunnablePassthrough.assign(
-                ensemble_docs=get_retrieval_query_transformation_chain() | retriever
-            )
-            # Шаг reranking: переранжируем документы cross-encoder
-            | RunnablePassthrough.assign(
-                documents=lambda x: [doc for doc, score in rerank_documents(
-                    query=x["messages"][-1].content if x["messages"] else "",
-                    documents=x["ensemble_docs"],
-                    top_k=config.RERANKER_TOP_K
-                )]
-            )
-            # Генерируем ответ на основе переранжированных documents
-            | RunnablePassthrough.assign(
-                answer=lambda x: (conversational_answering_prompt | _get_llm() | StrOutputParser()).invoke({
-                    "context": format_chunks(x["documents"]),
-                    "messages": x["messages"]
-                })
-            )
-            # Возвращаем только answer и documents
-            | (lambda x: {"answer": x["answer"], "documents": x["documents"]})
+    cache_key = _transform_cache_key(x["messages"])
+    if cache_key is not None:
+        query = _transform_cache.get(cache_key)
+        if query is not None:
+            _rewrite_stats.record_skip("cache")
+            return query, cache_key
+    return None, cache_key
+
+def _remember_rewrite(cache_key, query: str, start: float):
+    _rewrite_stats.record_llm((time.perf_counter() - start) * 1000)
+    if cache_key is not None:
+        _transform_cache.put(cache_key, query)
+
+def _rewrite_query(x: dict) -> str:
+    """Поисковый запрос: последнее сообщение как есть, из кеша или результат LLM переписывания"""
+    query, cache_key = _rewrite_without_llm(x)
+    if query is not None:
+        return query
+    
+    start = time.perf_counter()
+    query = get_retrieval_query_transformation_chain().invoke(x)
+    _remember_rewrite(cache_key, query, start)
+    return query
+
+async def _allm_rewrite(x: dict, cache_key) -> str:
+    """Async LLM переписывание запроса (после проверки политики пропуска и кеша)"""
+    start = time.perf_counter()
+    query = await get_retrieval_query_transformation_chain().ainvoke(x)
+    _remember_rewrite(cache_key, query, start)
+    return query
+
+def _queries_close(raw_query: str, query: str) -> bool:
+    """Переписанный запрос близок к исходному: по словам или по cosine similarity эмбеддингов"""
+    raw_words = set(retrieval_cache.normalize_query(raw_query).split())
+    words = set(retrieval_cache.normalize_query(query).split())
+    if raw_words and words and len(raw_words & words) / len(raw_words | words) >= config.SPECULATIVE_MIN_WORD_OVERLAP:
+        return True
+    
+    # Эмбеддинги обоих запросов уже посчитаны (кеш эмбеддингов запросов)
+    raw_vector = np.asarray(vector_store.embedding.embed_query(raw_query), dtype=np.float32)
+    vector = np.asarray(vector_store.embedding.embed_query(query), dtype=np.float32)
+    norm = np.linalg.norm(raw_vector) * np.linalg.norm(vector)
+    return norm > 0 and float(raw_vector @ vector) / norm >= config.SPECULATIVE_MIN_SIMILARITY
+
+def _merge_speculative(documents: list, speculative_documents: list) -> list:
+    """RRF объединение результатов переписанного запроса (приоритет) и исходного сообщения"""
+    fused = _fuse_rrf([documents, speculative_documents], [0.6, 0.4])
+    return [doc for doc, _ in fused[:max(len(documents), len(speculative_documents))]]
+
+def _update_speculative_stats(outcome: str):
+    with _speculative_stats_lock:
+        _speculative_stats["queries"] += 1
+        _speculative_stats[outcome] += 1
+
+def _working_set_documents(x: dict):
+    """
+    Документы уточняющего вопроса из рабочего набора чата
+    
+    Вопрос вместе с предыдущим вопросом пользователя сравнивается с чанками
+    последних WORKING_SET_TURNS ходов по эмбеддингам из матрицы индекса.
+    
+    Returns:
+        tuple: (query, documents) или None, если набор не покрывает вопрос
+    """
+    chat_id = x.get("chat_id")
+    if not config.WORKING_SET_ENABLED or chat_id is None or x.get("filters"):
+        return None
+    if query_rewrite.skip_reason(x["messages"]) is not None:
+        return None
+    chunk_ids, reference = _working_sets.lookup(chat_id, index_generation)
+    if not chunk_ids:
+        return None
+    
+    query = query_rewrite.follow_up_text(x["messages"])
+    similarities = _embedding_matrix[chunk_ids] @ _normalized_query_vector(query)
+    covered = [
+        chunk_ids[i] for i in working_set.covered_positions(
+            similarities, reference, config.WORKING_SET_MIN_SIMILARITY,
+            config.WORKING_SET_SIMILARITY_MARGIN, config.RERANKER_TOP_K
         )
+    ]
+    
+    _working_sets.record_lookup(bool(covered))
+    if not covered:
+        logger.info(
+            f"Working set miss (best similarity {similarities.max():.3f}, reference {reference:.3f}), full retrieval"
+        )
+        return None
+    _rewrite_stats.record_skip("working_set")
+    logger.info(f"Working set hit: {len(covered)}/{len(chunk_ids)} chunks for follow-up {query[:100]}")
+    return query, _documents_by_ids(covered)
+
+def _normalized_query_vector(query: str) -> np.ndarray:
+    query_vector = np.asarray(vector_store.embedding.embed_query(query), dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) or 1.0
+    return query_vector
+
+def remember_working_set(chat_id, query: str, documents: list):
+    """
+    Сохранение chunk_id документов полного retrieval в рабочий набор чата
+    
+    Вместе с ними сохраняется reference - similarity запроса с лучшим из
+    найденных чанков: порог покрытия уточняющих вопросов считается от него.
+    Документы, взятые из самого рабочего набора, сюда не передаются.
+    """
+    if not config.WORKING_SET_ENABLED or chat_id is None:
+        return
+    chunk_ids = [doc.metadata["chunk_id"] for doc in documents if "chunk_id" in doc.metadata]
+    if not chunk_ids:
+        return
+    reference = float((_embedding_matrix[chunk_ids] @ _normalized_query_vector(query)).max())
+    _working_sets.remember(chat_id, index_generation, chunk_ids, reference)
+
+def forget_chat(chat_id):
+    """Сброс рабочего набора чата (новый диалог)"""
+    _working_sets.forget(chat_id)
+
+def get_working_set_stats() -> dict:
+    """Количество чатов и доля уточняющих вопросов без повторного retrieval"""
+    return _working_sets.stats()
+
+def _retrieve_step(x: dict) -> dict:
+    """Query transformation и retrieval с учетом фильтров метаданных из входа цепочки"""
+    cached = _working_set_documents(x)
+    if cached is not None:
+        query, documents = cached
+    else:
+        query = _rewrite_query(x)
+        documents = retrieve_documents(query, x.get("filters"))
+        remember_working_set(x.get("chat_id"), query, documents)
+    return {**x, "query": query, "documents": documents}
+
+async def _aretrieve_step(x: dict) -> dict:
+    """Async вариант: сначала рабочий набор чата, затем полный retrieval"""
+    cached = await run_in_retrieval_executor(_working_set_documents, x)
+    if cached is not None:
+        query, documents = cached
+        return {**x, "query": query, "documents": documents}
+    # Набор пополняется только результатами полного retrieval, иначе он сужается с каждым ходом
+    result = await _aretrieve(x)
+    await run_in_retrieval_executor(remember_working_set, x.get("chat_id"), result["query"], result["documents"])
+    return result
+
+async def _aretrieve(x: dict) -> dict:
+    """
+    Query transformation и retrieval: при SPECULATIVE_RETRIEVAL retrieval по
+    исходному сообщению выполняется параллельно с LLM переписыванием запроса
+    """
+    filters = x.get("filters")
+    query, cache_key = _rewrite_without_llm(x)
+    if query is not None:
+        return {**x, "query": query, "documents": await aretrieve_documents(query, filters)}
+    
+    if not config.SPECULATIVE_RETRIEVAL:
+        query = await _allm_rewrite(x, cache_key)
+        return {**x, "query": query, "documents": await aretrieve_documents(query, filters)}
+    
+    raw_query = query_rewrite.last_human_text(x["messages"])
+    speculative = asyncio.ensure_future(aretrieve_documents(raw_query, filters))
+    try:
+        query = await _allm_rewrite(x, cache_key)
+    except Exception:
+        speculative.cancel()
+        raise
+    try:
+        speculative_documents = await speculative
+    except Exception as e:
+        # Speculative поиск - только оптимизация: ошибка не должна ронять запрос
+        logger.warning(f"Speculative retrieval failed, retrieving with rewritten query: {e}")
+        _update_speculative_stats("failed")
+        return {**x, "query": query, "documents": await aretrieve_documents(query, filters)}
+    
+    if await run_in_retrieval_executor(_queries_close, raw_query, query):
+        _update_speculative_stats("reused")
+        logger.info(f"Speculative retrieval reused for rewritten query: {query[:100]}")
+        return {**x, "query": query, "documents": speculative_documents}
+    
+    documents = await aretrieve_documents(query, filters)
+    _update_speculative_stats("merged")
+    return {**x, "query": query, "documents": _merge_speculative(documents, speculative_documents)}
+
+def get_speculative_stats() -> dict:
+    """Доля запросов, где speculative retrieval по исходному сообщению использован без повторного поиска"""
+    with _speculative_stats_lock:
+        stats = dict(_speculative_stats)
+    stats["reuse_rate"] = stats["reused"] / stats["queries"] if stats["queries"] else 0.0
+    return stats
+
+def _compress_step(x: dict):
+    return compress_context(x["query"], x["documents"])
+
+async def _acompress_step(x: dict):
+    return await acompress_context(x["query"], x["documents"])
+
+def _answer_input(x: dict) -> dict:
+    return {"context": format_chunks(x["documents"]), "messages": x["messages"]}
+
+async def _aanswer_input(x: dict) -> dict:
+    return _answer_input(x)
+
+def _build_rag_chain():
+    """Сборка RAG-цепочки в LCEL стиле (один раз на режим retrieval и индекс)"""
+    conversational_answering_prompt, _ = _load_prompts()
+    answer_chain = conversational_answering_prompt | _get_llm() | StrOutputParser()
     
-    # Для semantic и hybrid режимов - стандартная цепочка без reranking
     # LCEL цепочка в стиле из референсного ноутбука
     # Шаг 1: Получаем documents через query transformation
+    # (LLM переписывание только для уточняющих вопросов, см. query_rewrite)
+    # (для hybrid_reranker reranking/cascade выполняется внутри retrieve_documents,
+    # при ainvoke - в пуле retrieval, не блокируя event loop)
+    # Фильтры метаданных (опционально) передаются во входе: {"messages": ..., "filters": {...}}
     return (
-        RunnablePassthrough.assign(
-            documents=get_retrieval_query_transformation_chain() | retriever
+        # (при SPECULATIVE_RETRIEVAL поиск по исходному сообщению идет параллельно с переписыванием)
+        RunnableLambda(_retrieve_step, afunc=_aretrieve_step)
+        # (при CONTEXT_COMPRESSION в documents остаются только релевантные предложения,
+        # их же видит RAGAS evaluation)
+        | RunnablePassthrough.assign(
+            documents=RunnableLambda(_compress_step, afunc=_acompress_step)
         )
-        # Шаг 2: Генерируем ответ на основе documents
+        # Шаг 2: Генерируем ответ на основе documents (при ainvoke - асинхронно, без потока)
         | RunnablePassthrough.assign(
-            answer=lambda x: (conversational_answering_prompt | _get_llm() | StrOutputParser()).invoke({
-                "context": format_chunks(x["documents"]),
-                "messages": x["messages"]
-            })
+            answer=RunnableLambda(_answer_input, afunc=_aanswer_input) | answer_chain
         )
         # Шаг 3: Возвращаем только answer и documents
-        | (lambda x: {"answer": x["answer"], "documents": x["documents"]})
+        | RunnablePick(["answer", "documents"])
     )
 
-async def rag_answer(messages):
+def get_rag_chain():
+    """Финальная RAG-цепочка возвращающая answer и documents в LCEL стиле"""
+    global _rag_chain, _rag_chain_key
+    if retriever is None:
+        raise ValueError("Retriever not initialized")
+    
+    key = (config.RETRIEVAL_MODE, index_generation)
+    if _rag_chain is None or _rag_chain_key != key:
+        _rag_chain = _build_rag_chain()
+        _rag_chain_key = key
+        logger.info(f"RAG chain built for mode '{key[0]}' (index generation {key[1]})")
+    return _rag_chain
+
+def _answer_cache_query(messages, filters: dict):
+    """
+    Ключ кеша ответов: текст первого вопроса диалога или None
+    
+    Кешируются только первые вопросы без фильтров: ответ на них сгенерирован
+    без истории диалога, поэтому контекст одного чата не попадет в ответ другому.
+    """
+    if not config.ANSWER_CACHE_ENABLED or config.ANSWER_CACHE_SIZE <= 0 or filters:
+        return None
+    if not query_rewrite.is_first_turn(messages):
+        return None
+    return query_rewrite.last_human_text(messages)
+
+def answer_cache_lookup(query: str):
+    """
+    Поиск готового ответа по запросу (точное совпадение, затем эмбеддинг)
+    
+    Записи другого поколения индекса или версии промпта считаются промахом.
+    
+    Returns:
+        tuple: (result dict, эмбеддинг запроса или None)
+    """
+    _load_prompts()
+    entry = _answer_cache.get_exact(query)
+    query_embedding = None
+    if entry is None:
+        query_embedding = vector_store.embedding.embed_query(query)
+        hit = _answer_cache.lookup(query_embedding)
+        entry = hit[0] if hit is not None else None
+    if entry is None or entry["generation"] != index_generation or entry["prompt_version"] != _answer_prompt_version:
+        return None, query_embedding
+    
+    logger.info(f"Answer cache hit: {query[:100]}")
+    return {"answer": entry["answer"], "documents": _documents_by_ids(entry["chunk_ids"])}, query_embedding
+
+def answer_cache_store(query: str, query_embedding, generation: int, result: dict):
+    """Сохранение ответа с тегами поколения индекса и версии промпта"""
+    if generation != index_generation:
+        return
+    if query_embedding is None:
+        query_embedding = vector_store.embedding.embed_query(query)
+    _answer_cache.put(query, query_embedding, {
+        "answer": result["answer"],
+        "chunk_ids": [doc.metadata["chunk_id"] for doc in result["documents"] if "chunk_id" in doc.metadata],
+        "generation": generation,
+        "prompt_version": _answer_prompt_version,
+    })
+
+def _answer_flight_key(messages, filters: dict):
+    """
+    Ключ объединения одновременных вопросов или None
+    
+    Объединяются только первые вопросы диалога: ответ генерируется с историей
+    чата, поэтому вопрос с историей (даже самостоятельный) получает свой вызов.
+    """
+    if not config.REQUEST_COALESCING or not query_rewrite.is_first_turn(messages):
+        return None
+    _load_prompts()
+    return _flight_key(query_rewrite.last_human_text(messages), filters) + (_answer_prompt_version,)
+
+async def _run_answer_chain(messages, filters: dict, chat_id, cache_query, query_embedding) -> dict:
+    """Вызов RAG цепочки с сохранением ответа в кеш ответов"""
+    generation = index_generation
+    result = await get_rag_chain().ainvoke({"messages": messages, "filters": filters, "chat_id": chat_id})
+    if cache_query is not None:
+        answer_cache_store(cache_query, query_embedding, generation, result)
+    return result
+
+async def rag_answer(messages, filters: dict = None, chat_id=None):
     """
     Получить ответ от RAG с учетом истории диалога
     
     Args:
         messages: список LangChain messages (HumanMessage, AIMessage)
+        filters: ограничение поиска по метаданным (source, category, page_from, page_to)
+        chat_id: идентификатор чата для рабочего набора чанков (WORKING_SET_ENABLED)
     
     Returns:
         dict: {"answer": str, "documents": list[Document]}
@@ -320,10 +1635,123 @@ async def rag_answer(messages):
         logger.error("Vector store or retriever not initialized")
         raise ValueError("Векторное хранилище не инициализировано. Запустите индексацию.")
     
-    rag_chain = get_rag_chain()
-    result = await rag_chain.ainvoke({"messages": messages})
+    start = time.perf_counter()
+    cache_query = _answer_cache_query(messages, filters)
+    cached, query_embedding = None, None
+    if cache_query is not None:
+        cached, query_embedding = await run_in_retrieval_executor(answer_cache_lookup, cache_query)
+    
+    flight_key = _answer_flight_key(messages, filters) if cached is None else None
+    if cached is not None:
+        result = cached
+        await run_in_retrieval_executor(
+            remember_working_set, chat_id, query_rewrite.last_human_text(messages), result["documents"]
+        )
+    elif flight_key is None:
+        result = await _run_answer_chain(messages, filters, chat_id, cache_query, query_embedding)
+    else:
+        # Одинаковые одновременные вопросы ждут один вызов цепочки
+        result, shared = await _answer_flight.arun(
+            flight_key,
+            lambda: _run_answer_chain(messages, filters, chat_id, cache_query, query_embedding)
+        )
+        if shared:
+            result = dict(result)
+            await run_in_retrieval_executor(
+                remember_working_set, chat_id, query_rewrite.last_human_text(messages), result["documents"]
+            )
+    
+    # Без стриминга первый токен виден пользователю вместе со всем ответом
+    total_ms = (time.perf_counter() - start) * 1000
+    record_answer_latency(total_ms, total_ms)
     return result
 
+async def rag_answer_stream(messages, filters: dict = None, chat_id=None):
+    """
+    Стриминг ответа RAG: сначала найденные документы, затем токены ответа
+    
+    Args:
+        messages: список LangChain messages (HumanMessage, AIMessage)
+        filters: ограничение поиска по метаданным (source, category, page_from, page_to)
+        chat_id: идентификатор чата для рабочего набора чанков (WORKING_SET_ENABLED)
+    
+    Yields:
+        dict: {"documents": list[Document]} один раз после retrieval,
+            затем {"token": str} по мере генерации
+    """
+    if vector_store is None or retriever is None:
+        logger.error("Vector store or retriever not initialized")
+        raise ValueError("Векторное хранилище не инициализировано. Запустите индексацию.")
+    
+    cache_query = _answer_cache_query(messages, filters)
+    query_embedding = None
+    if cache_query is not None:
+        cached, query_embedding = await run_in_retrieval_executor(answer_cache_lookup, cache_query)
+        if cached is not None:
+            await run_in_retrieval_executor(
+                remember_working_set, chat_id, query_rewrite.last_human_text(messages), cached["documents"]
+            )
+            yield {"documents": cached["documents"]}
+            yield {"token": cached["answer"]}
+            return
+    
+    # Одинаковый вопрос уже генерируется: ожидающие получают готовый ответ целиком
+    flight_key = _answer_flight_key(messages, filters)
+    if flight_key is not None:
+        flight, owner = _answer_flight.claim(flight_key)
+        if not owner:
+            result = await asyncio.wrap_future(flight)
+            await run_in_retrieval_executor(
+                remember_working_set, chat_id, query_rewrite.last_human_text(messages), result["documents"]
+            )
+            yield {"documents": result["documents"]}
+            yield {"token": result["answer"]}
+            return
+    
+    generation = index_generation
+    documents = []
+    answer_parts = []
+    try:
+        rag_chain = get_rag_chain()
+        async for chunk in rag_chain.astream({"messages": messages, "filters": filters, "chat_id": chat_id}):
+            if "documents" in chunk:
+                documents = chunk["documents"]
+                yield {"documents": documents}
+            if chunk.get("answer"):
+                answer_parts.append(chunk["answer"])
+                yield {"token": chunk["answer"]}
+    except BaseException as e:
+        if flight_key is not None:
+            _answer_flight.resolve(flight_key, flight, error=e)
+        raise
+    
+    result = {"answer": "".join(answer_parts), "documents": documents}
+    if flight_key is not None:
+        _answer_flight.resolve(flight_key, flight, value=result)
+    if cache_query is not None:
+        answer_cache_store(cache_query, query_embedding, generation, result)
+
+def record_answer_latency(ttft_ms: float, total_ms: float):
+    """Сохранение времени до первого видимого токена и полного времени ответа"""
+    with _answer_latency_lock:
+        _answer_latency["ttft_ms"].append(ttft_ms)
+        _answer_latency["total_ms"].append(total_ms)
+    logger.info(f"Answer latency: TTFT {ttft_ms:.0f} ms, total {total_ms:.0f} ms")
+
+def get_answer_latency_stats() -> dict:
+    """p50/p95 TTFT и полного времени ответа по последним запросам"""
+    with _answer_latency_lock:
+        ttft = list(_answer_latency["ttft_ms"])
+        total = list(_answer_latency["total_ms"])
+    if not ttft:
+        return {"answers": 0}
+    return {
+        "answers": len(ttft),
+        "ttft_p50_ms": float(np.percentile(ttft, 50)),
+        "ttft_p95_ms": float(np.percentile(ttft, 95)),
+        "total_p50_ms": float(np.percentile(total, 50)),
+    }
+
 def get_vector_store_stats():
     """Возвращает статистику векторного хранилища с полной информацией о конфигурации"""
     stats = {
@@ -334,8 +1762,41 @@ def get_vector_store_stats():
     }
     
     if vector_store is not None:
-        doc_count = len(vector_store.store) if hasattr(vector_store, 'store') else 0
+        store = _compact_store()
+        if store is not None:
+            doc_count = len(store)
+            stats["chunk_store"] = store.describe()
+        else:
+            doc_count = len(vector_store.store) if hasattr(vector_store, 'store') else 0
         stats["count"] = doc_count
+        stats["index_generation"] = index_generation
+        if chunk_metadata_index is not None:
+            stats["metadata"] = chunk_metadata_index.describe()
+    
+    stats["answer_latency"] = get_answer_latency_stats()
+    stats["query_rewrite"] = _rewrite_stats.stats()
+    if config.SPECULATIVE_RETRIEVAL:
+        stats["speculative_retrieval"] = get_speculative_stats()
+    if config.QUERY_TRANSFORM_CACHE_SIZE > 0:
+        stats["query_transform_cache"] = _transform_cache.stats()
+    if config.REQUEST_COALESCING:
+        stats["coalescing"] = get_coalescing_stats()
+    if _warmup_stats["runs"]:
+        stats["warmup"] = get_warmup_stats()
+    if config.ADAPTIVE_K:
+        stats["adaptive_k"] = get_adaptive_k_stats()
+    if sections is not None:
+        stats["hierarchy"] = sections.describe()
+    if config.RETRIEVAL_CACHE_ENABLED:
+        stats["retrieval_cache"] = _retrieval_cache.stats()
+    if config.ANSWER_CACHE_ENABLED:
+        stats["answer_cache"] = _answer_cache.stats()
+    if config.WORKING_SET_ENABLED:
+        stats["working_set"] = get_working_set_stats()
+    if config.FAQ_FAST_PATH:
+        stats["faq"] = get_faq_stats()
+    if config.QUERY_EMBEDDING_CACHE_SIZE > 0:
+        stats["query_embedding_cache"] = embedding_cache.get_query_embedding_cache().stats()
     
     # Добавляем информацию о моделях в зависимости от провайдера
     if config.EMBEDDING_PROVIDER == "openai":
@@ -358,6 +1819,9 @@ def get_vector_store_stats():
         stats["semantic_weight"] = config.ENSEMBLE_SEMANTIC_WEIGHT
         stats["bm25_weight"] = config.ENSEMBLE_BM25_WEIGHT
         stats["cross_encoder_model"] = config.CROSS_ENCODER_MODEL
+        stats["reranker_backend"] = config.RERANKER_BACKEND
+        if config.RERANK_CASCADE:
+            stats["cascade"] = get_cascade_stats()
         stats["reranker_top_k"] = config.RERANKER_TOP_K
     
     return stats
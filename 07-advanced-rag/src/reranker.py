@@ -0,0 +1,191 @@
+"""
+Backend'ы cross-encoder для reranking
+
+- sentence_transformers: исходная fp32 модель (CrossEncoder)
+- onnx: int8-квантованный ONNX экспорт той же модели (onnxruntime на CPU),
+  опционально с уменьшенным числом слоев (layer pruning)
+
+Оба backend'а предоставляют одинаковый метод predict(pairs, batch_size),
+обрабатывают пары батчами, отсортированными по длине (меньше паддинга),
+и возвращают scores в исходном порядке пар.
+"""
+import logging
+from pathlib import Path
+import numpy as np
+from config import config
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILE = "model_int8.onnx"
+
+
+def _length_sorted_batches(lengths: list, batch_size: int):
+    """Индексы пар, сгруппированные в батчи по возрастанию длины"""
+    order = np.argsort(lengths, kind="stable")
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+class SentenceTransformersCrossEncoder:
+    """fp32 CrossEncoder из sentence-transformers с length-sorted батчингом"""
+
+    def __init__(self, model_name: str, max_length: int):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=max_length)
+
+    def predict(self, pairs: list, batch_size: int = 16) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+
+        # Длина в символах - дешевый прокси длины в токенах
+        lengths = [len(query) + len(text) for query, text in pairs]
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for batch in _length_sorted_batches(lengths, batch_size):
+            batch_pairs = [pairs[i] for i in batch]
+            scores[batch] = self.model.predict(batch_pairs, batch_size=len(batch_pairs), show_progress_bar=False)
+        return scores
+
+
+class OnnxCrossEncoder:
+    """int8 ONNX cross-encoder поверх onnxruntime (CPUExecutionProvider)"""
+
+    def __init__(self, model_dir: Path, max_length: int):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.max_length = max_length
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_dir / ONNX_MODEL_FILE),
+            session_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [inp.name for inp in self.session.get_inputs()]
+
+    def predict(self, pairs: list, batch_size: int = 16) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+
+        # Токенизируем один раз без паддинга: truncation только документа
+        encoded = self.tokenizer(
+            [query for query, _ in pairs],
+            [text for _, text in pairs],
+            truncation="only_second",
+            max_length=self.max_length,
+        )
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for batch in _length_sorted_batches(lengths, batch_size):
+            features = self.tokenizer.pad(
+                {name: [encoded[name][i] for i in batch] for name in encoded.keys()},
+                return_tensors="np"
+            )
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(None, inputs)[0]
+            # Как и CrossEncoder с одним label - sigmoid поверх логита
+            scores[batch] = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+        return scores
+
+
+def get_onnx_model_dir(model_name: str, num_layers: int = 0) -> Path:
+    """Директория ONNX экспорта для модели (и pruned варианта)"""
+    dir_name = model_name.replace("/", "__")
+    if num_layers:
+        dir_name += f"-L{num_layers}"
+    return Path(config.RERANKER_ONNX_DIR) / dir_name
+
+
+def _prune_layers(model, num_layers: int):
+    """Оставляет num_layers равномерно распределенных слоев encoder'а"""
+    import torch
+
+    base_model = getattr(model, model.base_model_prefix)
+    layers = base_model.encoder.layer
+    if num_layers >= len(layers):
+        logger.warning(f"Requested {num_layers} layers, model has {len(layers)} - pruning skipped")
+        return
+
+    keep = np.linspace(0, len(layers) - 1, num_layers).round().astype(int)
+    base_model.encoder.layer = torch.nn.ModuleList([layers[i] for i in keep])
+    model.config.num_hidden_layers = num_layers
+    logger.info(f"Pruned encoder to {num_layers} layers: {keep.tolist()}")
+
+
+def export_onnx_cross_encoder(model_name: str, output_dir: Path, num_layers: int = 0):
+    """
+    Экспорт cross-encoder в ONNX с динамической int8 квантизацией
+
+    Args:
+        model_name: HuggingFace модель cross-encoder
+        output_dir: куда сохранить model_int8.onnx и токенизатор
+        num_layers: 0 - все слои, иначе pruned вариант с этим числом слоев
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    logger.info(f"Exporting {model_name} to ONNX (layers: {num_layers or 'all'})...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    if num_layers:
+        _prune_layers(model, num_layers)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_dir / "model_fp32.onnx"
+
+    dummy = tokenizer(["пример запроса"], ["пример документа"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    quantize_dynamic(str(fp32_path), str(output_dir / ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+    tokenizer.save_pretrained(str(output_dir))
+    logger.info(f"✓ ONNX int8 model saved to {output_dir}")
+
+
+def load_onnx_cross_encoder(model_name: str, num_layers: int = 0) -> OnnxCrossEncoder:
+    """Загрузка ONNX cross-encoder, экспорт при первом запуске"""
+    model_dir = get_onnx_model_dir(model_name, num_layers)
+    if not (model_dir / ONNX_MODEL_FILE).exists():
+        export_onnx_cross_encoder(model_name, model_dir, num_layers)
+    return OnnxCrossEncoder(model_dir, config.RERANKER_MAX_LENGTH)
+
+
+def create_cross_encoder(backend: str = None):
+    """
+    Фабрика cross-encoder по backend из конфига
+    Поддерживает: sentence_transformers, onnx
+    """
+    backend = (backend or config.RERANKER_BACKEND).lower()
+
+    if backend == "sentence_transformers":
+        logger.info(f"Loading cross-encoder model: {config.CROSS_ENCODER_MODEL}")
+        return SentenceTransformersCrossEncoder(config.CROSS_ENCODER_MODEL, config.RERANKER_MAX_LENGTH)
+
+    elif backend == "onnx":
+        logger.info(
+            f"Loading ONNX int8 cross-encoder: {config.CROSS_ENCODER_MODEL} "
+            f"(layers: {config.RERANKER_ONNX_NUM_LAYERS or 'all'})"
+        )
+        return load_onnx_cross_encoder(config.CROSS_ENCODER_MODEL, config.RERANKER_ONNX_NUM_LAYERS)
+
+    else:
+        raise ValueError(f"Unknown reranker backend: {backend}. Use 'sentence_transformers' or 'onnx'")
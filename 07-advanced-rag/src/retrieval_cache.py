@@ -0,0 +1,140 @@
+"""
+Семантический LRU кеш с поиском по эмбеддингу запроса
+
+Хранит эмбеддинги недавних запросов в небольшой матрице вместе с результатом
+(например, id чанков после retrieval). Новый запрос, cosine similarity которого
+с одним из сохраненных выше порога, получает сохраненный результат без
+повторной работы. Точное совпадение нормализованного текста проверяется
+до вычисления эмбеддинга.
+"""
+import logging
+import re
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Нормализация текста запроса: регистр, пунктуация, пробелы"""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class SemanticCache:
+    """
+    Ограниченный LRU кеш: нормализованный запрос + эмбеддинг -> значение
+
+    Args:
+        max_size: максимальное количество записей
+        threshold: минимальная cosine similarity для попадания
+        name: имя кеша для логов
+    """
+
+    def __init__(self, max_size: int, threshold: float, name: str = "semantic"):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.name = name
+        self._lock = threading.Lock()
+        self._matrix = None  # (max_size, dim), строки нормализованы
+        self._queries = [None] * max_size
+        self._values = [None] * max_size
+        self._slots = {}  # нормализованный запрос -> слот
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _touch(self, slot: int):
+        self._tick += 1
+        self._last_used[slot] = self._tick
+
+    def get_exact(self, query: str):
+        """Поиск по точному совпадению нормализованного текста (без эмбеддинга)"""
+        key = normalize_query(query)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                return None
+            self._touch(slot)
+            self.hits += 1
+            return self._values[slot]
+
+    def lookup(self, embedding):
+        """
+        Поиск ближайшего сохраненного запроса по cosine similarity
+
+        Returns:
+            tuple: (value, similarity) или None при промахе
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        with self._lock:
+            if self._matrix is None or not self._slots or norm == 0:
+                self.misses += 1
+                return None
+            occupied = np.fromiter(self._slots.values(), dtype=np.int64)
+            similarities = self._matrix[occupied] @ (vector / norm)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            slot = int(occupied[best])
+            self._touch(slot)
+            self.hits += 1
+            return self._values[slot], similarity
+
+    def put(self, query: str, embedding, value):
+        """Сохранение результата; при переполнении вытесняется давно не использованная запись"""
+        if self.max_size <= 0:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+
+            slot = self._slots.get(key)
+            if slot is None:
+                if len(self._slots) < self.max_size:
+                    slot = len(self._slots)
+                else:
+                    occupied = np.fromiter(self._slots.values(), dtype=np.int64)
+                    slot = int(occupied[np.argmin(self._last_used[occupied])])
+                    del self._slots[normalize_query(self._queries[slot])]
+                    self.evictions += 1
+                self._slots[key] = slot
+
+            self._matrix[slot] = vector / norm
+            self._queries[slot] = query
+            self._values[slot] = value
+            self._touch(slot)
+
+    def clear(self):
+        """Инвалидация всех записей (например, после переиндексации)"""
+        with self._lock:
+            self._slots.clear()
+            self._queries = [None] * self.max_size
+            self._values = [None] * self.max_size
+            self._last_used[:] = 0
+        logger.info(f"{self.name} cache cleared")
+
+    def stats(self) -> dict:
+        """Метрики кеша: hits, misses, hit rate, размер, вытеснения"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+            }
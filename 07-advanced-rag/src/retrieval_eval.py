@@ -0,0 +1,271 @@
+"""
+Офлайн оценка качества retrieval без LLM (recall@k, MRR, nDCG@k)
+
+Читает локальный датасет (datasets/06-rag-qa-dataset.json, формат
+dataset_synthesizer.py): эталонные contexts и metadata.source каждого вопроса.
+Релевантные чанки - чанки того же источника, большая часть слов которых
+входит в эталонный контекст (как benchmark.is_relevant).
+
+Дорогие этапы выполняются один раз на вопрос:
+- эмбеддинг вопроса (кеш эмбеддингов запросов, QUERY_EMBEDDING_CACHE_*)
+- cosine similarity со всеми чанками (матрица эмбеддингов индекса)
+- BM25 scores по всему корпусу
+- cross-encoder scores для объединения кандидатов при максимальных k
+
+Точки сетки (SEMANTIC_RETRIEVER_K, BM25_RETRIEVER_K, веса ensemble,
+RERANKER_TOP_K) только обрезают готовые ранжирования, делают RRF fusion
+и сортировку по готовым scores, поэтому считаются параллельно за секунды.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from config import config
+from benchmark import DEFAULT_DATASET_PATH, _words, load_dataset
+import indexer
+import metadata_index
+import rag
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODES = ["semantic", "hybrid", "hybrid_reranker"]
+
+
+class LegScores:
+    """
+    Закешированные scores и ранжирования всех вопросов датасета
+
+    Args:
+        questions: список вопросов
+        relevant: список множеств релевантных chunk_id для каждого вопроса
+        max_k: наибольший k в сетке (глубина ранжирований)
+    """
+
+    def __init__(self, questions: list, relevant: list, max_k: int):
+        self.questions = questions
+        self.max_k = max_k
+
+        start = time.perf_counter()
+        # Как _fuse_rrf: чанки с одинаковым текстом считаются одним документом
+        first_by_text = {}
+        self.canonical = np.array(
+            [first_by_text.setdefault(chunk.page_content, chunk_id) for chunk_id, chunk in enumerate(rag.chunks)],
+            dtype=np.int64
+        )
+        # Ранжирования состоят из канонических id, поэтому и эталон тоже:
+        # дубликат релевантного чанка не должен считаться отдельным документом
+        self.relevant = [{int(self.canonical[chunk_id]) for chunk_id in ids} for ids in relevant]
+
+        query_vectors = np.asarray(
+            [rag.vector_store.embedding.embed_query(question) for question in questions],
+            dtype=np.float32
+        )
+        norms = np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        # [вопросы x чанки] одним матричным умножением
+        semantic_scores = (query_vectors / norms) @ rag._embedding_matrix.T
+        self.semantic_order = np.argsort(-semantic_scores, axis=1)[:, :max_k]
+
+        bm25_retriever = rag.retriever.retrievers[1]
+        bm25_scores = np.asarray([
+            bm25_retriever.vectorizer.get_scores(bm25_retriever.preprocess_func(question))
+            for question in questions
+        ])
+        self.bm25_order = np.argsort(-bm25_scores, axis=1)[:, :max_k]
+        self.rerank_scores = None
+        logger.info(f"Leg scores cached for {len(questions)} questions in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def compute_rerank_scores(self):
+        """Cross-encoder scores для всех кандидатов при максимальных k (один батч)"""
+        start = time.perf_counter()
+        candidates = [
+            sorted(set(self.canonical[self.semantic_order[i]]) | set(self.canonical[self.bm25_order[i]]))
+            for i in range(len(self.questions))
+        ]
+        pairs = [
+            (question, rag.chunks[chunk_id].page_content)
+            for question, chunk_ids in zip(self.questions, candidates)
+            for chunk_id in chunk_ids
+        ]
+        scores = rag.get_cross_encoder().predict(pairs, batch_size=config.RERANKER_BATCH_SIZE)
+        self.rerank_scores = []
+        offset = 0
+        for chunk_ids in candidates:
+            self.rerank_scores.append(dict(zip(chunk_ids, scores[offset:offset + len(chunk_ids)])))
+            offset += len(chunk_ids)
+        logger.info(f"Cross-encoder scores cached for {len(pairs)} pairs in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def ranking(self, i: int, mode: str, params: dict) -> list:
+        """Ранжирование chunk_id вопроса i для режима и точки сетки"""
+        semantic_ids = self.canonical[self.semantic_order[i, :params["semantic_k"]]]
+        if mode == "semantic":
+            return list(dict.fromkeys(semantic_ids.tolist()))
+
+        bm25_ids = self.canonical[self.bm25_order[i, :params["bm25_k"]]]
+        weights = (params["semantic_weight"], 1.0 - params["semantic_weight"])
+        scores = {}
+        for ids, weight in zip((semantic_ids, bm25_ids), weights):
+            for rank, chunk_id in enumerate(dict.fromkeys(ids.tolist()), start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (rank + rag.retriever.c)
+        fused = sorted(scores, key=scores.get, reverse=True)
+        if mode == "hybrid":
+            return fused
+
+        rerank_scores = self.rerank_scores[i]
+        reranked = sorted(fused, key=lambda chunk_id: rerank_scores[chunk_id], reverse=True)
+        return reranked[:params["reranker_top_k"]]
+
+
+def relevant_chunk_ids(item: dict) -> set:
+    """chunk_id чанков, совпадающих с эталонным контекстом (в пределах источника вопроса)"""
+    source = metadata_index.source_name(str(item.get("metadata", {}).get("source", "")))
+    context_words = [_words(context) for context in item["contexts"]]
+    relevant = set()
+    for chunk_id, chunk in enumerate(rag.chunks):
+        if source and metadata_index.source_name(chunk.metadata.get("source", "")) != source:
+            continue
+        doc_words = _words(chunk.page_content)
+        if doc_words and any(len(doc_words & words) / len(doc_words) >= 0.5 for words in context_words):
+            relevant.add(chunk_id)
+    return relevant
+
+
+def score_ranking(ranking: list, relevant: set, k: int) -> dict:
+    """recall@k, reciprocal rank и nDCG@k одного ранжирования (бинарная релевантность)"""
+    relevances = [int(chunk_id in relevant) for chunk_id in ranking]
+    first = next((rank for rank, rel in enumerate(relevances, start=1) if rel), None)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    gains = np.asarray(relevances[:k], dtype=np.float32)
+    dcg = float((gains * discounts[:len(gains)]).sum())
+    # Идеальное ранжирование: все релевантные чанки индекса в начале списка
+    idcg = float(discounts[:min(len(relevant), k)].sum())
+    return {
+        "recall": sum(relevances[:k]) / len(relevant),
+        "rr": 1.0 / first if first else 0.0,
+        "ndcg": dcg / idcg,
+    }
+
+
+def evaluate_point(legs: LegScores, mode: str, params: dict, k: int) -> dict:
+    """Средние метрики по датасету для одной точки сетки"""
+    rows = [
+        score_ranking(legs.ranking(i, mode, params), relevant, k)
+        for i, relevant in enumerate(legs.relevant)
+    ]
+    return {
+        "mode": mode,
+        **params,
+        f"recall@{k}": float(np.mean([row["recall"] for row in rows])),
+        "mrr": float(np.mean([row["rr"] for row in rows])),
+        f"ndcg@{k}": float(np.mean([row["ndcg"] for row in rows])),
+    }
+
+
+def build_grid(mode: str, semantic_ks: list, bm25_ks: list, weights: list, reranker_top_ks: list) -> list:
+    """Точки сетки параметров для режима"""
+    if mode == "semantic":
+        return [{"semantic_k": semantic_k} for semantic_k in semantic_ks]
+    grid = [
+        {"semantic_k": semantic_k, "bm25_k": bm25_k, "semantic_weight": weight}
+        for semantic_k, bm25_k, weight in itertools.product(semantic_ks, bm25_ks, weights)
+    ]
+    if mode == "hybrid":
+        return grid
+    return [dict(point, reranker_top_k=top_k) for point in grid for top_k in reranker_top_ks]
+
+
+async def _build_index():
+    """Индексация документов и hybrid retriever (нужен BM25 vectorizer)"""
+    vector_store, chunks = await indexer.reindex_all()
+    if vector_store is None:
+        raise ValueError("No documents indexed")
+    rag.vector_store, rag.chunks = vector_store, chunks
+    config.RETRIEVAL_MODE = "hybrid"
+    rag.initialize_retriever()
+
+
+def evaluate_retrieval(dataset_path: str, modes: list, semantic_ks: list, bm25_ks: list,
+                       weights: list, reranker_top_ks: list, k: int = 3, workers: int = 4) -> list:
+    """
+    Сетка параметров retrieval по всем режимам
+
+    Returns:
+        list[dict]: метрики каждой точки сетки (по убыванию nDCG@k)
+    """
+    start = time.perf_counter()
+    dataset = load_dataset(dataset_path)
+    asyncio.run(_build_index())
+
+    samples = [(item["question"], relevant_chunk_ids(item)) for item in dataset]
+    samples = [(question, relevant) for question, relevant in samples if relevant]
+    logger.info(f"Questions with relevant chunks in index: {len(samples)}/{len(dataset)}")
+    if not samples:
+        raise ValueError("No questions with relevant chunks - check dataset and index")
+
+    legs = LegScores(
+        [question for question, _ in samples],
+        [relevant for _, relevant in samples],
+        max(semantic_ks + bm25_ks)
+    )
+    if "hybrid_reranker" in modes:
+        legs.compute_rerank_scores()
+
+    tasks = [
+        (mode, params)
+        for mode in modes
+        for params in build_grid(mode, semantic_ks, bm25_ks, weights, reranker_top_ks)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda task: evaluate_point(legs, task[0], task[1], k), tasks))
+
+    results.sort(key=lambda row: row[f"ndcg@{k}"], reverse=True)
+    elapsed = time.perf_counter() - start
+
+    print(f"\nRetrieval evaluation: {len(samples)} questions, {len(tasks)} grid points, {elapsed:.1f} s")
+    print(f"{'mode':<16} {'sem_k':>5} {'bm25_k':>6} {'w_sem':>5} {'top_k':>5} {f'R@{k}':>6} {'MRR':>6} {f'nDCG@{k}':>7}")
+    for row in results:
+        print(
+            f"{row['mode']:<16} {row['semantic_k']:>5} {row.get('bm25_k', '-'):>6} "
+            f"{row.get('semantic_weight', '-'):>5} {row.get('reranker_top_k', '-'):>5} "
+            f"{row[f'recall@{k}']:>6.3f} {row['mrr']:>6.3f} {row[f'ndcg@{k}']:>7.3f}"
+        )
+    return results
+
+
+def main():
+    """Main CLI function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline retrieval evaluation (recall@k, MRR, nDCG) without LLM calls")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_PATH, help="Path to local JSON dataset")
+    parser.add_argument("--modes", nargs="*", default=MODES, choices=MODES, help="Retrieval modes to evaluate")
+    parser.add_argument("--semantic-k", type=int, nargs="*", default=[5, 10, 20], help="SEMANTIC_RETRIEVER_K grid")
+    parser.add_argument("--bm25-k", type=int, nargs="*", default=[5, 10, 20], help="BM25_RETRIEVER_K grid")
+    parser.add_argument("--weights", type=float, nargs="*", default=[0.3, 0.5, 0.7], help="Semantic ensemble weight grid")
+    parser.add_argument("--reranker-top-k", type=int, nargs="*", default=[3, 5], help="RERANKER_TOP_K grid")
+    parser.add_argument("--k", type=int, default=3, help="Cutoff for recall@k and nDCG@k")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel grid workers")
+    parser.add_argument("--output", help="Save results to JSON file")
+    args = parser.parse_args()
+
+    if not Path(args.dataset).exists():
+        logger.error(f"Dataset not found: {args.dataset}. Create it with: make dataset")
+        return
+
+    results = evaluate_retrieval(
+        args.dataset, args.modes, args.semantic_k, args.bm25_k,
+        args.weights, args.reranker_top_k, k=args.k, workers=args.workers
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        logger.info(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Single-flight объединение одинаковых одновременных запросов
+
+Пока запрос с ключом выполняется, повторные запросы с тем же ключом не
+запускают свою работу, а ждут результат первого (общий Future). Работает
+одновременно для синхронных вызовов из потоков и для async кода: async
+вызывающие ждут тот же concurrent.futures.Future через asyncio.wrap_future.
+
+Ключ должен включать все, от чего зависит результат (нормализованный
+запрос, фильтры, поколение индекса).
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Карта ключ -> Future выполняющегося запроса и счетчики объединений
+
+    Args:
+        name: имя для логов и статистики
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def claim(self, key):
+        """
+        Returns:
+            tuple: (future, owner) - owner=True означает, что выполнять должен вызывающий
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                logger.info(f"{self.name}: joined in-flight request ({self.coalesced} coalesced total)")
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.executions += 1
+            return future, True
+
+    def resolve(self, key, future: Future, value=None, error: BaseException = None):
+        """Завершение запроса: результат или ошибка всем ожидающим"""
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(value)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # Отмена первого запроса не должна выглядеть как отмена ожидающих
+            future.set_exception(RuntimeError(f"{self.name}: shared request was interrupted ({type(error).__name__})"))
+
+    def run(self, key, compute):
+        """Синхронное выполнение compute() один раз на ключ среди одновременных вызовов"""
+        future, owner = self.claim(key)
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, value=value)
+        return value
+
+    async def arun(self, key, acompute):
+        """
+        Async вариант run
+
+        Returns:
+            tuple: (результат, shared) - shared=True, если результат получен от другого запроса
+        """
+        future, owner = self.claim(key)
+        if not owner:
+            return await asyncio.wrap_future(future), True
+        try:
+            value = await acompute()
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, value=value)
+        return value, False
+
+    def stats(self) -> dict:
+        """Количество выполнений и объединенных запросов"""
+        with self._lock:
+            total = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+                "coalesced_rate": self.coalesced / total if total else 0.0,
+            }
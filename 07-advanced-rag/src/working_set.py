@@ -0,0 +1,109 @@
+"""
+Рабочий набор чанков диалога для уточняющих вопросов
+
+Для каждого чата хранятся chunk_id, найденные за последние ходы диалога.
+Уточняющий вопрос ("а досрочно можно?") сначала сравнивается с этим
+небольшим набором по эмбеддингам чанков из матрицы индекса; если набор
+покрывает вопрос, LLM переписывание запроса и полный retrieval не нужны.
+
+Абсолютный порог cosine similarity зависит от модели эмбеддингов: у
+multilingual-e5 почти любые два русских текста дают больше 0.7, у OpenAI
+text-embedding-3 релевантные пары бывают около 0.5. Поэтому вместе с
+chunk_id хода хранится reference - similarity запроса полного retrieval с
+лучшим найденным чанком, и чанк набора покрывает уточняющий вопрос, только
+если его similarity не ниже reference - margin (и не ниже абсолютного
+минимума для провайдера).
+
+Наборы привязаны к поколению индекса: после переиндексации старые
+chunk_id не используются.
+"""
+import logging
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def covered_positions(similarities: np.ndarray, reference: float, min_similarity: float,
+                      margin: float, top_k: int) -> list:
+    """
+    Позиции чанков набора, покрывающих уточняющий вопрос (по убыванию similarity)
+
+    Args:
+        similarities: cosine similarity вопроса с чанками набора
+        reference: similarity запроса полного retrieval с его лучшим чанком
+        min_similarity: абсолютный минимум (калибруется по модели эмбеддингов)
+        margin: насколько similarity может быть ниже reference
+        top_k: сколько чанков вернуть не более
+    """
+    threshold = max(min_similarity, reference - margin)
+    order = np.argsort(-similarities)[:top_k]
+    return [int(i) for i in order if similarities[i] >= threshold]
+
+
+class ChatWorkingSets:
+    """
+    LRU по чатам: chat_id -> chunk_id и reference последних max_turns ходов
+
+    Args:
+        max_chats: сколько чатов хранить
+        max_turns: сколько последних ходов входит в набор
+    """
+
+    def __init__(self, max_chats: int, max_turns: int):
+        self.max_chats = max_chats
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def remember(self, chat_id, generation: int, chunk_ids: list, reference: float):
+        """Добавление chunk_id хода полного retrieval и его reference similarity"""
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None or entry[0] != generation:
+                entry = (generation, deque(maxlen=self.max_turns))
+                self._data[chat_id] = entry
+            entry[1].append((list(chunk_ids), reference))
+            self._data.move_to_end(chat_id)
+            while len(self._data) > self.max_chats:
+                self._data.popitem(last=False)
+
+    def lookup(self, chat_id, generation: int):
+        """
+        Набор чата для уточняющего вопроса
+
+        Returns:
+            tuple: (уникальные chunk_id, сначала последние ходы; reference последнего хода)
+                или ([], None), если набора нет
+        """
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None or entry[0] != generation or not entry[1]:
+                return [], None
+            self._data.move_to_end(chat_id)
+            turns = list(entry[1])
+        chunk_ids = list(dict.fromkeys(chunk_id for ids, _ in reversed(turns) for chunk_id in ids))
+        return chunk_ids, turns[-1][1]
+
+    def record_lookup(self, hit: bool):
+        with self._lock:
+            self.lookups += 1
+            self.hits += int(hit)
+
+    def forget(self, chat_id):
+        """Сброс набора чата (новый диалог)"""
+        with self._lock:
+            self._data.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        """Количество чатов и доля уточняющих вопросов, отвеченных из набора"""
+        with self._lock:
+            return {
+                "chats": len(self._data),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
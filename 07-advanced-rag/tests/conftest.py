@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Модули бота импортируются из src, как при запуске src/bot.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,38 @@
+"""Выбор количества документов по кривой scores"""
+import numpy as np
+from adaptive_k import candidate_cutoff, elbow_cutoff, relative_cutoff, rerank_cutoff
+
+# Три релевантных документа, затем плато нерелевантных
+CLEAR_LEADERS = [0.91, 0.88, 0.85, 0.41, 0.38, 0.37, 0.36, 0.35]
+
+
+def test_elbow_at_end_of_leaders():
+    assert elbow_cutoff(CLEAR_LEADERS) == 3
+
+
+def test_no_elbow_on_linear_or_short_curves():
+    assert elbow_cutoff(np.linspace(0.9, 0.5, 10)) == 10
+    assert elbow_cutoff([0.9, 0.1]) == 2
+    assert elbow_cutoff([0.5, 0.5, 0.5]) == 3
+
+
+def test_relative_drop():
+    assert relative_cutoff(CLEAR_LEADERS, max_drop=0.1) == 3
+    assert relative_cutoff(CLEAR_LEADERS, max_drop=0.7) == 8
+    # Отрицательные scores (BM25 / cross-encoder logits) не отсекаются
+    assert relative_cutoff([-1.0, -2.0], max_drop=0.1) == 2
+
+
+def test_candidate_cutoff_respects_min_k():
+    assert candidate_cutoff(CLEAR_LEADERS, min_k=2, max_drop=0.5) == 3
+    assert candidate_cutoff(CLEAR_LEADERS, min_k=5, max_drop=0.5) == 5
+    assert candidate_cutoff(CLEAR_LEADERS[:2], min_k=5, max_drop=0.5) == 2
+
+
+def test_rerank_cutoff_uses_threshold_and_elbow():
+    logits = [7.5, 6.9, 1.2, -3.0, -3.4, -3.8, -4.1]
+    # Перегиб после трех документов, все три выше порога
+    assert rerank_cutoff(logits, min_k=1, threshold=0.0) == 3
+    assert rerank_cutoff(logits, min_k=1, threshold=2.0) == 2
+    assert rerank_cutoff(logits, min_k=1, threshold=7.0) == 1
+    assert rerank_cutoff(logits, min_k=4, threshold=7.0) == 4
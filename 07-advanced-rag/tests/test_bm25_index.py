@@ -0,0 +1,31 @@
+"""Posting lists BM25 дают те же scores, что BM25Okapi.get_scores"""
+import numpy as np
+from rank_bm25 import BM25Okapi
+from bm25_index import Bm25Postings
+
+CORPUS = [
+    # "банк" встречается больше чем в половине документов: idf заменяется на epsilon
+    "банк вклад можно закрыть досрочно с потерей процентов",
+    "банк процентная ставка по вкладу зависит от срока",
+    "банк кредитная карта с льготным периодом",
+    "банк досрочное погашение кредита без комиссии",
+    "вклад вклад вклад пополнение",
+    "",
+]
+QUERIES = [
+    "досрочно закрыть вклад",
+    "ставка по кредиту",
+    "льготный период кредитной карты",
+    "банк",
+    "неизвестные слова",
+    "",
+]
+
+
+def test_scores_match_get_scores():
+    vectorizer = BM25Okapi([text.split() for text in CORPUS])
+    postings = Bm25Postings(vectorizer)
+    tokens = [query.split() for query in QUERIES]
+    expected = np.array([vectorizer.get_scores(query) for query in tokens])
+    np.testing.assert_allclose(postings.scores(tokens), expected, rtol=1e-5, atol=1e-6)
+    assert postings.scores(tokens).shape == (len(QUERIES), len(CORPUS))
@@ -0,0 +1,98 @@
+"""Хранилище чанков: save_generation -> load дает те же чанки и тот же поиск"""
+import gc
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import InMemoryVectorStore
+from chunk_store import ChunkSequence, ChunkStore, ChunkStoreRetriever, save_generation
+
+VOCABULARY = ["вклад", "ставка", "кредит", "карта", "кешбэк", "пенсионер", "досрочно", "комиссия"]
+
+
+class BagOfWordsEmbeddings(Embeddings):
+    """Детерминированные эмбеддинги: счетчики слов словаря и длина текста (без равных scores)"""
+
+    def _embed(self, text: str) -> list:
+        text = text.lower()
+        return [float(text.count(word)) for word in VOCABULARY] + [len(text) / 100]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+DOCUMENTS = [
+    Document("Ставка по вкладу 18% годовых, вклад на год", metadata={
+        "source": "deposits.pdf", "category": "вклады", "page": 1, "start_index": 0, "token_count": 12,
+    }),
+    Document("Пенсионер получает надбавку к ставке по вкладу", metadata={
+        "source": "deposits.pdf", "category": "вклады", "page": 2, "start_index": 40, "token_count": 9,
+        "section": "Льготы",
+    }),
+    Document("Кредит можно погасить досрочно без комиссии", metadata={
+        "source": "credits.pdf", "category": "кредиты", "page": 1, "start_index": 0,
+    }),
+    Document("Карта с кешбэком 5%, обслуживание карты без комиссии", metadata={
+        "source": "cards.json", "category": "карты", "tags": ["кешбэк", "карта"],
+    }),
+]
+QUERIES = ["ставка по вкладу для пенсионер", "досрочно погасить кредит", "кешбэк по карте", "комиссия"]
+
+
+@pytest.fixture
+def vector_store():
+    store = InMemoryVectorStore(BagOfWordsEmbeddings())
+    store.add_documents(DOCUMENTS, ids=[str(chunk_id) for chunk_id in range(len(DOCUMENTS))])
+    return store
+
+
+def build_store(vector_store) -> ChunkStore:
+    """Как rag._compact_chunks: векторы из vector_store по chunk_id"""
+    vectors = np.array(
+        [vector_store.store[str(chunk_id)]["vector"] for chunk_id in range(len(DOCUMENTS))],
+        dtype=np.float32
+    )
+    return ChunkStore.from_documents(DOCUMENTS, vectors)
+
+
+def test_save_generation_round_trip(vector_store, tmp_path):
+    memory = build_store(vector_store)
+    loaded = save_generation(memory, str(tmp_path))
+
+    assert isinstance(loaded.text_buffer, np.memmap)
+    assert len(loaded) == len(DOCUMENTS)
+    for chunk_id, doc in enumerate(DOCUMENTS):
+        assert loaded.text(chunk_id) == doc.page_content
+        assert loaded.metadata(chunk_id) == {**doc.metadata, "chunk_id": chunk_id}
+        assert loaded.document(chunk_id) == memory.document(chunk_id)
+    np.testing.assert_array_equal(loaded.vectors, memory.vectors)
+    np.testing.assert_allclose(np.linalg.norm(loaded.vectors, axis=1), 1.0, rtol=1e-6)
+
+
+def test_retrieval_matches_in_memory_vector_store(vector_store, tmp_path):
+    loaded = save_generation(build_store(vector_store), str(tmp_path))
+    retriever = ChunkStoreRetriever(
+        chunks=ChunkSequence(loaded), embedding=vector_store.embedding, search_kwargs={"k": 3}
+    )
+    for query in QUERIES:
+        expected = vector_store.similarity_search_with_score(query, k=3)
+        actual = retriever.similarity_search_with_score(query, k=3)
+        assert [doc.page_content for doc, _ in actual] == [doc.page_content for doc, _ in expected]
+        assert [doc.metadata["chunk_id"] for doc, _ in actual] == [int(doc.id) for doc, _ in expected]
+        np.testing.assert_allclose([score for _, score in actual], [score for _, score in expected], rtol=1e-5)
+
+
+def test_generation_directory_removed_after_store_released(vector_store, tmp_path):
+    first = save_generation(build_store(vector_store), str(tmp_path))
+    second = save_generation(build_store(vector_store), str(tmp_path))
+    # Старое поколение еще открыто - новое сохранение его не трогает
+    assert len(list(tmp_path.iterdir())) == 2
+    assert first.text(0) == DOCUMENTS[0].page_content
+
+    del first
+    gc.collect()
+    assert len(list(tmp_path.iterdir())) == 1
+    assert second.text(0) == DOCUMENTS[0].page_content
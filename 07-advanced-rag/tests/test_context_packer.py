@@ -0,0 +1,74 @@
+"""Упаковка контекста: склейка перекрывающихся чанков и бюджет токенов"""
+import sys
+from langchain_core.documents import Document
+import context_packer
+from context_packer import pack_documents
+
+PAGE = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def chunk(chunk_id: int, start: int, end: int, page: int = 1, source: str = "doc.pdf") -> Document:
+    """Чанк страницы PAGE[start:end]; 1 символ = 1 токен, чтобы не зависеть от tiktoken"""
+    return Document(
+        page_content=PAGE[start:end],
+        metadata={"chunk_id": chunk_id, "source": source, "page": page, "start_index": start, "token_count": end - start},
+    )
+
+
+def test_overlapping_chunks_are_merged_without_repeating_overlap():
+    packed = pack_documents([chunk(0, 0, 12), chunk(1, 8, 20)], token_budget=1000)
+    assert len(packed) == 1
+    assert packed[0].page_content == PAGE[0:20]
+    assert packed[0].metadata["start_index"] == 0
+    assert packed[0].metadata["merged_chunk_ids"] == [0, 1]
+    assert packed[0].metadata["token_count"] == 20
+
+
+def test_earlier_chunk_is_prepended():
+    packed = pack_documents([chunk(1, 8, 20), chunk(0, 0, 12)], token_budget=1000)
+    assert [doc.page_content for doc in packed] == [PAGE[0:20]]
+    assert packed[0].metadata["merged_chunk_ids"] == [1, 0]
+
+
+def test_bridging_chunk_joins_two_passages():
+    packed = pack_documents([chunk(0, 0, 10), chunk(2, 20, 30), chunk(1, 8, 22)], token_budget=1000)
+    assert [doc.page_content for doc in packed] == [PAGE[0:30]]
+    assert packed[0].metadata["token_count"] == 30
+
+
+def test_other_pages_and_duplicates():
+    packed = pack_documents(
+        [chunk(0, 0, 12), chunk(0, 0, 12), chunk(1, 8, 20, page=2), chunk(2, 8, 20, source="other.pdf")],
+        token_budget=1000
+    )
+    assert [doc.page_content for doc in packed] == [PAGE[0:12], PAGE[8:20], PAGE[8:20]]
+    assert all("merged_chunk_ids" not in doc.metadata for doc in packed)
+
+
+def test_budget_skips_passages_that_do_not_fit():
+    documents = [chunk(0, 0, 10, page=1), chunk(1, 0, 12, page=2), chunk(2, 0, 6, page=3)]
+    packed = pack_documents(documents, token_budget=17)
+    # 10 + 12 не помещается, следующий менее релевантный фрагмент на 6 токенов - помещается
+    assert [doc.metadata["chunk_id"] for doc in packed] == [0, 2]
+    assert sum(doc.metadata["token_count"] for doc in packed) == 16
+
+
+def test_first_passage_is_kept_over_budget():
+    packed = pack_documents([chunk(0, 0, 30), chunk(1, 0, 5, page=2)], token_budget=10)
+    assert [doc.metadata["chunk_id"] for doc in packed] == [0]
+
+
+def test_merge_is_charged_only_for_new_text():
+    # Перекрытие бесплатно: 12 + 4 новых символа укладываются в бюджет 16
+    packed = pack_documents([chunk(0, 0, 12), chunk(1, 8, 16)], token_budget=16)
+    assert [doc.page_content for doc in packed] == [PAGE[0:16]]
+
+
+def test_counts_four_chars_per_token_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(context_packer, "_token_counter", None)
+    monkeypatch.setitem(sys.modules, "tiktoken", None)  # import tiktoken -> ImportError
+    assert context_packer.count_tokens("") == 0
+    assert context_packer.count_tokens("abcd") == 1
+    assert context_packer.count_tokens("abcde") == 2
+    document = Document(page_content="x" * 40, metadata={"chunk_id": 0})
+    assert pack_documents([document], token_budget=100)[0].metadata["token_count"] == 10
@@ -0,0 +1,32 @@
+"""MMR отбор: почти одинаковые чанки не занимают несколько мест"""
+import numpy as np
+from mmr import mmr_select
+
+
+def normalized(rows) -> np.ndarray:
+    vectors = np.asarray(rows, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+QUERY = normalized([[1.0, 0.2, 0.0]])[0]
+# 0 и 1 - одна таблица тарифов в перекрывающихся окнах, 2 - другой релевантный чанк
+CANDIDATES = normalized([
+    [1.0, 0.0, 0.0],
+    [0.98, -0.1, 0.0],
+    [0.6, 0.8, 0.0],
+    [0.0, 0.0, 1.0],
+])
+
+
+def test_near_duplicate_is_replaced_by_diverse_chunk():
+    assert mmr_select(QUERY, CANDIDATES, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_lambda_one_is_pure_relevance():
+    relevance = CANDIDATES @ QUERY
+    expected = sorted(np.argsort(-relevance)[:2].tolist())
+    assert mmr_select(QUERY, CANDIDATES, k=2, lambda_mult=1.0) == expected == [0, 1]
+
+
+def test_returns_all_when_k_covers_candidates():
+    assert mmr_select(QUERY, CANDIDATES, k=10, lambda_mult=0.5) == [0, 1, 2, 3]
@@ -0,0 +1,64 @@
+"""Классификатор уточняющих вопросов и кеш переписанных запросов"""
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from query_rewrite import TransformCache, is_follow_up, skip_reason
+
+
+@pytest.mark.parametrize("text", [
+    # Анафора: местоимения и указательные слова
+    "Можно ли закрыть его досрочно без потери процентов?",
+    "Какие условия у этого вклада для пенсионеров?",
+    "Сколько стоит обслуживание такой карты в год?",
+    # Эллипсис: короткие реплики и маркеры продолжения темы
+    "а для ИП?",
+    "А если я захочу снять часть денег со вклада?",
+    "И сколько процентов начисляется на остаток?",
+    "Расскажи подробнее про условия досрочного расторжения",
+])
+def test_follow_up(text):
+    assert is_follow_up(text)
+
+
+@pytest.mark.parametrize("text", [
+    "Какая ставка по вкладу Лучший процент на год?",
+    "Как оформить кредитную карту с льготным периодом?",
+    "Можно ли досрочно погасить потребительский кредит без комиссии?",
+])
+def test_standalone(text):
+    assert not is_follow_up(text)
+
+
+def test_skip_reason():
+    first = [HumanMessage("Какая ставка по вкладу Лучший процент на год?")]
+    assert skip_reason(first) == "first_turn"
+    standalone = first + [AIMessage("Ставка 18%"), HumanMessage("Как оформить кредитную карту с льготным периодом?")]
+    assert skip_reason(standalone) == "standalone"
+    follow_up = first + [AIMessage("Ставка 18%"), HumanMessage("а для пенсионеров?")]
+    assert skip_reason(follow_up) is None
+
+
+def test_transform_cache_evicts_least_recently_used():
+    cache = TransformCache(max_size=2, max_messages=4)
+    cache.put("a", "запрос a")
+    cache.put("b", "запрос b")
+    assert cache.get("a") == "запрос a"  # a становится самым свежим
+    cache.put("c", "запрос c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "запрос a"
+    assert cache.get("c") == "запрос c"
+    assert cache.stats()["size"] == 2
+
+
+def test_transform_cache_key_uses_dialog_tail_and_prompt():
+    cache = TransformCache(max_size=2, max_messages=2)
+    tail = [AIMessage("Ставка 18%"), HumanMessage("а для пенсионеров?")]
+    key = cache.key([HumanMessage("Вклад Лучший процент")] + tail, "v1", "gpt-4o-mini", 0.0)
+    assert key == cache.key([HumanMessage("Вклад Стабильный")] + tail, "v1", "gpt-4o-mini", 0.0)
+    assert key != cache.key(tail, "v2", "gpt-4o-mini", 0.0)
+
+
+def test_transform_cache_size_zero_stores_nothing():
+    cache = TransformCache(max_size=0, max_messages=4)
+    cache.put("a", "запрос a")
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,103 @@
+"""Объединение одновременных запросов: общий результат, ошибки и отмена первого запроса"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from single_flight import SingleFlight
+
+
+def test_concurrent_sync_calls_share_one_execution():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["doc"]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flight.run, "key", compute)
+        started.wait(5)
+        followers = [executor.submit(flight.run, "key", compute) for _ in range(3)]
+        # Ожидающие должны успеть присоединиться до завершения первого запроса
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result(5)] + [future.result(5) for future in followers]
+
+    assert calls == [1]
+    assert results == [["doc"]] * 4
+    assert flight.stats() == {"executions": 1, "coalesced": 3, "in_flight": 0, "coalesced_rate": 0.75}
+
+
+def test_concurrent_async_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.arun("key", compute) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert results == [("answer", False)] + [("answer", True)] * 4
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight("test")
+    first, owner_first = flight.claim("a")
+    second, owner_second = flight.claim("b")
+    assert owner_first and owner_second and first is not second
+    flight.resolve("a", first, value=1)
+    flight.resolve("b", second, value=2)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_failing_leader_propagates_error_and_releases_key():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("retrieval failed")
+
+    async def main():
+        return await asyncio.gather(*(flight.arun("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+    # Следующий запрос с тем же ключом выполняется заново, а не получает старую ошибку
+    value, shared = asyncio.run(flight.arun("key", lambda: asyncio.sleep(0, result="ok")))
+    assert (value, shared) == ("ok", False)
+
+
+def test_cancelled_leader_does_not_hang_followers():
+    flight = SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        leader = asyncio.create_task(flight.arun("key", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.arun("key", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # Ожидающий получает ошибку, а не отмену и не вечное ожидание
+        with pytest.raises(RuntimeError, match="interrupted"):
+            await asyncio.wait_for(follower, 1)
+        assert flight.stats()["in_flight"] == 0
+        return await flight.arun("key", lambda: asyncio.sleep(0, result="fresh"))
+
+    assert asyncio.run(main()) == ("fresh", False)
@@ -0,0 +1,50 @@
+"""
+Порог покрытия рабочего набора на распределениях scores реальных моделей
+
+Scores взяты по форме распределений cosine similarity вопрос - чанк на
+банковских документах курса: у intfloat/multilingual-e5-base релевантные
+пары около 0.84-0.89, а нерелевантные русские тексты той же тематики
+0.74-0.81; у text-embedding-3-large релевантные 0.5-0.6, нерелевантные 0.1-0.3.
+"""
+import numpy as np
+from working_set import ChatWorkingSets, covered_positions
+
+E5_MIN_SIMILARITY = 0.8
+OPENAI_MIN_SIMILARITY = 0.3
+MARGIN = 0.05
+
+
+def test_e5_related_follow_up_is_covered():
+    # "а досрочно погасить можно?" после вопроса о потребительском кредите
+    similarities = np.array([0.862, 0.845, 0.793, 0.771], dtype=np.float32)
+    assert covered_positions(similarities, 0.874, E5_MIN_SIMILARITY, MARGIN, top_k=3) == [0, 1]
+
+
+def test_e5_unrelated_follow_up_is_not_covered():
+    # "а по вкладам какие ставки?" после вопроса о кредитных картах
+    similarities = np.array([0.806, 0.789, 0.768, 0.742], dtype=np.float32)
+    assert covered_positions(similarities, 0.874, E5_MIN_SIMILARITY, MARGIN, top_k=3) == []
+    # Фиксированный порог 0.6 считал бы такой вопрос покрытым
+    assert covered_positions(similarities, 0.0, 0.6, 0.0, top_k=3) == [0, 1, 2]
+
+
+def test_e5_reference_tightens_threshold_above_floor():
+    # Сильное совпадение в полном retrieval: 0.81 уже далеко от лучшего чанка хода
+    similarities = np.array([0.812, 0.804], dtype=np.float32)
+    assert covered_positions(similarities, 0.905, E5_MIN_SIMILARITY, MARGIN, top_k=3) == []
+
+
+def test_openai_scores_use_lower_floor():
+    related = np.array([0.561, 0.534, 0.287], dtype=np.float32)
+    unrelated = np.array([0.243, 0.198, 0.121], dtype=np.float32)
+    assert covered_positions(related, 0.583, OPENAI_MIN_SIMILARITY, MARGIN, top_k=3) == [0, 1]
+    assert covered_positions(unrelated, 0.583, OPENAI_MIN_SIMILARITY, MARGIN, top_k=3) == []
+
+
+def test_lookup_returns_latest_reference():
+    sets = ChatWorkingSets(max_chats=10, max_turns=2)
+    sets.remember(1, generation=0, chunk_ids=[3, 4], reference=0.87)
+    sets.remember(1, generation=0, chunk_ids=[4, 7], reference=0.85)
+    assert sets.lookup(1, generation=0) == ([4, 7, 3], 0.85)
+    assert sets.lookup(1, generation=1) == ([], None)
+    assert sets.lookup(2, generation=0) == ([], None)
@@ -14,7 +14,7 @@ import logging
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import AIMessage, ToolMessage
 
 from config import config
 from tools import rag_search, currency_converter
@@ -162,7 +162,7 @@ async def agent_answer(messages, chat_id: int):
     3. Если нужен - вызывает инструмент и получает контекст
     4. Формирует финальный ответ на основе контекста
     
-    Используем stream для детального логирования каждого шага.
+    Используем astream для детального логирования каждого шага.
     История диалога сохраняется в MemorySaver по chat_id.
     
     Args:
@@ -184,10 +184,12 @@ async def agent_answer(messages, chat_id: int):
     
     logger.info(f"🤖 Agent starting for chat {chat_id}...")
     
-    # stream() возвращает каждый шаг агента (для детального логирования)
+    # astream() возвращает каждый шаг агента (для детального логирования)
     # stream_mode="values" - получаем полное состояние на каждом шаге
+    # Async вариант не блокирует event loop: LLM вызовы и async rag_search
+    # разных чатов выполняются параллельно
     final_state = None
-    for state in bank_agent.stream(inputs, config=agent_config, stream_mode="values"):
+    async for state in bank_agent.astream(inputs, config=agent_config, stream_mode="values"):
         final_state = state
         _log_agent_step(state["messages"][-1])
     
@@ -211,3 +213,21 @@ async def agent_answer(messages, chat_id: int):
         "answer": answer,
         "documents": documents
     }
+
+
+async def remember_exchange(chat_id: int, user_message, answer: str):
+    """
+    Запись вопроса и ответа, полученного мимо агента (FAQ), в историю диалога
+
+    Состояние обновляется от имени узла model, как будто агент ответил сам,
+    поэтому следующий вопрос в этом чате видит полный контекст.
+    """
+    if bank_agent is None:
+        raise ValueError("Agent not initialized")
+
+    agent_config = {"configurable": {"thread_id": str(chat_id)}}
+    await bank_agent.aupdate_state(
+        agent_config,
+        {"messages": [user_message, AIMessage(content=answer)]},
+        as_node="model"
+    )
@@ -0,0 +1,57 @@
+"""
+Инвертированный индекс BM25 для пакетного scoring нескольких запросов
+
+BM25Okapi.get_scores для каждого токена запроса проходит по всем документам
+(doc.get(token) по списку словарей). Здесь веса BM25 каждого токена
+(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))) заранее собраны
+в posting lists: (chunk_id документов с токеном, их веса). Scores пачки
+запросов - сумма posting lists их токенов в матрицу [запросы x чанки],
+результат совпадает с get_scores.
+"""
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Bm25Postings:
+    """
+    Posting lists с готовыми весами BM25 по токенам корпуса
+
+    Args:
+        vectorizer: BM25Okapi из rank_bm25 (BM25Retriever.vectorizer)
+    """
+
+    def __init__(self, vectorizer):
+        self.size = len(vectorizer.doc_freqs)
+        k1, b = vectorizer.k1, vectorizer.b
+        doc_len = np.asarray(vectorizer.doc_len, dtype=np.float32)
+        norm = k1 * (1 - b + b * doc_len / vectorizer.avgdl)
+
+        ids = {}
+        freqs = {}
+        for doc_id, doc_freqs in enumerate(vectorizer.doc_freqs):
+            for token, freq in doc_freqs.items():
+                ids.setdefault(token, []).append(doc_id)
+                freqs.setdefault(token, []).append(freq)
+
+        self._postings = {}
+        for token, token_ids in ids.items():
+            idf = vectorizer.idf.get(token) or 0.0
+            if not idf:
+                continue
+            token_ids = np.asarray(token_ids, dtype=np.int32)
+            tf = np.asarray(freqs[token], dtype=np.float32)
+            self._postings[token] = (token_ids, idf * tf * (k1 + 1) / (tf + norm[token_ids]))
+
+        logger.info(f"BM25 postings built: {len(self._postings)} tokens, {self.size} documents")
+
+    def scores(self, token_lists: list) -> np.ndarray:
+        """BM25 scores [запросы x документы] для списков токенов запросов"""
+        result = np.zeros((len(token_lists), self.size), dtype=np.float32)
+        for row, tokens in enumerate(token_lists):
+            for token in tokens:
+                posting = self._postings.get(token)
+                if posting is not None:
+                    result[row, posting[0]] += posting[1]
+        return result
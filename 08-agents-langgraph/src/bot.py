@@ -22,6 +22,7 @@ from config import config
 import indexer
 import rag
 import agent
+import tools
 
 # Создаем директорию для логов
 log_dir = Path("logs")
@@ -73,6 +74,8 @@ async def main():
         rag.vector_store, rag.chunks = result
         # Инициализируем retriever (semantic/hybrid/hybrid_reranker в зависимости от конфига)
         rag.initialize_retriever()
+        tools.refresh_rag_search_description()
+        rag.start_cache_warmup()
         stats = rag.get_vector_store_stats()
         logger.info(f"✅ Indexing completed: {stats['count']} documents indexed")
     else:
@@ -20,6 +20,10 @@ class Config:
     HUGGINGFACE_EMBEDDING_MODEL = os.getenv("HUGGINGFACE_EMBEDDING_MODEL", "intfloat/multilingual-e5-base")
     HUGGINGFACE_DEVICE = os.getenv("HUGGINGFACE_DEVICE", "cpu")  # cpu/cuda/mps
     
+    # Кеш эмбеддингов запросов (общий для retriever, кешей и evaluation)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))  # 0 = выключен
+    QUERY_EMBEDDING_CACHE_DIR = os.getenv("QUERY_EMBEDDING_CACHE_DIR", "")  # пусто = только в памяти
+    
     # Retrieval Configuration
     RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "semantic")  # semantic/hybrid/hybrid_reranker
     SEMANTIC_RETRIEVER_K = int(os.getenv("SEMANTIC_RETRIEVER_K", "10"))
@@ -27,9 +31,81 @@ class Config:
     ENSEMBLE_SEMANTIC_WEIGHT = float(os.getenv("ENSEMBLE_SEMANTIC_WEIGHT", "0.5"))
     ENSEMBLE_BM25_WEIGHT = float(os.getenv("ENSEMBLE_BM25_WEIGHT", "0.5"))
     
+    # Расширение результатов соседними чанками по индексу смежности
+    CHUNK_EXPANSION = os.getenv("CHUNK_EXPANSION", "none").lower()  # none/neighbors/parent
+    CHUNK_EXPANSION_WINDOW = int(os.getenv("CHUNK_EXPANSION_WINDOW", "1"))  # соседей с каждой стороны
+    
+    # Колоночное хранилище чанков: тексты, метаданные и эмбеддинги в numpy массивах вместо Document
+    CHUNK_STORE = os.getenv("CHUNK_STORE", "false").lower() == "true"
+    CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", "")  # пусто = в памяти, иначе сохранение и memory map
+    
+    # Иерархический retrieval: сначала центроиды секций (категории JSON, страницы PDF), затем чанки лучших секций
+    HIERARCHICAL_RETRIEVAL = os.getenv("HIERARCHICAL_RETRIEVAL", "false").lower() == "true"
+    HIERARCHICAL_TOP_SECTIONS = int(os.getenv("HIERARCHICAL_TOP_SECTIONS", "5"))
+    HIERARCHICAL_MIN_CHUNKS = int(os.getenv("HIERARCHICAL_MIN_CHUNKS", "40"))  # минимум чанков в выбранных секциях
+    
+    # MMR: отбор разнообразных чанков по эмбеддингам из индекса
+    MMR_STAGE = os.getenv("MMR_STAGE", "none").lower()  # none/rerank (перед cross-encoder)/context (перед LLM)
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 - только релевантность, 0.0 - только разнообразие
+    MMR_TOP_K = int(os.getenv("MMR_TOP_K", "6"))  # сколько документов оставить
+    
+    # Прямые ответы на известные вопросы FAQ из JSON корпуса
+    FAQ_FAST_PATH = os.getenv("FAQ_FAST_PATH", "false").lower() == "true"
+    FAQ_SIMILARITY_THRESHOLD = float(os.getenv("FAQ_SIMILARITY_THRESHOLD", "0.92"))  # cosine similarity вопросов
+    FAQ_PARAPHRASE_MODEL = os.getenv("FAQ_PARAPHRASE_MODEL", "")  # пусто = сохраненный ответ как есть
+    FAQ_PARAPHRASE_PROMPT_FILE = os.getenv("FAQ_PARAPHRASE_PROMPT_FILE", "faq_paraphrase.txt")
+    
     # Cross-Encoder Reranking Configuration
     CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
     RERANKER_TOP_K = int(os.getenv("RERANKER_TOP_K", "3"))
+    RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "sentence_transformers")  # sentence_transformers/onnx
+    RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+    RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+    RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", "models/cross-encoder-onnx")
+    RERANKER_ONNX_NUM_LAYERS = int(os.getenv("RERANKER_ONNX_NUM_LAYERS", "0"))  # 0 = все слои, например 6 = pruned вариант
+    
+    # Cascade reranking: пропуск cross-encoder при уверенном первом этапе
+    RERANK_CASCADE = os.getenv("RERANK_CASCADE", "false").lower() == "true"
+    RERANK_CASCADE_MIN_GAP = float(os.getenv("RERANK_CASCADE_MIN_GAP", "0.05"))  # отрыв cosine similarity rank 1 vs rank 2
+    RERANK_CASCADE_MIN_OVERLAP = float(os.getenv("RERANK_CASCADE_MIN_OVERLAP", "0.8"))  # доля слов запроса в top-1
+    RERANK_CASCADE_TOP_N = int(os.getenv("RERANK_CASCADE_TOP_N", "8"))  # сколько кандидатов переранжировать иначе
+    RERANK_CASCADE_AUDIT_RATE = float(os.getenv("RERANK_CASCADE_AUDIT_RATE", "0.05"))  # доля пропусков с контрольным reranking
+    
+    # Адаптивный top-k: число кандидатов и документов по кривой scores (elbow, relative drop, порог reranker)
+    ADAPTIVE_K = os.getenv("ADAPTIVE_K", "false").lower() == "true"
+    ADAPTIVE_K_MIN_CANDIDATES = int(os.getenv("ADAPTIVE_K_MIN_CANDIDATES", "3"))  # минимум кандидатов каждой ноги
+    ADAPTIVE_K_MAX_DROP = float(os.getenv("ADAPTIVE_K_MAX_DROP", "0.5"))  # отсечь scores ниже top * (1 - drop)
+    ADAPTIVE_K_MIN_DOCUMENTS = int(os.getenv("ADAPTIVE_K_MIN_DOCUMENTS", "1"))  # минимум документов после reranking
+    ADAPTIVE_K_RERANK_THRESHOLD = float(os.getenv("ADAPTIVE_K_RERANK_THRESHOLD", "0.1"))  # score cross-encoder (0..1)
+    
+    # Упаковка контекста: склейка соседних чанков, удаление перекрытий, бюджет токенов
+    CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "false").lower() == "true"
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")  # tiktoken encoding
+    
+    # Экстрактивное сжатие контекста: в каждом чанке только самые релевантные предложения
+    CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "false").lower() == "true"
+    CONTEXT_COMPRESSION_SCORER = os.getenv("CONTEXT_COMPRESSION_SCORER", "cross_encoder")  # cross_encoder/embeddings
+    CONTEXT_COMPRESSION_TOP_SENTENCES = int(os.getenv("CONTEXT_COMPRESSION_TOP_SENTENCES", "3"))
+    
+    # Пул потоков для блокирующих этапов retrieval (embeddings, BM25, cross-encoder)
+    RETRIEVAL_EXECUTOR_WORKERS = int(os.getenv("RETRIEVAL_EXECUTOR_WORKERS", "2"))
+    
+    # Одинаковые одновременные запросы (рассылка в Telegram) выполняются один раз
+    REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "false").lower() == "true"
+    
+    # Журнал запросов пользователей и прогрев кешей самыми частыми после старта и /index
+    QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "false").lower() == "true"
+    QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "logs/queries.log")
+    QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", "1048576"))  # размер файла до ротации
+    QUERY_LOG_BACKUPS = int(os.getenv("QUERY_LOG_BACKUPS", "3"))
+    CACHE_WARMUP_QUERIES = int(os.getenv("CACHE_WARMUP_QUERIES", "50"))  # 0 = без прогрева
+    CACHE_WARMUP_DELAY = float(os.getenv("CACHE_WARMUP_DELAY", "0.1"))  # пауза между запросами прогрева, секунд
+    
+    # Семантический кеш результатов retrieval (перефразированные запросы)
+    RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "false").lower() == "true"
+    RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))  # 0 = выключен
+    RETRIEVAL_CACHE_THRESHOLD = float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.95"))  # cosine similarity запросов
     
     # Отображение источников
     SHOW_SOURCES = os.getenv("SHOW_SOURCES", "false").lower() == "true"
@@ -72,6 +148,45 @@ class Config:
                 f"Must be one of: {', '.join(valid_retrieval_modes)}"
             )
         
+        # Валидация RERANKER_BACKEND
+        valid_reranker_backends = ["sentence_transformers", "onnx"]
+        if cls.RERANKER_BACKEND not in valid_reranker_backends:
+            raise ValueError(
+                f"Invalid RERANKER_BACKEND: {cls.RERANKER_BACKEND}. "
+                f"Must be one of: {', '.join(valid_reranker_backends)}"
+            )
+        
+        # Валидация RETRIEVAL_CACHE_SIZE
+        if cls.RETRIEVAL_CACHE_SIZE < 0:
+            raise ValueError(
+                f"Invalid RETRIEVAL_CACHE_SIZE: {cls.RETRIEVAL_CACHE_SIZE}. "
+                f"Must be >= 0 (0 disables the cache)"
+            )
+        
+        # Валидация CONTEXT_COMPRESSION_SCORER
+        valid_compression_scorers = ["cross_encoder", "embeddings"]
+        if cls.CONTEXT_COMPRESSION_SCORER not in valid_compression_scorers:
+            raise ValueError(
+                f"Invalid CONTEXT_COMPRESSION_SCORER: {cls.CONTEXT_COMPRESSION_SCORER}. "
+                f"Must be one of: {', '.join(valid_compression_scorers)}"
+            )
+        
+        # Валидация CHUNK_EXPANSION
+        valid_chunk_expansions = ["none", "neighbors", "parent"]
+        if cls.CHUNK_EXPANSION not in valid_chunk_expansions:
+            raise ValueError(
+                f"Invalid CHUNK_EXPANSION: {cls.CHUNK_EXPANSION}. "
+                f"Must be one of: {', '.join(valid_chunk_expansions)}"
+            )
+        
+        # Валидация MMR_STAGE
+        valid_mmr_stages = ["none", "rerank", "context"]
+        if cls.MMR_STAGE not in valid_mmr_stages:
+            raise ValueError(
+                f"Invalid MMR_STAGE: {cls.MMR_STAGE}. "
+                f"Must be one of: {', '.join(valid_mmr_stages)}"
+            )
+        
         # Валидация EMBEDDING_PROVIDER
         valid_embedding_providers = ["openai", "huggingface"]
         if cls.EMBEDDING_PROVIDER not in valid_embedding_providers:
@@ -0,0 +1,93 @@
+"""
+Экстрактивное сжатие контекста перед генерацией ответа
+
+Чанки разбиваются на предложения, все предложения всех чанков оцениваются
+одним батчем (cross-encoder или близость эмбеддингов к запросу), в каждом
+чанке остаются только лучшие предложения в исходном порядке. Повторы
+предложений (перекрытие соседних чанков) отбрасываются.
+"""
+import logging
+import re
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+# Фрагменты короче этого числа символов приклеиваются к следующему предложению
+MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text: str) -> list:
+    """Разбиение текста на предложения (короткие обрывки склеиваются с соседними)"""
+    sentences = []
+    pending = ""
+    for part in _SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def compress_documents(query: str, documents: list, score_sentences, top_sentences: int) -> list:
+    """
+    Оставляет в каждом документе top_sentences самых релевантных предложений
+
+    Args:
+        query: Поисковый запрос
+        documents: список Document после retrieval
+        score_sentences: функция (query, list[str]) -> scores, вызывается один раз для всех предложений
+        top_sentences: сколько предложений оставить в каждом чанке
+
+    Returns:
+        list[Document]: сжатые документы с исходными метаданными (без start_index/token_count)
+    """
+    split = [split_sentences(doc.page_content) for doc in documents]
+    flat = [sentence for sentences in split for sentence in sentences]
+    if not flat:
+        return documents
+
+    scores = np.asarray(score_sentences(query, flat), dtype=np.float32)
+
+    compressed = []
+    seen = set()
+    offset = 0
+    chars_before = chars_after = 0
+    for doc, sentences in zip(documents, split):
+        doc_scores = scores[offset:offset + len(sentences)]
+        offset += len(sentences)
+        chars_before += len(doc.page_content)
+
+        keep = sorted(np.argsort(-doc_scores)[:top_sentences])
+        kept = []
+        for i in keep:
+            key = " ".join(sentences[i].lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(sentences[i])
+        if not kept:
+            continue
+
+        text = " ".join(kept)
+        chars_after += len(text)
+        # Смещение и счетчик токенов относятся к исходному тексту чанка
+        metadata = {k: v for k, v in doc.metadata.items() if k not in ("start_index", "token_count")}
+        metadata["compressed"] = True
+        compressed.append(Document(page_content=text, metadata=metadata))
+
+    logger.info(
+        f"Context compressed: {len(flat)} sentences, {chars_before} -> {chars_after} chars "
+        f"({chars_after / max(1, chars_before):.0%})"
+    )
+    return compressed
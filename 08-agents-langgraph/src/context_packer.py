@@ -0,0 +1,158 @@
+"""
+Упаковка найденных чанков в контекст LLM с бюджетом токенов
+
+- количество токенов каждого чанка считается tiktoken один раз при индексации
+  (metadata["token_count"])
+- соседние чанки одной страницы (по metadata["start_index"]) склеиваются,
+  перекрытие от chunk_overlap удаляется
+- дубликаты (один чанк из semantic и BM25) отбрасываются
+- фрагменты добавляются в порядке релевантности, пока помещаются в бюджет
+"""
+import logging
+import threading
+from langchain_core.documents import Document
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+# Оценка, если tiktoken энкодинг недоступен (нет сети для загрузки словаря)
+APPROX_CHARS_PER_TOKEN = 4
+
+
+def _get_token_counter():
+    """Ленивая загрузка tiktoken энкодинга (с приблизительной оценкой как fallback)"""
+    global _token_counter
+    with _token_counter_lock:
+        if _token_counter is None:
+            try:
+                import tiktoken
+                encoding = tiktoken.get_encoding(config.CONTEXT_TOKENIZER)
+                _token_counter = lambda text: len(encoding.encode(text))
+            except Exception as e:
+                logger.warning(
+                    f"tiktoken encoding {config.CONTEXT_TOKENIZER} unavailable ({e}), "
+                    f"estimating {APPROX_CHARS_PER_TOKEN} chars per token"
+                )
+                _token_counter = lambda text: -(-len(text) // APPROX_CHARS_PER_TOKEN)
+    return _token_counter
+
+
+def count_tokens(text: str) -> int:
+    return _get_token_counter()(text)
+
+
+def annotate_token_counts(chunks: list):
+    """Кеширование количества токенов в метаданных чанков (при индексации)"""
+    counter = _get_token_counter()
+    total = 0
+    for chunk in chunks:
+        chunk.metadata["token_count"] = counter(chunk.page_content)
+        total += chunk.metadata["token_count"]
+    logger.info(f"Token counts cached for {len(chunks)} chunks ({total} tokens total)")
+
+
+def _token_count(document) -> int:
+    count = document.metadata.get("token_count")
+    return count if count is not None else count_tokens(document.page_content)
+
+
+class _Passage:
+    """Непрерывный фрагмент страницы, собранный из одного или нескольких чанков"""
+
+    def __init__(self, document):
+        self.metadata = dict(document.metadata)
+        self.text = document.page_content
+        self.start = document.metadata.get("start_index")
+        self.end = self.start + len(self.text) if self.start is not None else None
+        self.tokens = _token_count(document)
+        self.chunk_ids = [document.metadata.get("chunk_id")]
+
+    def page_key(self):
+        return (self.metadata.get("source"), self.metadata.get("page"))
+
+    def touches(self, other) -> bool:
+        """Фрагменты одной страницы пересекаются или стыкуются"""
+        return (
+            self.start is not None and other.start is not None
+            and self.page_key() == other.page_key()
+            and other.start <= self.end and self.start <= other.end
+        )
+
+    def added_tokens(self, other) -> int:
+        """Сколько токенов добавит склейка с other (оценка по кешированным счетчикам)"""
+        new_chars = max(0, other.end - self.end) + max(0, self.start - other.start)
+        if new_chars == 0:
+            return 0
+        return max(1, round(other.tokens * min(1.0, new_chars / max(1, len(other.text)))))
+
+    def merge(self, other, added_tokens: int):
+        """Склейка с пересекающимся фрагментом без повтора общего текста"""
+        if other.start < self.start:
+            self.text = other.text[:self.start - other.start] + self.text
+            self.start = other.start
+        if other.end > self.end:
+            self.text = self.text + other.text[len(other.text) - (other.end - self.end):]
+            self.end = other.end
+        self.tokens += added_tokens
+        self.chunk_ids.extend(other.chunk_ids)
+
+    def to_document(self) -> Document:
+        metadata = dict(self.metadata, token_count=self.tokens)
+        if len(self.chunk_ids) > 1:
+            metadata["start_index"] = self.start
+            metadata["merged_chunk_ids"] = self.chunk_ids
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def pack_documents(documents: list, token_budget: int = None) -> list:
+    """
+    Упаковка документов (в порядке релевантности) в бюджет токенов
+
+    Args:
+        documents: список Document после retrieval/reranking
+        token_budget: максимум токенов контекста (по умолчанию CONTEXT_TOKEN_BUDGET)
+
+    Returns:
+        list[Document]: склеенные фрагменты без дубликатов и перекрытий
+    """
+    budget = token_budget or config.CONTEXT_TOKEN_BUDGET
+    passages = []
+    seen = set()
+    used_tokens = 0
+    input_tokens = 0
+
+    for document in documents:
+        key = document.metadata.get("chunk_id", document.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        candidate = _Passage(document)
+        input_tokens += candidate.tokens
+
+        target = next((passage for passage in passages if passage.touches(candidate)), None)
+        cost = target.added_tokens(candidate) if target is not None else candidate.tokens
+        # Первый (самый релевантный) фрагмент берется всегда
+        if passages and used_tokens + cost > budget:
+            continue
+
+        used_tokens += cost
+        if target is None:
+            passages.append(candidate)
+            continue
+
+        target.merge(candidate, cost)
+        # Склейка могла соединить target с другим фрагментом той же страницы
+        for other in [passage for passage in passages if passage is not target and target.touches(passage)]:
+            added = target.added_tokens(other)
+            used_tokens -= other.tokens - added
+            target.merge(other, added)
+            passages.remove(other)
+
+    logger.info(
+        f"Context packed: {len(seen)} chunks / {input_tokens} tokens -> "
+        f"{len(passages)} passages / {used_tokens} tokens (budget {budget})"
+    )
+    return [passage.to_document() for passage in passages]
@@ -0,0 +1,267 @@
+"""
+Кеш эмбеддингов запросов (query text -> embedding) на уровне процесса
+
+Один ограниченный LRU кеш на процесс, общий для всех объектов embeddings:
+semantic retriever, семантические кеши и RAGAS evaluation. Ключ включает
+идентификатор модели, поэтому разные модели не пересекаются.
+
+- single-flight: параллельные запросы одного и того же текста ждут одно вычисление
+- опциональное сохранение на диск (.npz по модели) и загрузка при старте
+"""
+import asyncio
+import atexit
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """
+    LRU кеш (model_id, text) -> embedding с single-flight вычислением
+
+    Args:
+        max_size: максимальное количество эмбеддингов
+        persist_dir: директория для сохранения на диск (None - только в памяти)
+    """
+
+    def __init__(self, max_size: int, persist_dir: str = None):
+        self.max_size = max_size
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get(self, key):
+        """Значение из кеша (под lock), обновляет LRU порядок"""
+        vector = self._data.get(key)
+        if vector is not None:
+            self._data.move_to_end(key)
+            self.hits += 1
+        return vector
+
+    def _put(self, key, vector):
+        self._data[key] = np.asarray(vector, dtype=np.float32)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def _claim(self, key):
+        """
+        Возвращает (vector, future, owner): либо готовое значение, либо future
+        вычисления; owner=True означает, что вычислять должен вызывающий
+        """
+        with self._lock:
+            vector = self._get(key)
+            if vector is not None:
+                return vector, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            future = Future()
+            self._inflight[key] = future
+            self.misses += 1
+            return None, future, True
+
+    def _resolve(self, key, future, vector=None, error=None):
+        """Завершение вычисления: значение в кеш и всем ожидающим"""
+        if error is None:
+            vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if error is None:
+                self._put(key, vector)
+            del self._inflight[key]
+        if error is None:
+            future.set_result(vector)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, key, compute):
+        """Синхронное получение эмбеддинга: из кеша, из уже идущего вычисления или compute()"""
+        vector, future, owner = self._claim(key)
+        if vector is not None:
+            return vector
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+        except Exception as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, vector=result)
+        return future.result()
+
+    def get_many_or_compute(self, keys: list, compute_batch):
+        """
+        Батч эмбеддингов: из кеша, из уже идущих вычислений, а все остальные
+        ключи - одним вызовом compute_batch(keys) (single-flight по каждому ключу)
+        """
+        claims = {key: self._claim(key) for key in dict.fromkeys(keys)}
+        owned = [key for key, (_, _, owner) in claims.items() if owner]
+        if owned:
+            try:
+                computed = compute_batch(owned)
+            except Exception as e:
+                for key in owned:
+                    self._resolve(key, claims[key][1], error=e)
+                raise
+            for key, vector in zip(owned, computed):
+                self._resolve(key, claims[key][1], vector=vector)
+        vectors = {
+            key: vector if vector is not None else future.result()
+            for key, (vector, future, _) in claims.items()
+        }
+        return [vectors[key] for key in keys]
+
+    async def aget_or_compute(self, key, acompute):
+        """Асинхронный вариант get_or_compute (single-flight общий с синхронным)"""
+        vector, future, owner = self._claim(key)
+        if vector is not None:
+            return vector
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await acompute()
+        except Exception as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, vector=result)
+        return future.result()
+
+    def _model_file(self, model_id: str) -> Path:
+        digest = hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        return self.persist_dir / f"{digest}.npz"
+
+    def save(self):
+        """Сохранение кеша на диск: один .npz файл на модель"""
+        if self.persist_dir is None:
+            return
+        with self._lock:
+            by_model = {}
+            for (model_id, text), vector in self._data.items():
+                by_model.setdefault(model_id, ([], []))
+                by_model[model_id][0].append(text)
+                by_model[model_id][1].append(vector)
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        for model_id, (texts, vectors) in by_model.items():
+            np.savez(
+                self._model_file(model_id),
+                model_id=np.array(model_id),
+                texts=np.array(texts),
+                vectors=np.stack(vectors)
+            )
+        logger.info(f"Query embedding cache saved: {len(self._data)} entries -> {self.persist_dir}")
+
+    def load(self):
+        """Загрузка сохраненных эмбеддингов (от старых к новым в LRU порядке)"""
+        if self.persist_dir is None or not self.persist_dir.exists():
+            return
+        loaded = 0
+        for path in sorted(self.persist_dir.glob("*.npz")):
+            try:
+                with np.load(path) as data:
+                    model_id = str(data["model_id"])
+                    with self._lock:
+                        for text, vector in zip(data["texts"], data["vectors"]):
+                            self._put((model_id, str(text)), vector)
+                            loaded += 1
+            except Exception as e:
+                logger.warning(f"Failed to load query embedding cache {path}: {e}")
+        logger.info(f"Query embedding cache loaded: {loaded} entries from {self.persist_dir}")
+
+    def stats(self) -> dict:
+        """Метрики кеша: hits, misses, hit rate, coalesced, размер"""
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            }
+
+
+# Глобальный кеш процесса (lazy loading)
+_query_embedding_cache = None
+_query_embedding_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Общий кеш эмбеддингов запросов, при первом обращении загружается с диска"""
+    global _query_embedding_cache
+    with _query_embedding_cache_lock:
+        if _query_embedding_cache is None:
+            _query_embedding_cache = QueryEmbeddingCache(
+                max_size=config.QUERY_EMBEDDING_CACHE_SIZE,
+                persist_dir=config.QUERY_EMBEDDING_CACHE_DIR or None
+            )
+            _query_embedding_cache.load()
+            if _query_embedding_cache.persist_dir is not None:
+                atexit.register(_query_embedding_cache.save)
+    return _query_embedding_cache
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Обертка над LangChain embeddings: embed_query через общий кеш процесса
+
+    embed_documents не кешируется (индексация чанков выполняется один раз).
+
+    Args:
+        embeddings: исходный объект embeddings
+        model_id: идентификатор провайдера и модели (часть ключа кеша)
+    """
+
+    def __init__(self, embeddings: Embeddings, model_id: str):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.cache = get_query_embedding_cache()
+
+    def embed_documents(self, texts: list) -> list:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list) -> list:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        vector = self.cache.get_or_compute(
+            (self.model_id, text),
+            lambda: self.embeddings.embed_query(text)
+        )
+        return vector.tolist()
+
+    def embed_queries(self, texts: list) -> list:
+        """Эмбеддинги нескольких запросов: промахи кеша - одним вызовом провайдера"""
+        # У OpenAI и HuggingFace (без query instruction) embed_documents совпадает с embed_query
+        vectors = self.cache.get_many_or_compute(
+            [(self.model_id, text) for text in texts],
+            lambda keys: self.embeddings.embed_documents([text for _, text in keys])
+        )
+        return [vector.tolist() for vector in vectors]
+
+    async def aembed_query(self, text: str) -> list:
+        vector = await self.cache.aget_or_compute(
+            (self.model_id, text),
+            lambda: self.embeddings.aembed_query(text)
+        )
+        return vector.tolist()
+
+
+def with_query_cache(embeddings: Embeddings, model_id: str) -> Embeddings:
+    """Оборачивает embeddings кешем запросов, если он включен в конфиге"""
+    if config.QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return embeddings
+    return CachedQueryEmbeddings(embeddings, model_id)
@@ -8,6 +8,7 @@ import indexer
 import rag
 import evaluation
 import agent
+import tools
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -111,6 +112,8 @@ async def cmd_index(message: Message):
         if result and result[0] is not None:
             rag.vector_store, rag.chunks = result
             rag.initialize_retriever()
+            tools.refresh_rag_search_description()
+            rag.start_cache_warmup()
             stats = rag.get_vector_store_stats()
             await message.answer(
                 f"✅ Переиндексация завершена!\n"
@@ -157,6 +160,33 @@ async def cmd_index_status(message: Message):
             f"• Reranker top k: {stats.get('reranker_top_k', 'N/A')}\n"
             f"• Cross-encoder: {stats.get('cross_encoder_model', 'N/A').split('/')[-1]}\n"
         )
+        if 'cascade' in stats:
+            status_text += f"• Cascade: reranking пропущен в {stats['cascade']['skip_rate']:.0%} запросов\n"
+    
+    if 'adaptive_k' in stats and stats['adaptive_k']['queries']:
+        adaptive = stats['adaptive_k']
+        status_text += (
+            f"• Adaptive k: в среднем {adaptive['avg_candidates']:.1f} кандидатов "
+            f"(-{adaptive['candidates_saved_rate']:.0%}), документов -{adaptive['kept_saved_rate']:.0%}\n"
+        )
+    
+    if 'chunk_store' in stats:
+        store = stats['chunk_store']
+        status_text += (
+            f"• Хранилище чанков: {store['bytes'] / 1024 / 1024:.1f} МБ, "
+            f"{store['bytes_per_chunk'] / 1024:.1f} КБ на чанк{' (mmap)' if store['memory_mapped'] else ''}\n"
+        )
+    if 'hierarchy' in stats:
+        status_text += f"• Иерархический поиск: {stats['hierarchy']['sections']} секций\n"
+    if 'retrieval_cache' in stats:
+        cache = stats['retrieval_cache']
+        status_text += f"• Кеш retrieval: {cache['size']}/{cache['max_size']}, hit rate {cache['hit_rate']:.0%}\n"
+    if 'warmup' in stats:
+        warmup = stats['warmup']
+        state = "идет" if warmup['running'] else f"{warmup['last_ms'] / 1000:.1f} с"
+        status_text += f"• Прогрев кешей: {warmup['warmed']}/{warmup['queries']} частых запросов ({state})\n"
+    if 'coalescing' in stats:
+        status_text += f"• Объединено одинаковых запросов retrieval: {stats['coalescing']['retrieval']['coalesced']}\n"
     
     # Информация об embeddings
     status_text += f"\n🧬 *Embeddings: {stats['embedding_provider']}*\n"
@@ -167,6 +197,12 @@ async def cmd_index_status(message: Message):
             f"• Модель: {stats.get('embedding_model', 'N/A').split('/')[-1]}\n"
             f"• Устройство: {stats.get('device', 'N/A')}\n"
         )
+    if 'faq' in stats:
+        faq = stats['faq']
+        status_text += f"• FAQ: {faq['questions']} вопросов, прямой ответ на {faq['hit_rate']:.0%} запросов\n"
+    if 'query_embedding_cache' in stats:
+        cache = stats['query_embedding_cache']
+        status_text += f"• Кеш запросов: {cache['size']}/{cache['max_size']}, hit rate {cache['hit_rate']:.0%}\n"
     
     await message.answer(status_text, parse_mode="Markdown")
 
@@ -280,6 +316,20 @@ async def handle_message(message: Message):
         # Создаем сообщение в формате LangChain
         user_message = HumanMessage(content=message.text)
         
+        # Известный вопрос FAQ - сохраненный ответ без агента и RAG pipeline
+        if config.FAQ_FAST_PATH:
+            result = await rag.faq_answer(message.text)
+            if result is not None:
+                # Обмен записывается в историю агента, чтобы уточняющие вопросы имели контекст
+                await agent.remember_exchange(message.chat.id, user_message, result["answer"])
+                final_response = result["answer"]
+                if config.SHOW_SOURCES:
+                    sources = format_sources(result["documents"])
+                    if sources:
+                        final_response = f"{final_response}\n\n{sources}"
+                await message.answer(final_response)
+                return
+        
         # Получаем ответ через ReAct агента
         # ВАЖНО: Передаем только текущее сообщение, а не всю историю!
         # История хранится в агенте (MemorySaver) и управляется через chat_id
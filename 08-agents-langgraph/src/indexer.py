@@ -1,11 +1,14 @@
 import logging
 from pathlib import Path
+import numpy as np
 from langchain_community.document_loaders import PyPDFLoader, JSONLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import InMemoryVectorStore
 from config import config
+import context_packer
+import embedding_cache
 
 logger = logging.getLogger(__name__)
 
@@ -32,12 +35,20 @@ def split_documents(pages: list) -> list:
     """Разбиение документов на чанки"""
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=500,
-        chunk_overlap=50
+        chunk_overlap=50,
+        add_start_index=True  # смещение чанка на странице (склейка соседей в context_packer)
     )
     chunks = text_splitter.split_documents(pages)
     logger.info(f"Split into {len(chunks)} chunks")
     return chunks
 
+def _json_metadata(record: dict, metadata: dict) -> dict:
+    """Метаданные Q&A пары: категория, вопрос и ответ (для фильтров и индексов)"""
+    metadata["category"] = record.get("category", "")
+    metadata["question"] = record.get("question", "")
+    metadata["answer"] = record.get("answer", "")
+    return metadata
+
 def load_json_documents(json_file_path: str) -> list:
     """Загрузка Q&A пар из JSON, каждая пара - отдельный чанк"""
     json_path = Path(json_file_path)
@@ -48,8 +59,9 @@ def load_json_documents(json_file_path: str) -> list:
     try:
         loader = JSONLoader(
             file_path=str(json_path),
-            jq_schema='.[].full_text',
-            text_content=False
+            jq_schema='.[]',
+            content_key='full_text',
+            metadata_func=_json_metadata
         )
         documents = loader.load()
         logger.info(f"Loaded {len(documents)} Q&A pairs from JSON")
@@ -58,23 +70,57 @@ def load_json_documents(json_file_path: str) -> list:
         logger.error(f"Error loading JSON: {e}")
         return []
 
+def build_chunk_adjacency(chunks: list):
+    """
+    Соседи чанков внутри одной страницы источника (для расширения результатов поиска)
+    
+    Returns:
+        tuple: (prev_ids, next_ids) - int32 массивы по chunk_id, -1 = нет соседа
+    """
+    prev_ids = np.full(len(chunks), -1, dtype=np.int32)
+    next_ids = np.full(len(chunks), -1, dtype=np.int32)
+    
+    def position(chunk_id):
+        metadata = chunks[chunk_id].metadata
+        return (str(metadata.get("source", "")), metadata.get("page", -1), metadata.get("start_index", -1), chunk_id)
+    
+    order = sorted(range(len(chunks)), key=position)
+    for previous, current in zip(order, order[1:]):
+        # JSON Q&A пары без страницы и смещения - самостоятельные чанки
+        if chunks[current].metadata.get("start_index") is None:
+            continue
+        if position(previous)[:2] == position(current)[:2]:
+            prev_ids[current] = previous
+            next_ids[previous] = current
+    
+    logger.info(f"Chunk adjacency built: {int((next_ids >= 0).sum())} links for {len(chunks)} chunks")
+    return prev_ids, next_ids
+
 def create_embeddings():
     """
     Фабрика для создания embeddings по провайдеру из конфига
     Поддерживает: openai, huggingface
+    
+    embed_query оборачивается общим кешем эмбеддингов запросов процесса
     """
     provider = config.EMBEDDING_PROVIDER.lower()
     
     if provider == "openai":
         logger.info(f"Creating OpenAI embeddings: {config.EMBEDDING_MODEL}")
-        return OpenAIEmbeddings(model=config.EMBEDDING_MODEL)
+        return embedding_cache.with_query_cache(
+            OpenAIEmbeddings(model=config.EMBEDDING_MODEL),
+            model_id=f"openai:{config.EMBEDDING_MODEL}"
+        )
     
     elif provider == "huggingface":
         logger.info(f"Creating HuggingFace embeddings: {config.HUGGINGFACE_EMBEDDING_MODEL} on {config.HUGGINGFACE_DEVICE}")
-        return HuggingFaceEmbeddings(
-            model_name=config.HUGGINGFACE_EMBEDDING_MODEL,
-            model_kwargs={'device': config.HUGGINGFACE_DEVICE},
-            encode_kwargs={'normalize_embeddings': True}
+        return embedding_cache.with_query_cache(
+            HuggingFaceEmbeddings(
+                model_name=config.HUGGINGFACE_EMBEDDING_MODEL,
+                model_kwargs={'device': config.HUGGINGFACE_DEVICE},
+                encode_kwargs={'normalize_embeddings': True}
+            ),
+            model_id=f"huggingface:{config.HUGGINGFACE_EMBEDDING_MODEL}"
         )
     
     else:
@@ -85,7 +131,8 @@ def create_vector_store(chunks: list):
     embeddings = create_embeddings()
     vector_store = InMemoryVectorStore.from_documents(
         documents=chunks,
-        embedding=embeddings
+        embedding=embeddings,
+        ids=[str(chunk.metadata.get("chunk_id", i)) for i, chunk in enumerate(chunks)]
     )
     logger.info(f"Created vector store with {len(chunks)} chunks")
     return vector_store
@@ -118,6 +165,11 @@ async def reindex_all():
         
         logger.info(f"Total chunks to index: {len(all_chunks)} (PDF: {len(pdf_chunks)}, JSON: {len(json_documents)})")
         
+        # Стабильный id чанка = позиция в all_chunks (по нему кеши и индексы ссылаются на чанки)
+        for chunk_id, chunk in enumerate(all_chunks):
+            chunk.metadata["chunk_id"] = chunk_id
+        context_packer.annotate_token_counts(all_chunks)
+        
         vector_store = create_vector_store(all_chunks)
         logger.info("Reindexing completed successfully")
         
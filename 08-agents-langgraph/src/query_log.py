@@ -0,0 +1,89 @@
+"""
+Журнал запросов пользователей для прогрева кешей
+
+Исходные тексты запросов retrieval пишутся по одному в строку в локальный
+файл с ротацией (logging.handlers.RotatingFileHandler: queries.log,
+queries.log.1, ...). После рестарта или переиндексации самые частые
+запросы из журнала прогоняются через retrieval в фоне, чтобы кеш
+эмбеддингов, кеш retrieval, BM25 и cross-encoder были прогреты до прихода
+первых пользователей. Пишется именно исходный текст: кеш эмбеддингов
+запросов хранит ключ по нему, а не по нормализованной форме.
+
+Запись не блокирует event loop: record() кладет строку в очередь
+(logging.handlers.QueueHandler), а файл и ротацию обслуживает фоновый поток
+QueueListener. На диске хранится не больше max_bytes * (backups + 1) байт
+запросов, более старые удаляются при ротации.
+"""
+import atexit
+import logging
+import queue
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLog:
+    """
+    Запись запросов в файл с ротацией и чтение самых частых
+
+    Args:
+        path: путь к журналу
+        max_bytes: размер файла, после которого начинается новый
+        backups: сколько старых файлов хранить
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = Path(path)
+        self.backups = backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Отдельный logger без propagate: запросы не попадают в bot.log
+        self._writer = logging.getLogger(f"{__name__}.{self.path}")
+        self._writer.propagate = False
+        self._writer.setLevel(logging.INFO)
+        if not self._writer.handlers:
+            handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            records = queue.SimpleQueue()
+            listener = QueueListener(records, handler)
+            listener.start()
+            # При выходе дописываются запросы, оставшиеся в очереди
+            atexit.register(listener.stop)
+            self._writer.addHandler(QueueHandler(records))
+
+    def record(self, query: str):
+        """Запись запроса в очередь (переводы строк и повторные пробелы заменяются одним пробелом)"""
+        query = " ".join(query.split())
+        if query:
+            self._writer.info(query)
+
+    def _files(self) -> list:
+        """Журнал и его ротированные копии, которые есть на диске"""
+        files = [self.path] + [Path(f"{self.path}.{i}") for i in range(1, self.backups + 1)]
+        return [path for path in files if path.exists()]
+
+    def top_queries(self, n: int, key=None) -> list:
+        """
+        n самых частых запросов по всем файлам журнала
+
+        Args:
+            n: сколько запросов вернуть
+            key: функция группировки (например, нормализация запроса); из
+                группы возвращается самый частый исходный вариант
+        """
+        key = key or (lambda query: query)
+        counts = Counter()
+        variants = {}
+        for path in self._files():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        query = line.strip()
+                        if query:
+                            group = key(query)
+                            counts[group] += 1
+                            variants.setdefault(group, Counter())[query] += 1
+            except OSError as e:
+                logger.warning(f"Failed to read query log {path}: {e}")
+        return [variants[group].most_common(1)[0][0] for group, _ in counts.most_common(n)]
@@ -0,0 +1,88 @@
+"""
+Двухуровневый индекс для иерархического retrieval
+
+Грубый уровень - секции, построенные из метаданных загрузчиков:
+- JSON Q&A: категория (metadata["category"])
+- PDF: страница (source + page)
+- остальное: источник целиком
+
+Центроид секции - нормализованное среднее эмбеддингов ее чанков (из матрицы
+индекса, без повторного вызова embeddings). Запрос сначала сравнивается
+с центроидами, затем semantic и BM25 поиск выполняются только по чанкам
+лучших секций - стоимость растет с числом секций и размером выбранных
+секций, а не с размером всего корпуса.
+"""
+import logging
+import numpy as np
+from metadata_index import NO_PAGE, source_name
+
+logger = logging.getLogger(__name__)
+
+
+def section_key(metadata: dict) -> tuple:
+    """Ключ секции чанка по его метаданным"""
+    source = source_name(metadata.get("source", "Unknown"))
+    if metadata.get("category"):
+        return ("category", metadata["category"])
+    page = metadata.get("page", NO_PAGE)
+    if page != NO_PAGE:
+        return ("page", source, page)
+    return ("source", source)
+
+
+class SectionIndex:
+    """
+    Центроиды секций и списки их chunk_id
+
+    Args:
+        chunks: список Document, позиция в списке = chunk_id
+        embedding_matrix: нормализованные эмбеддинги чанков (строка = chunk_id)
+    """
+
+    def __init__(self, chunks: list, embedding_matrix: np.ndarray):
+        positions = {}
+        section_of = np.empty(len(chunks), dtype=np.int32)
+        for chunk_id, chunk in enumerate(chunks):
+            section_of[chunk_id] = positions.setdefault(section_key(chunk.metadata), len(positions))
+        self.keys = list(positions)
+
+        # chunk_id секций подряд (CSR): members[offsets[s]:offsets[s + 1]]
+        self.members = np.argsort(section_of, kind="stable").astype(np.int32)
+        self.sizes = np.bincount(section_of, minlength=len(self.keys))
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes)])
+
+        sums = np.zeros((len(self.keys), embedding_matrix.shape[1]), dtype=np.float32)
+        np.add.at(sums, section_of, embedding_matrix)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.centroids = sums / norms
+
+        logger.info(f"Section index built: {len(self.keys)} sections for {len(chunks)} chunks")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def candidate_ids(self, query_vector: np.ndarray, top_sections: int, min_chunks: int) -> np.ndarray:
+        """
+        chunk_id лучших секций по близости запроса к центроидам
+
+        Берутся top_sections секций; если в них меньше min_chunks чанков,
+        добавляются следующие по близости секции.
+
+        Returns:
+            np.ndarray: отсортированный массив chunk_id
+        """
+        order = np.argsort(-(self.centroids @ query_vector))
+        covered = np.cumsum(self.sizes[order])
+        needed = int(np.searchsorted(covered, min_chunks)) + 1
+        selected = order[:max(top_sections, needed)]
+        ids = np.concatenate([self.members[self.offsets[s]:self.offsets[s + 1]] for s in selected])
+        ids.sort()
+        return ids
+
+    def describe(self) -> dict:
+        """Количество секций по типам (для статистики)"""
+        kinds = {}
+        for key in self.keys:
+            kinds[key[0]] = kinds.get(key[0], 0) + 1
+        return {"sections": len(self.keys), "by_kind": kinds}
@@ -8,48 +8,106 @@ import json
 import logging
 import requests
 from langchain_core.tools import tool
+import context_packer
 import rag
 from config import config
 
 logger = logging.getLogger(__name__)
 
+def _documents_to_json(documents) -> str:
+    """Структурированный ответ rag_search для агента"""
+    sources = []
+    for doc in documents:
+        source_data = {
+            "source": doc.metadata.get("source", "Unknown"),
+            "page_content": doc.page_content  # Полный текст документа
+        }
+        # page только для PDF (у JSON документов его нет)
+        if "page" in doc.metadata:
+            source_data["page"] = doc.metadata["page"]
+        sources.append(source_data)
+    
+    # ensure_ascii=False для корректной кириллицы
+    return json.dumps({"sources": sources}, ensure_ascii=False)
+
+
 @tool
-def rag_search(query: str) -> str:
+async def rag_search(query: str, source: str = "", category: str = "",
+                     page_from: int | None = None, page_to: int | None = None) -> str:
     """
     Ищет информацию в документах Сбербанка (условия кредитов, вкладов и других банковских продуктов).
     
+    Args:
+        query: Поисковый запрос
+        source: Искать только в этом файле, пусто - во всех
+        category: Искать только в этой категории вопросов-ответов, пусто - во всех
+        page_from: Первая страница PDF (включительно, нумерация как в поле page результата)
+        page_to: Последняя страница PDF (включительно)
+    
     Возвращает JSON со списком источников, где каждый источник содержит:
     - source: имя файла
     - page: номер страницы (только для PDF)
     - page_content: текст документа
+    
+    Если source или category не найдены, возвращает JSON с полем error и списком
+    допустимых значений - повтори поиск с одним из них или без фильтра.
     """
     try:
         # Получаем релевантные документы через RAG (retrieval + reranking)
-        documents = rag.retrieve_documents(query)
-        
-        if not documents:
-            return json.dumps({"sources": []}, ensure_ascii=False)
-        
-        # Формируем структурированный ответ для агента
-        sources = []
-        for doc in documents:
-            source_data = {
-                "source": doc.metadata.get("source", "Unknown"),
-                "page_content": doc.page_content  # Полный текст документа
-            }
-            # page только для PDF (у JSON документов его нет)
-            if "page" in doc.metadata:
-                source_data["page"] = doc.metadata["page"]
-            sources.append(source_data)
+        # Async вариант: BM25 и cross-encoder выполняются в пуле retrieval, а не в event loop
+        # Известный вопрос FAQ - сразу соответствующая Q&A пара без поиска
+        page_filters = {key: value for key, value in (("page_from", page_from), ("page_to", page_to)) if value is not None}
+        if rag.faq is not None and not category and not source and not page_filters:
+            hit = await rag.run_in_retrieval_executor(rag.faq_lookup, query)
+            if hit is not None:
+                return _documents_to_json([hit["document"]])
         
-        # ensure_ascii=False для корректной кириллицы
-        return json.dumps({"sources": sources}, ensure_ascii=False)
+        filters = {key: value for key, value in (("source", source), ("category", category)) if value}
+        filters.update(page_filters)
+        # Неизвестное значение фильтра дало бы пустой результат, как будто в документах ничего нет
+        unknown = rag.chunk_metadata_index.unknown_values(filters) if filters and rag.chunk_metadata_index else {}
+        if unknown:
+            logger.info(f"rag_search called with unknown filter values: {filters}")
+            return json.dumps({
+                "sources": [],
+                "error": "Неизвестное значение фильтра: " + ", ".join(f"{field}={filters[field]!r}" for field in unknown),
+                "allowed_values": unknown,
+            }, ensure_ascii=False)
+        documents = await rag.aretrieve_documents(query, filters or None)
+        documents = await rag.acompress_context(query, documents)
+        if config.CONTEXT_PACKING:
+            documents = context_packer.pack_documents(documents)
+        return _documents_to_json(documents)
         
     except Exception as e:
         logger.error(f"Error in rag_search: {e}", exc_info=True)
         return json.dumps({"sources": []}, ensure_ascii=False)
 
 
+# Описание без списка значений: его дополняет refresh_rag_search_description
+_RAG_SEARCH_DESCRIPTION = rag_search.description
+
+
+def refresh_rag_search_description():
+    """
+    Допустимые source и category в описании rag_search по текущему индексу
+    
+    Вызывается после каждой индексации: агент привязывает инструменты к модели
+    на каждом вызове LLM, поэтому новое описание видно со следующего шага.
+    """
+    index = rag.chunk_metadata_index
+    if index is None:
+        rag_search.description = _RAG_SEARCH_DESCRIPTION
+        return
+    values = index.describe()
+    lines = [_RAG_SEARCH_DESCRIPTION.rstrip(), ""]
+    if values["sources"]:
+        lines.append("Значения source: " + ", ".join(sorted(values["sources"])))
+    if values["categories"]:
+        lines.append("Значения category: " + ", ".join(f'"{name}"' for name in sorted(values["categories"])))
+    rag_search.description = "\n".join(lines)
+
+
 @tool
 def currency_converter(amount: float, from_currency: str, to_currency: str) -> str:
     """